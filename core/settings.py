@@ -86,6 +86,38 @@ else:
         }
     }
 
+# Caches
+# "stock" holds StockAvailabilityCache entries; point it at Redis or memcached
+# to share availability between worker processes
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "stock": {
+        "BACKEND": os.environ.get(
+            "STOCK_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("STOCK_CACHE_LOCATION", "stock-availability"),
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
+}
+STOCK_CACHE_ALIAS = "stock"
+STOCK_CACHE_TIMEOUT = 300  # seconds
+
+# POS barcode/SKU index (inventory.services.scanning), held per process
+BARCODE_INDEX_REFRESH_SECONDS = 5  # pick up changed products this often
+BARCODE_INDEX_RELOAD_SECONDS = 3600  # full reload, drops deleted products
+
+# Category navigation tree (inventory.services.categories), held per process
+CATEGORY_TREE_REFRESH_SECONDS = 5  # look for category changes this often
+CATEGORY_TREE_RELOAD_SECONDS = 300  # rebuild regardless
+
+# Branch hierarchy (inventory.services.locations), held per process
+BRANCH_TREE_REFRESH_SECONDS = 5  # look for branch changes made elsewhere this often
+
+# Branch code online orders are held and shipped from; empty: first warehouse
+ECOMMERCE_FULFILLMENT_BRANCH = os.environ.get("ECOMMERCE_FULFILLMENT_BRANCH", "")
+
 AUTH_USER_MODEL = "accounts.User"
 
 AUTH_PASSWORD_VALIDATORS = [
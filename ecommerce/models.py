@@ -3,7 +3,6 @@ from __future__ import annotations
 from decimal import Decimal
 from django.db import models
 from django.utils import timezone
-from datetime import timedelta
 
 from accounts.models import Branch, User
 from inventory.models import Product, ProductVariant
@@ -90,11 +89,31 @@ class CartItem(models.Model):
         """Calculate item total"""
         return Decimal(self.product.selling_price) * Decimal(self.quantity)
     
-    def reserve_stock(self):
-        """Reserve stock for 15 minutes"""
-        self.reserved_until = timezone.now() + timedelta(minutes=15)
+    def reserve_stock(self, branch: Branch):
+        """Reserve stock at the fulfillment branch for 15 minutes"""
+        from inventory.services.reservations import ReservationService
+
+        reservation = ReservationService.reserve(
+            product=self.product,
+            variant=self.variant,
+            branch=branch,
+            quantity=Decimal(self.quantity),
+            reference=self.reservation_reference(),
+        )
+        self.reserved_until = reservation.expires_at
         self.save(update_fields=['reserved_until'])
     
+    def release_stock(self):
+        """Give back any stock reserved for this item"""
+        from inventory.services.reservations import ReservationService
+
+        ReservationService.release(self.reservation_reference())
+        self.reserved_until = None
+        self.save(update_fields=['reserved_until'])
+    
+    def reservation_reference(self) -> str:
+        return f"cart-item-{self.pk}"
+    
     def is_reservation_valid(self) -> bool:
         """Check if stock reservation is still valid"""
         if not self.reserved_until:
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import uuid
+from decimal import Decimal
+from typing import Iterable, List
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import Branch
+from ecommerce.models import Cart, CartItem, OnlineOrder, OrderItem, ShippingAddress
+from inventory.models import StockMovement
+from inventory.services.concurrency import retry_on_conflict
+from inventory.services.exceptions import InsufficientStockError
+from inventory.services.stock import StockService
+
+
+class CheckoutService:
+    """
+    Cart holds and order placement against the fulfillment branch.
+
+    Every cart item holds its quantity as a StockReservation (reference
+    ``CartItem.reservation_reference()``) while it sits in the cart, so two
+    customers can't both be promised the last unit. Placing the order re-checks
+    the holds and posts the ONLINE_ORDER_OUT movements, which release them in
+    the same transaction.
+    """
+
+    @staticmethod
+    def fulfillment_branch() -> Branch:
+        """
+        Branch web orders ship from: ``ECOMMERCE_FULFILLMENT_BRANCH`` (a branch
+        code) or else the first active warehouse.
+        """
+        branches = Branch.objects.filter(is_active=True)
+        code = getattr(settings, "ECOMMERCE_FULFILLMENT_BRANCH", "")
+        if code:
+            branches = branches.filter(code=code)
+        else:
+            branches = branches.filter(is_warehouse=True)
+        branch = branches.order_by("id").first()
+        if branch is None:
+            raise ImproperlyConfigured("No active branch to fulfil online orders from")
+        return branch
+
+    @staticmethod
+    def hold(items: Iterable[CartItem], branch: Branch = None) -> None:
+        """
+        Reserve (or refresh and resize) the hold of every item.
+
+        Raises:
+            InsufficientStockError: If available-to-promise can't cover some
+                items; ``details`` has an entry per short item with its ``item``
+        """
+        branch = branch or CheckoutService.fulfillment_branch()
+        failures = []
+        for item in items:
+            try:
+                item.reserve_stock(branch)
+            except InsufficientStockError as exc:
+                failures.extend(dict(detail, item=item) for detail in exc.details)
+        if failures:
+            raise InsufficientStockError(
+                "Insufficient stock for "
+                + ", ".join(failure["item"].product.name for failure in failures),
+                details=failures,
+            )
+
+    @staticmethod
+    @retry_on_conflict
+    @transaction.atomic
+    def place_order(
+        cart: Cart,
+        *,
+        shipping_address: ShippingAddress,
+        payment_method: str = OnlineOrder.PaymentMethod.COD,
+        customer_notes: str = "",
+    ) -> OnlineOrder:
+        """
+        Turn the cart into an order, take its stock out of the fulfillment
+        branch and empty the cart.
+
+        Raises:
+            ValueError: If the cart is empty
+            InsufficientStockError: If some items can no longer be held; nothing
+                is ordered
+        """
+        items: List[CartItem] = list(cart.items.select_related("product", "variant").order_by("id"))
+        if not items:
+            raise ValueError("Cart is empty")
+        branch = CheckoutService.fulfillment_branch()
+        # Lapsed holds are taken again if stock allows; live ones are refreshed
+        CheckoutService.hold(items, branch)
+
+        order_number = f"ORD-{timezone.localtime():%Y%m%d}-{uuid.uuid4().hex[:8].upper()}"
+        subtotal = sum((item.get_total() for item in items), Decimal("0"))
+        order = OnlineOrder.objects.create(
+            customer=cart.user,
+            order_number=order_number,
+            shipping_address=shipping_address,
+            subtotal=subtotal,
+            grand_total=subtotal,
+            payment_method=payment_method,
+            customer_notes=customer_notes,
+            fulfillment_branch=branch,
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=item.product,
+                variant=item.variant,
+                quantity=item.quantity,
+                unit_price=item.product.selling_price,
+            )
+            for item in items
+        ])
+        for item in items:
+            # Releases the item's hold along with the stock it covered
+            StockService.apply_fefo_movement(
+                product=item.product,
+                variant=item.variant,
+                quantity=Decimal(item.quantity),
+                movement_type=StockMovement.MovementType.ONLINE_ORDER_OUT,
+                source_branch=branch,
+                reference=order_number,
+                created_by=cart.user,
+                reservation=item.reservation_reference(),
+            )
+        cart.clear()
+        return order
@@ -0,0 +1,118 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ecommerce.models import Cart, CartItem, OnlineOrder, ShippingAddress
+from ecommerce.services import CheckoutService
+from inventory.models import ProductStockSummary, StockMovement, StockReservation
+from inventory.services.exceptions import InsufficientStockError
+from inventory.services.reservations import ReservationService
+from inventory.tests.utils import make_branch, make_product, make_user, receive
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.warehouse = make_branch(is_warehouse=True)
+        self.product = make_product()
+        receive(self.product, self.warehouse, 5)
+        self.customer = make_user()
+        self.client.force_login(self.customer)
+
+    def add_to_cart(self, quantity):
+        return self.client.post(
+            reverse("ecommerce:add_to_cart", args=[self.product.pk]), {"quantity": quantity}
+        )
+
+    def available(self):
+        return ReservationService.available_to_promise(self.product, None, self.warehouse)
+
+    def test_add_to_cart_holds_stock(self):
+        self.add_to_cart(2)
+        self.add_to_cart(1)
+        item = CartItem.objects.get()
+        self.assertEqual(item.quantity, 3)
+        self.assertTrue(item.is_reservation_valid())
+        self.assertEqual(self.available(), Decimal("2"))
+
+    def test_add_to_cart_beyond_available_to_promise_is_refused(self):
+        other = Cart.objects.create(user=make_user())
+        CheckoutService.hold([CartItem.objects.create(cart=other, product=self.product, quantity=4)])
+        self.add_to_cart(2)
+        self.assertFalse(CartItem.objects.filter(cart__user=self.customer).exists())
+        self.assertEqual(self.available(), Decimal("1"))
+
+    def test_remove_from_cart_releases_the_hold(self):
+        self.add_to_cart(2)
+        self.client.post(reverse("ecommerce:remove_from_cart", args=[CartItem.objects.get().pk]))
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_checkout_takes_lapsed_holds_again(self):
+        self.add_to_cart(2)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.available(), Decimal("5"))
+        self.client.get(reverse("ecommerce:checkout"))
+        self.assertTrue(CartItem.objects.get().is_reservation_valid())
+        self.assertEqual(self.available(), Decimal("3"))
+
+    def test_order_consumes_the_holds(self):
+        self.add_to_cart(2)
+        address = ShippingAddress.objects.create(
+            user=self.customer, full_name="A", phone="1", address_line1="Street", city="Dhaka"
+        )
+        order = CheckoutService.place_order(
+            Cart.objects.get(user=self.customer), shipping_address=address
+        )
+        self.assertEqual(order.grand_total, Decimal("30.00"))
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertFalse(CartItem.objects.exists())
+        movement = StockMovement.objects.get(reference=order.order_number)
+        self.assertEqual(movement.movement_type, StockMovement.MovementType.ONLINE_ORDER_OUT)
+        self.assertEqual(
+            ProductStockSummary.objects.get(product=self.product, branch=self.warehouse).quantity,
+            Decimal("3"),
+        )
+        self.assertEqual(self.available(), Decimal("3"))
+
+    def test_order_is_refused_when_a_lapsed_hold_cant_be_taken_again(self):
+        cart = Cart.objects.create(user=self.customer)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+        other = Cart.objects.create(user=make_user())
+        CheckoutService.hold([CartItem.objects.create(cart=other, product=self.product, quantity=4)])
+        address = ShippingAddress.objects.create(
+            user=self.customer, full_name="A", phone="1", address_line1="Street", city="Dhaka"
+        )
+        with self.assertRaises(InsufficientStockError):
+            CheckoutService.place_order(cart, shipping_address=address)
+        self.assertFalse(OnlineOrder.objects.exists())
+        self.assertEqual(cart.items.count(), 1)
+
+
+class ProductDetailTests(TestCase):
+    def setUp(self):
+        self.warehouse = make_branch(is_warehouse=True)
+        self.shop = make_branch()
+        self.product = make_product()
+        receive(self.product, self.warehouse, 5)
+        receive(self.product, self.shop, 20)
+
+    def stock_shown(self):
+        # Context as handed to the template (which needs a ``sub`` filter the
+        # project doesn't define yet)
+        with mock.patch("ecommerce.views.render", return_value=HttpResponse()) as render:
+            self.client.get(reverse("ecommerce:product_detail", args=[self.product.pk]))
+        return render.call_args.args[2]["stock_quantity"]
+
+    def test_shows_fulfillment_branch_stock_less_live_holds(self):
+        self.assertEqual(self.stock_shown(), Decimal("5"))
+        ReservationService.reserve(
+            product=self.product, branch=self.warehouse, quantity=Decimal("2"), reference="cart:1"
+        )
+        self.assertEqual(self.stock_shown(), Decimal("3"))
+
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.stock_shown(), Decimal("5"))
@@ -3,6 +3,7 @@ from django.contrib import messages
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import JsonResponse, HttpRequest, HttpResponse
 from django.core.paginator import Paginator
+from django.db import transaction
 from django.db.models import Q, Sum, Count
 from decimal import Decimal
 
@@ -11,13 +12,18 @@ from .models import (
     OrderItem, Wishlist, WishlistItem, ProductReview
 )
 from inventory.models import Product, ProductVariant, Category
+from inventory.services.availability import VariantAvailabilityService
+from inventory.services.categories import CategoryTreeService
+from inventory.services.exceptions import InsufficientStockError
+from inventory.services.reservations import ReservationService
+from .services import CheckoutService
 
 
 # E-commerce Homepage
 def home(request: HttpRequest) -> HttpResponse:
     """E-commerce homepage with featured products"""
     featured_products = Product.objects.filter(is_active=True)[:8]
-    categories = Category.objects.filter(is_active=True)
+    categories = CategoryTreeService.tree()
     
     context = {
         "featured_products": featured_products,
@@ -33,8 +39,8 @@ def product_list(request: HttpRequest) -> HttpResponse:
     
     # Filter by category
     category_id = request.GET.get("category")
-    if category_id:
-        products = products.filter(category_id=category_id)
+    if category_id and category_id.isdigit():
+        products = CategoryTreeService.products(products, int(category_id))
     
     # Search
     query = request.GET.get("q")
@@ -50,7 +56,7 @@ def product_list(request: HttpRequest) -> HttpResponse:
     page_number = request.GET.get("page")
     page_obj = paginator.get_page(page_number)
     
-    categories = Category.objects.filter(is_active=True)
+    categories = CategoryTreeService.tree()
     
     context = {
         "page_obj": page_obj,
@@ -66,17 +72,36 @@ def product_detail(request: HttpRequest, pk: int) -> HttpResponse:
     product = get_object_or_404(Product, pk=pk, is_active=True)
     reviews = ProductReview.objects.filter(product=product, is_approved=True)
     
+    # What web orders can still take: stock at the fulfillment branch (one
+    # cached matrix, not a query per variant) less live cart holds
+    branch = CheckoutService.fulfillment_branch()
+    on_hand = VariantAvailabilityService.variant_totals(product.pk, branch_ids=[branch.pk])
+    held = ReservationService.reserved_by_variant(product.pk, branch.pk)
+    variant_totals = {
+        variant_id: max(
+            on_hand.get(variant_id, Decimal("0")) - held.get(variant_id, Decimal("0")),
+            Decimal("0"),
+        )
+        for variant_id in on_hand.keys() | held.keys()
+    }
+    variants = [
+        (variant, variant_totals.get(variant.pk, Decimal("0")))
+        for variant in product.variants.filter(is_active=True).order_by("name")
+    ]
+    
     context = {
         "product": product,
         "reviews": reviews,
+        "variants": variants,
+        "stock_quantity": sum(variant_totals.values(), Decimal("0")),
     }
     return render(request, "ecommerce/product_detail.html", context)
 
 
 def products_by_category(request: HttpRequest, category_id: int) -> HttpResponse:
-    """Products filtered by category"""
+    """Products in a category and all of its subcategories"""
     category = get_object_or_404(Category, pk=category_id)
-    products = Product.objects.filter(category=category, is_active=True)
+    products = CategoryTreeService.products(Product.objects.filter(is_active=True), category.pk)
     
     paginator = Paginator(products, 12)
     page_number = request.GET.get("page")
@@ -84,6 +109,7 @@ def products_by_category(request: HttpRequest, category_id: int) -> HttpResponse
     
     context = {
         "category": category,
+        "subcategories": CategoryTreeService.nodes().get(category.pk, {}).get("children", []),
         "page_obj": page_obj,
     }
     return render(request, "ecommerce/category_products.html", context)
@@ -131,17 +157,23 @@ def add_to_cart(request: HttpRequest, product_id: int) -> HttpResponse:
         
         cart, created = Cart.objects.get_or_create(user=request.user)
         
-        # Check if item already in cart
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            variant_id=variant_id,
-            defaults={"quantity": quantity, "unit_price": product.selling_price}
-        )
-        
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
+        try:
+            with transaction.atomic():
+                # Check if item already in cart
+                cart_item, created = CartItem.objects.get_or_create(
+                    cart=cart,
+                    product=product,
+                    variant_id=variant_id or None,
+                    defaults={"quantity": quantity}
+                )
+                if not created:
+                    cart_item.quantity += quantity
+                    cart_item.save()
+                # Hold the whole cart quantity; rolls the change back if it can't be held
+                CheckoutService.hold([cart_item])
+        except InsufficientStockError as exc:
+            messages.error(request, _stock_message(exc))
+            return redirect("ecommerce:product_detail", pk=product.pk)
         
         messages.success(request, f"{product.name} added to cart!")
         return redirect("ecommerce:cart")
@@ -157,10 +189,17 @@ def update_cart(request: HttpRequest, item_id: int) -> HttpResponse:
         quantity = int(request.POST.get("quantity", 1))
         
         if quantity > 0:
-            cart_item.quantity = quantity
-            cart_item.save()
-            messages.success(request, "Cart updated!")
+            try:
+                with transaction.atomic():
+                    cart_item.quantity = quantity
+                    cart_item.save()
+                    CheckoutService.hold([cart_item])
+            except InsufficientStockError as exc:
+                messages.error(request, _stock_message(exc))
+            else:
+                messages.success(request, "Cart updated!")
         else:
+            ReservationService.release(cart_item.reservation_reference())
             cart_item.delete()
             messages.success(request, "Item removed from cart!")
         
@@ -173,6 +212,7 @@ def update_cart(request: HttpRequest, item_id: int) -> HttpResponse:
 def remove_from_cart(request: HttpRequest, item_id: int) -> HttpResponse:
     """Remove item from cart"""
     cart_item = get_object_or_404(CartItem, pk=item_id, cart__user=request.user)
+    ReservationService.release(cart_item.reservation_reference())
     cart_item.delete()
     messages.success(request, "Item removed from cart!")
     return redirect("ecommerce:cart")
@@ -188,6 +228,13 @@ def checkout(request: HttpRequest) -> HttpResponse:
         messages.warning(request, "Your cart is empty!")
         return redirect("ecommerce:cart")
     
+    # Refresh the holds, so stock stays promised while the customer checks out
+    try:
+        CheckoutService.hold(cart.items.select_related("product", "variant"))
+    except InsufficientStockError as exc:
+        messages.error(request, _stock_message(exc))
+        return redirect("ecommerce:cart")
+    
     addresses = ShippingAddress.objects.filter(user=request.user)
     
     context = {
@@ -219,6 +266,16 @@ def order_success(request: HttpRequest, order_number: str) -> HttpResponse:
     return render(request, "ecommerce/order_success.html", context)
 
 
+def _stock_message(exc: InsufficientStockError) -> str:
+    """Customer-facing text for items that can't be held"""
+    if not exc.details:
+        return "Some items are no longer available."
+    return " ".join(
+        f"Only {max(int(detail['available']), 0)} of {detail['product'].name} left in stock."
+        for detail in exc.details
+    )
+
+
 # Customer Orders
 @login_required
 def my_orders(request: HttpRequest) -> HttpResponse:
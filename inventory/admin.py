@@ -5,10 +5,20 @@ from .models import (
     Brand,
     BranchStock,
     Category,
+    CostLayer,
+    InventoryValuation,
+    LocationStock,
     Product,
+    ProductStockSummary,
     ProductVariant,
+    ReorderPoint,
     StockMovement,
+    StockMovementArchive,
+    StockMovementRollup,
+    StockReservation,
+    StockShard,
     StockAlert,
+    StockCheckpoint,
     StockTransfer,
     StockTransferItem,
     Unit,
@@ -18,10 +28,21 @@ from .models import (
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ("name", "parent")
+    list_display = ("name", "parent", "depth")
     search_fields = ("name",)
+    ordering = ("path",)
     list_per_page = 50
 
+    def delete_queryset(self, request, queryset):
+        # Bulk deletes skip Category.delete, so re-index the survivors and
+        # move the deleted categories' valuation to uncategorised
+        from inventory.services.categories import CategoryTreeService
+        from inventory.services.valuation import InventoryValuationService
+
+        InventoryValuationService.merge_categories(queryset.values_list("pk", flat=True))
+        super().delete_queryset(request, queryset)
+        CategoryTreeService.rebuild()
+
 
 @admin.register(Brand)
 class BrandAdmin(admin.ModelAdmin):
@@ -56,7 +77,7 @@ class ProductAdmin(admin.ModelAdmin):
             "fields": ("cost_price", "selling_price")
         }),
         ("Stock Management", {
-            "fields": ("reorder_level", "expiry_alert_days", "has_variants")
+            "fields": ("reorder_level", "expiry_alert_days", "has_variants", "stock_shards")
         }),
         ("Identification", {
             "fields": ("barcode", "qr_code", "image")
@@ -87,15 +108,98 @@ class WarehouseStockAdmin(admin.ModelAdmin):
     date_hierarchy = "expiry_date"
 
 
+class StockShardInline(admin.TabularInline):
+    model = StockShard
+    extra = 0
+    fields = ("shard", "quantity")
+    readonly_fields = ("shard", "quantity")
+    can_delete = False
+
+
 @admin.register(BranchStock)
 class BranchStockAdmin(admin.ModelAdmin):
     list_display = ("branch", "product", "variant", "quantity", "batch_number", "expiry_date", "last_updated")
     list_filter = ("branch", "expiry_date", "last_updated")
     search_fields = ("branch__name", "product__name", "variant__name", "batch_number")
     readonly_fields = ("last_updated",)
+    inlines = [StockShardInline]
     date_hierarchy = "expiry_date"
 
 
+@admin.register(LocationStock)
+class LocationStockAdmin(admin.ModelAdmin):
+    list_display = ("branch", "location_type", "product", "variant", "quantity", "batch_number", "expiry_date")
+    list_filter = ("location_type", "branch", "branch__parent_branch")
+    search_fields = ("branch__name", "product__name", "product__sku", "variant__name", "batch_number")
+    
+    def has_add_permission(self, request):
+        # Database view over WarehouseStock and BranchStock
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ProductStockSummary)
+class ProductStockSummaryAdmin(admin.ModelAdmin):
+    list_display = ("product", "variant", "branch", "quantity", "updated_at")
+    list_filter = ("branch",)
+    search_fields = ("product__name", "product__sku", "variant__name")
+    readonly_fields = ("updated_at",)
+    
+    def has_add_permission(self, request):
+        # Maintained by StockService; use rebuild_stock_summary to repair
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(InventoryValuation)
+class InventoryValuationAdmin(admin.ModelAdmin):
+    list_display = ("branch", "category", "quantity", "value", "updated_at")
+    list_filter = ("branch",)
+    
+    def has_add_permission(self, request):
+        # Maintained by InventoryValuationService
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ReorderPoint)
+class ReorderPointAdmin(admin.ModelAdmin):
+    list_display = ("product", "branch", "daily_demand", "demand_std", "safety_stock", "reorder_level", "computed_at")
+    list_filter = ("branch",)
+    search_fields = ("product__name", "product__sku")
+    
+    def has_add_permission(self, request):
+        # Written by compute_reorder_points
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StockCheckpoint)
+class StockCheckpointAdmin(admin.ModelAdmin):
+    list_display = ("as_of", "branch", "product", "variant", "batch_number", "quantity")
+    list_filter = ("as_of", "branch")
+    search_fields = ("product__name", "product__sku", "batch_number")
+    date_hierarchy = "as_of"
+    
+    def has_add_permission(self, request):
+        # Written by create_stock_checkpoints
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(StockMovement)
 class StockMovementAdmin(admin.ModelAdmin):
     list_display = (
@@ -109,8 +213,8 @@ class StockMovementAdmin(admin.ModelAdmin):
         "created_by",
     )
     list_filter = ("movement_type", "source_branch", "dest_branch", "created_at")
-    search_fields = ("product__name", "variant__name", "reference", "notes")
-    readonly_fields = ("created_at",)
+    search_fields = ("product__name", "variant__name", "reference", "notes", "idempotency_key")
+    readonly_fields = ("created_at", "idempotency_key")
     date_hierarchy = "created_at"
     
     def has_add_permission(self, request):
@@ -122,6 +226,65 @@ class StockMovementAdmin(admin.ModelAdmin):
         return False
 
 
+@admin.register(StockMovementArchive)
+class StockMovementArchiveAdmin(admin.ModelAdmin):
+    list_display = (
+        "created_at",
+        "movement_type",
+        "product",
+        "quantity",
+        "source_branch",
+        "dest_branch",
+        "reference",
+    )
+    list_filter = ("month", "movement_type")
+    search_fields = ("product__name", "reference")
+    
+    def has_add_permission(self, request):
+        # Filled by archive_stock_movements
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StockMovementRollup)
+class StockMovementRollupAdmin(admin.ModelAdmin):
+    list_display = ("month", "product", "branch", "movement_type", "quantity", "cogs_amount", "movement_count")
+    list_filter = ("month", "movement_type", "branch")
+    search_fields = ("product__name", "product__sku")
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(CostLayer)
+class CostLayerAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "product", "variant", "branch", "unit_cost", "original_quantity", "remaining_quantity")
+    list_filter = ("branch", "created_at")
+    search_fields = ("product__name", "variant__name", "movement__reference")
+    readonly_fields = ("created_at",)
+    date_hierarchy = "created_at"
+    
+    def has_add_permission(self, request):
+        # Cost layers are created by stock movements only
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ("reference", "product", "variant", "branch", "quantity", "expires_at", "created_at")
+    list_filter = ("branch", "expires_at")
+    search_fields = ("reference", "product__name", "variant__name")
+    readonly_fields = ("created_at",)
+
+
 @admin.register(StockAlert)
 class StockAlertAdmin(admin.ModelAdmin):
     list_display = ("product", "branch", "alert_type", "current_quantity", "expiry_date", "is_resolved", "created_at")
@@ -149,7 +312,7 @@ class StockTransferAdmin(admin.ModelAdmin):
     list_display = ("transfer_number", "source_branch", "destination_branch", "status", "transfer_date", "created_at")
     list_filter = ("status", "source_branch", "destination_branch", "transfer_date", "created_at")
     search_fields = ("transfer_number", "notes")
-    readonly_fields = ("transfer_number", "created_at", "updated_at", "approved_at", "received_at")
+    readonly_fields = ("transfer_number", "created_at", "updated_at", "approved_at", "dispatched_at", "received_at")
     inlines = [StockTransferItemInline]
     date_hierarchy = "created_at"
     
@@ -161,7 +324,7 @@ class StockTransferAdmin(admin.ModelAdmin):
             "fields": ("transfer_date", "expected_delivery", "actual_delivery")
         }),
         ("Workflow", {
-            "fields": ("requested_by", "approved_by", "received_by", "approved_at", "received_at")
+            "fields": ("requested_by", "approved_by", "received_by", "approved_at", "dispatched_at", "received_at")
         }),
         ("Additional Information", {
             "fields": ("notes", "created_at", "updated_at"),
@@ -6,4 +6,5 @@ class InventoryConfig(AppConfig):
     name = "inventory"
     verbose_name = "Inventory Management"
 
-
+    def ready(self):
+        from inventory import signals  # noqa: F401
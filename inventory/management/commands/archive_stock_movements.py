@@ -0,0 +1,53 @@
+"""
+Management command to move old stock movements into the monthly archive
+Usage: python manage.py archive_stock_movements [--older-than-days 365] [--batch-size 5000] [--dry-run]
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from inventory.models import StockMovement
+from inventory.services.archive import StockArchiveService
+
+
+class Command(BaseCommand):
+    help = 'Archives stock movements older than the horizon and updates monthly rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days',
+            type=int,
+            default=365,
+            help='Archive horizon: movements older than this many days are moved',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Movements archived per transaction',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count the movements that would be archived',
+        )
+
+    def handle(self, *args, **options):
+        # Cut at midnight so reruns on the same day see the same horizon
+        today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        before = today - timedelta(days=options['older_than_days'])
+
+        if options['dry_run']:
+            count = (
+                StockMovement.objects.filter(created_at__lt=before)
+                .exclude(cost_layer__remaining_quantity__gt=0)
+                .count()
+            )
+            self.stdout.write(f'Would archive {count} movements created before {before:%Y-%m-%d}')
+            return
+
+        count = StockArchiveService.archive(before=before, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Archived {count} movements created before {before:%Y-%m-%d}'
+        ))
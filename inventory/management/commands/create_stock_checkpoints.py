@@ -0,0 +1,69 @@
+"""
+Management command to write point-in-time stock checkpoints
+Usage: python manage.py create_stock_checkpoints [--period daily|monthly] [--date YYYY-MM-DD] [--count N] [--keep-daily-days N]
+"""
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from inventory.services.history import StockHistoryService
+
+
+class Command(BaseCommand):
+    help = 'Writes StockCheckpoint balances used by point-in-time stock queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--period',
+            choices=['daily', 'monthly'],
+            default='daily',
+            help='daily: end of each day; monthly: last day of each month',
+        )
+        parser.add_argument(
+            '--date',
+            help='Latest date to checkpoint (default: yesterday, or the last month-end)',
+        )
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=1,
+            help='Number of periods to write, going back from --date',
+        )
+        parser.add_argument(
+            '--keep-daily-days',
+            type=int,
+            help='Afterwards delete daily checkpoints older than this (month-ends are kept)',
+        )
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                end = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['date']}")
+        else:
+            end = timezone.localdate() - timedelta(days=1)
+
+        if options['period'] == 'monthly' and (end + timedelta(days=1)).day != 1:
+            # Latest complete month-end on or before --date
+            end = end.replace(day=1) - timedelta(days=1)
+
+        dates = []
+        current = end
+        for _ in range(options['count']):
+            dates.append(current)
+            if options['period'] == 'monthly':
+                current = current.replace(day=1) - timedelta(days=1)
+            else:
+                current -= timedelta(days=1)
+
+        for checkpoint_date in dates:
+            count = StockHistoryService.create_checkpoint(checkpoint_date)
+            self.stdout.write(f'✓ {checkpoint_date}: {count} balances')
+
+        if options['keep_daily_days'] is not None:
+            deleted = StockHistoryService.prune(keep_daily_days=options['keep_daily_days'])
+            self.stdout.write(f'✓ Pruned {deleted} daily checkpoint rows')
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Wrote {len(dates)} stock checkpoints'))
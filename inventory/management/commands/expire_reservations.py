@@ -0,0 +1,23 @@
+"""
+Management command to release lapsed stock reservations
+Usage: python manage.py expire_reservations [--batch-size 5000]
+"""
+from django.core.management.base import BaseCommand
+
+from inventory.services.reservations import ReservationService
+
+
+class Command(BaseCommand):
+    help = 'Deletes stock reservations whose hold has expired'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Reservations deleted per statement',
+        )
+
+    def handle(self, *args, **options):
+        count = ReservationService.expire(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Released {count} expired reservations'))
@@ -0,0 +1,90 @@
+"""
+Management command to bulk import stock from a CSV or JSON Lines feed
+Usage: python manage.py import_stock feed.csv [--format csv|jsonl] [--chunk-size 5000] [--dry-run]
+"""
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.models import StockMovement
+from inventory.services.exceptions import StockImportError
+from inventory.services.importing import IMPORT_MOVEMENT_TYPES, StockImportService
+
+
+class Command(BaseCommand):
+    help = 'Imports stock rows (sku, branch, quantity, batch_number, expiry_date, cost_price) in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Feed file, or '-' for standard input")
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='Feed format (default: from the file extension)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Rows applied per transaction',
+        )
+        parser.add_argument(
+            '--movement-type',
+            default=StockMovement.MovementType.PURCHASE_IN,
+            choices=sorted(IMPORT_MOVEMENT_TYPES),
+            help='Movement type for rows that do not set one',
+        )
+        parser.add_argument('--reference', default='', help='Reference for rows without one')
+        parser.add_argument(
+            '--max-errors',
+            type=int,
+            default=100,
+            help='Abort after this many bad rows (0 aborts on the first)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate and resolve every row without writing anything',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        started = time.monotonic()
+        errors = []
+
+        def on_error(exc):
+            errors.append(exc)
+            self.stderr.write(str(exc))
+            if len(errors) > options['max_errors']:
+                raise CommandError(f'Aborted after {len(errors)} bad rows')
+
+        def on_progress(count):
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'  {count} rows ({count / elapsed if elapsed else 0:.0f} rows/s)')
+
+        try:
+            stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(str(exc))
+        try:
+            counts = StockImportService.import_rows(
+                StockImportService.read_rows(stream, fmt),
+                chunk_size=options['chunk_size'],
+                default_type=options['movement_type'],
+                reference=options['reference'],
+                dry_run=options['dry_run'],
+                on_error=on_error,
+                on_progress=on_progress,
+            )
+        except StockImportError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {verb} {counts['imported']} rows, skipped {counts['skipped']} "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,72 @@
+"""
+Management command to propose inter-branch transfers from surplus to deficit stock
+Usage: python manage.py rebalance_stock --user USERNAME [--fill-ratio 2] [--keep-ratio 2] [--no-siblings] [--min-quantity 1] [--dry-run]
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from inventory.services.replenishment import RebalancingService
+
+
+class Command(BaseCommand):
+    help = 'Plans transfers within each branch group and saves them as pending StockTransfers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username recorded as requester of the transfers')
+        parser.add_argument(
+            '--fill-ratio',
+            type=float,
+            default=2,
+            help='Refill a branch at or below its reorder level up to this multiple of it',
+        )
+        parser.add_argument(
+            '--keep-ratio',
+            type=float,
+            default=2,
+            help='Never take a source below this multiple of its own reorder level',
+        )
+        parser.add_argument(
+            '--no-siblings',
+            action='store_true',
+            help='Only move stock from a parent branch to its children',
+        )
+        parser.add_argument(
+            '--min-quantity',
+            type=int,
+            default=1,
+            help='Drop proposed lines below this many units',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Plan and report without saving',
+        )
+
+    def handle(self, *args, **options):
+        if options['keep_ratio'] < 1:
+            raise CommandError('--keep-ratio must be at least 1')
+        user = None
+        if not options['dry_run']:
+            if not options['user']:
+                raise CommandError('--user is required unless --dry-run is given')
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"Unknown user {options['user']!r}")
+
+        started = time.monotonic()
+        lines, transfers = RebalancingService.run(
+            requested_by=user,
+            fill_ratio=options['fill_ratio'],
+            keep_ratio=options['keep_ratio'],
+            allow_siblings=not options['no_siblings'],
+            min_quantity=options['min_quantity'],
+            dry_run=options['dry_run'],
+        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Planned {len(lines['quantity'])} lines ({int(lines['quantity'].sum())} units), "
+            f"created {len(transfers)} transfers in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,15 @@
+"""
+Management command to rebuild the category subtree index
+Usage: python manage.py rebuild_category_tree
+"""
+from django.core.management.base import BaseCommand
+
+from inventory.services.categories import CategoryTreeService
+
+
+class Command(BaseCommand):
+    help = 'Recomputes Category.path and depth from parent links'
+
+    def handle(self, *args, **options):
+        count = CategoryTreeService.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'✓ Fixed {count} category paths'))
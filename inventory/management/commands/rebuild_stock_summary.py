@@ -0,0 +1,33 @@
+"""
+Management command to rebuild and verify the ProductStockSummary projection
+Usage: python manage.py rebuild_stock_summary [--verify-only]
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.services.summary import StockSummaryService
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds ProductStockSummary from warehouse/branch stock and verifies it'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify-only',
+            action='store_true',
+            help='Only compare the summary with the stock tables, do not rebuild',
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            count = StockSummaryService.rebuild()
+            self.stdout.write(f'✓ Rebuilt {count} summary rows')
+
+        mismatches = StockSummaryService.verify()
+        for (product_id, variant_id, branch_id), expected, actual in mismatches:
+            self.stdout.write(self.style.WARNING(
+                f'  product={product_id} variant={variant_id} branch={branch_id}: '
+                f'expected {expected}, found {actual}'
+            ))
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} summary rows do not match stock')
+        self.stdout.write(self.style.SUCCESS('✅ Stock summary matches warehouse/branch stock'))
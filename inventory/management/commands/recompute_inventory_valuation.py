@@ -0,0 +1,39 @@
+"""
+Management command to recompute and verify the running inventory valuation
+Usage: python manage.py recompute_inventory_valuation [--verify-only] [--chunk-size 5000]
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.services.valuation import RECOMPUTE_CHUNK_SIZE, InventoryValuationService
+
+
+class Command(BaseCommand):
+    help = 'Recomputes InventoryValuation from the stock rows and verifies it'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify-only',
+            action='store_true',
+            help='Only compare the valuation with the stock rows, do not recompute',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=RECOMPUTE_CHUNK_SIZE,
+            help='Stock rows read per round trip',
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            count = InventoryValuationService.recompute(chunk_size=options['chunk_size'])
+            self.stdout.write(f'✓ Recomputed {count} valuation rows')
+
+        mismatches = InventoryValuationService.verify(chunk_size=options['chunk_size'])
+        for (branch_id, category_id), expected, actual in mismatches:
+            self.stdout.write(self.style.WARNING(
+                f'  branch={branch_id} category={category_id}: '
+                f'expected {expected[0]} units / {expected[1]}, found {actual[0]} units / {actual[1]}'
+            ))
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} valuation rows do not match stock')
+        self.stdout.write(self.style.SUCCESS('✅ Inventory valuation matches stock'))
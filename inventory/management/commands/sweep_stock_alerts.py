@@ -0,0 +1,32 @@
+"""
+Management command to sync stock alerts with current stock levels
+Usage: python manage.py sweep_stock_alerts [--date YYYY-MM-DD]
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.services.alerts import StockAlertService
+
+
+class Command(BaseCommand):
+    help = 'Creates low stock, out of stock and expiry alerts and resolves cleared ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='Reference date for expiry checks (YYYY-MM-DD, default today)',
+        )
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Invalid date {options['date']!r}")
+
+        counts = StockAlertService.sync(today=today)
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Created {counts['created']} alerts, resolved {counts['resolved']}"
+        ))
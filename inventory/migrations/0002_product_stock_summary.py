@@ -0,0 +1,127 @@
+# Generated by Django 5.0.14 on 2026-10-16 20:35
+
+import django.db.models.deletion
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def populate_stock_summary(apps, schema_editor):
+    ProductStockSummary = apps.get_model("inventory", "ProductStockSummary")
+    totals = defaultdict(Decimal)
+    for model_name in ("WarehouseStock", "BranchStock"):
+        stock_model = apps.get_model("inventory", model_name)
+        grouped = (
+            stock_model.objects.order_by()
+            .values("product_id", "variant_id", "branch_id")
+            .annotate(total=Sum("quantity"))
+        )
+        for row in grouped:
+            totals[(row["product_id"], row["variant_id"], row["branch_id"])] += row["total"]
+            totals[(row["product_id"], None, None)] += row["total"]
+    ProductStockSummary.objects.bulk_create(
+        [
+            ProductStockSummary(
+                product_id=product_id,
+                variant_id=variant_id,
+                branch_id=branch_id,
+                quantity=quantity,
+            )
+            for (product_id, variant_id, branch_id), quantity in totals.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+        ("inventory", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductStockSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "quantity",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "branch",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="accounts.branch",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_summaries",
+                        to="inventory.product",
+                    ),
+                ),
+                (
+                    "variant",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="inventory.productvariant",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Product stock summaries",
+                "indexes": [
+                    models.Index(
+                        fields=["branch", "product"],
+                        name="inventory_p_branch__fc0a3d_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="productstocksummary",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("variant__isnull", False)),
+                fields=("product", "variant", "branch"),
+                name="uniq_stock_summary_variant",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="productstocksummary",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(
+                    ("branch__isnull", False), ("variant__isnull", True)
+                ),
+                fields=("product", "branch"),
+                name="uniq_stock_summary_product",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="productstocksummary",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("branch__isnull", True)),
+                fields=("product",),
+                name="uniq_stock_summary_total",
+            ),
+        ),
+        migrations.RunPython(populate_stock_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.0.14 on 2026-10-16 20:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+        ("inventory", "0002_product_stock_summary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stockmovement",
+            name="cogs_amount",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                help_text="FIFO cost of goods for OUT movements",
+                max_digits=14,
+                null=True,
+            ),
+        ),
+        migrations.CreateModel(
+            name="CostLayer",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("unit_cost", models.DecimalField(decimal_places=2, max_digits=12)),
+                (
+                    "original_quantity",
+                    models.DecimalField(decimal_places=2, max_digits=12),
+                ),
+                (
+                    "remaining_quantity",
+                    models.DecimalField(decimal_places=2, max_digits=12),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "branch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="accounts.branch",
+                    ),
+                ),
+                (
+                    "movement",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="cost_layer",
+                        to="inventory.stockmovement",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="inventory.product",
+                    ),
+                ),
+                (
+                    "variant",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="inventory.productvariant",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["created_at", "id"],
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("remaining_quantity__gt", 0)),
+                        fields=["product", "variant", "branch", "created_at"],
+                        name="costlayer_open_fifo_idx",
+                    )
+                ],
+            },
+        ),
+    ]
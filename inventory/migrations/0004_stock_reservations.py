@@ -0,0 +1,78 @@
+# Generated by Django 5.0.14 on 2026-10-16 20:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+        ("inventory", "0003_cost_layers"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockReservation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantity", models.DecimalField(decimal_places=2, max_digits=12)),
+                (
+                    "reference",
+                    models.CharField(
+                        help_text="Holder of the reservation, e.g. cart-item-42",
+                        max_length=100,
+                    ),
+                ),
+                ("expires_at", models.DateTimeField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "branch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_reservations",
+                        to="accounts.branch",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="inventory.product",
+                    ),
+                ),
+                (
+                    "variant",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="inventory.productvariant",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["expires_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["product", "branch", "variant", "expires_at"],
+                        name="inventory_s_product_00f661_idx",
+                    ),
+                    models.Index(
+                        fields=["expires_at"], name="inventory_s_expires_9d6a1b_idx"
+                    ),
+                    models.Index(
+                        fields=["reference"], name="inventory_s_referen_3256ca_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
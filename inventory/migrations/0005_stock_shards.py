@@ -0,0 +1,52 @@
+# Generated by Django 5.0.14 on 2026-10-16 20:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0004_stock_reservations"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="stock_shards",
+            field=models.PositiveSmallIntegerField(
+                default=0,
+                help_text="Hot SKUs: split shop stock into this many counters (0 = off)",
+            ),
+        ),
+        migrations.CreateModel(
+            name="StockShard",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("shard", models.PositiveSmallIntegerField()),
+                (
+                    "quantity",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "stock",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shards",
+                        to="inventory.branchstock",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("stock", "shard")},
+            },
+        ),
+    ]
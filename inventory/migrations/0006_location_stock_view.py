@@ -0,0 +1,73 @@
+# Generated by Django 5.0.14 on 2026-10-16 20:47
+
+from django.db import migrations, models
+
+# Ids are interleaved (even: warehouse rows, odd: branch rows) so they stay unique
+CREATE_VIEW = """
+CREATE VIEW inventory_location_stock AS
+SELECT
+    ws.id * 2 AS id,
+    ws.id AS stock_id,
+    'warehouse' AS location_type,
+    ws.branch_id,
+    ws.product_id,
+    ws.variant_id,
+    ws.quantity,
+    ws.expiry_date,
+    ws.batch_number,
+    ws.last_updated
+FROM inventory_warehousestock ws
+UNION ALL
+SELECT
+    bs.id * 2 + 1 AS id,
+    bs.id AS stock_id,
+    'branch' AS location_type,
+    bs.branch_id,
+    bs.product_id,
+    bs.variant_id,
+    CAST(
+        bs.quantity + COALESCE(
+            (SELECT SUM(sh.quantity) FROM inventory_stockshard sh WHERE sh.stock_id = bs.id),
+            0
+        ) AS DECIMAL(12, 2)
+    ) AS quantity,
+    bs.expiry_date,
+    bs.batch_number,
+    bs.last_updated
+FROM inventory_branchstock bs
+"""
+
+DROP_VIEW = "DROP VIEW IF EXISTS inventory_location_stock"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0005_stock_shards"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LocationStock",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("stock_id", models.BigIntegerField()),
+                (
+                    "location_type",
+                    models.CharField(
+                        choices=[("warehouse", "Warehouse"), ("branch", "Branch")],
+                        max_length=10,
+                    ),
+                ),
+                ("quantity", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("expiry_date", models.DateField(blank=True, null=True)),
+                ("batch_number", models.CharField(blank=True, max_length=100)),
+                ("last_updated", models.DateTimeField()),
+            ],
+            options={
+                "db_table": "inventory_location_stock",
+                "managed": False,
+            },
+        ),
+        migrations.RunSQL(CREATE_VIEW, DROP_VIEW),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.0.14 on 2026-10-16 20:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+        ("inventory", "0006_location_stock_view"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("as_of", models.DateField()),
+                ("batch_number", models.CharField(blank=True, max_length=100)),
+                ("quantity", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "branch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_checkpoints",
+                        to="accounts.branch",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="inventory.product",
+                    ),
+                ),
+                (
+                    "variant",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="inventory.productvariant",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-as_of"],
+                "indexes": [
+                    models.Index(
+                        fields=["product", "-as_of"],
+                        name="inventory_s_product_7a147d_idx",
+                    )
+                ],
+                "unique_together": {
+                    ("as_of", "branch", "product", "variant", "batch_number")
+                },
+            },
+        ),
+    ]
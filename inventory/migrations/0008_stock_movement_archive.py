@@ -0,0 +1,197 @@
+# Generated by Django 5.0.14 on 2026-10-16 20:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+        ("inventory", "0007_stock_checkpoints"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockMovementArchive",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "movement_id",
+                    models.BigIntegerField(
+                        help_text="Original StockMovement id", unique=True
+                    ),
+                ),
+                ("month", models.DateField()),
+                ("quantity", models.DecimalField(decimal_places=2, max_digits=12)),
+                (
+                    "movement_type",
+                    models.CharField(
+                        choices=[
+                            ("purchase_in", "Purchase (IN)"),
+                            ("pos_sale_out", "POS Sale (OUT)"),
+                            ("online_order_out", "Online Order (OUT)"),
+                            ("transfer_in", "Transfer (IN)"),
+                            ("transfer_out", "Transfer (OUT)"),
+                            ("return_in", "Return (IN)"),
+                            ("damage_out", "Damage (OUT)"),
+                            ("adjustment_in", "Manual Adjustment (IN)"),
+                            ("adjustment_out", "Manual Adjustment (OUT)"),
+                        ],
+                        max_length=50,
+                    ),
+                ),
+                ("reference", models.CharField(blank=True, max_length=100)),
+                ("batch_number", models.CharField(blank=True, max_length=100)),
+                ("expiry_date", models.DateField(blank=True, null=True)),
+                ("notes", models.TextField(blank=True)),
+                (
+                    "cost_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=12, null=True
+                    ),
+                ),
+                (
+                    "cogs_amount",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=14, null=True
+                    ),
+                ),
+                ("created_at", models.DateTimeField()),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="archived_movements_created",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "dest_branch",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="archived_movements_dest",
+                        to="accounts.branch",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="inventory.product",
+                    ),
+                ),
+                (
+                    "source_branch",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="archived_movements_source",
+                        to="accounts.branch",
+                    ),
+                ),
+                (
+                    "variant",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="inventory.productvariant",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["month", "product"], name="inventory_s_month_b4a7e2_idx"
+                    ),
+                    models.Index(
+                        fields=["product", "-created_at"],
+                        name="inventory_s_product_af4d3c_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="StockMovementRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.DateField()),
+                (
+                    "movement_type",
+                    models.CharField(
+                        choices=[
+                            ("purchase_in", "Purchase (IN)"),
+                            ("pos_sale_out", "POS Sale (OUT)"),
+                            ("online_order_out", "Online Order (OUT)"),
+                            ("transfer_in", "Transfer (IN)"),
+                            ("transfer_out", "Transfer (OUT)"),
+                            ("return_in", "Return (IN)"),
+                            ("damage_out", "Damage (OUT)"),
+                            ("adjustment_in", "Manual Adjustment (IN)"),
+                            ("adjustment_out", "Manual Adjustment (OUT)"),
+                        ],
+                        max_length=50,
+                    ),
+                ),
+                (
+                    "quantity",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "cogs_amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                ("movement_count", models.PositiveIntegerField(default=0)),
+                (
+                    "branch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="movement_rollups",
+                        to="accounts.branch",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="inventory.product",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-month"],
+                "indexes": [
+                    models.Index(
+                        fields=["product", "-month"],
+                        name="inventory_s_product_e23eb5_idx",
+                    )
+                ],
+                "unique_together": {("month", "product", "branch", "movement_type")},
+            },
+        ),
+    ]
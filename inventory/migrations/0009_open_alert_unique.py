@@ -0,0 +1,50 @@
+# Generated by Django 5.0.14 on 2026-10-16 21:10
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+from django.utils import timezone
+
+
+def resolve_duplicate_open_alerts(apps, schema_editor):
+    """Keep the oldest open alert per location and type; resolve the rest"""
+    StockAlert = apps.get_model("inventory", "StockAlert")
+    open_alerts = StockAlert.objects.filter(is_resolved=False)
+    keep = (
+        open_alerts.values("product_id", "variant_id", "branch_id", "alert_type")
+        .order_by()
+        .annotate(first_id=Min("id"))
+        .values("first_id")
+    )
+    open_alerts.exclude(id__in=keep).update(
+        is_resolved=True, resolved_at=timezone.now()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+        ("inventory", "0008_stock_movement_archive"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(resolve_duplicate_open_alerts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="stockalert",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_resolved", False), ("variant__isnull", False)),
+                fields=("product", "variant", "branch", "alert_type"),
+                name="uniq_open_alert_variant",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="stockalert",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_resolved", False), ("variant__isnull", True)),
+                fields=("product", "branch", "alert_type"),
+                name="uniq_open_alert_product",
+            ),
+        ),
+    ]
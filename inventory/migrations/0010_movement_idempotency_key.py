@@ -0,0 +1,24 @@
+# Generated by Django 5.0.14 on 2026-10-16 21:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0009_open_alert_unique"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stockmovement",
+            name="idempotency_key",
+            field=models.CharField(
+                blank=True,
+                help_text="Client-supplied key; a retried request with the same key is not applied twice",
+                max_length=100,
+                null=True,
+                unique=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.0.14 on 2026-10-16 21:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+        ("inventory", "0010_movement_idempotency_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReorderPoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "daily_demand",
+                    models.DecimalField(
+                        decimal_places=3,
+                        help_text="Average units out per day",
+                        max_digits=12,
+                    ),
+                ),
+                (
+                    "demand_std",
+                    models.DecimalField(
+                        decimal_places=3,
+                        help_text="Standard deviation of daily demand",
+                        max_digits=12,
+                    ),
+                ),
+                ("safety_stock", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("reorder_level", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("computed_at", models.DateTimeField()),
+                (
+                    "branch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="accounts.branch",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reorder_points",
+                        to="inventory.product",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("product", "branch")},
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.14 on 2026-10-16 21:40
+
+from django.db import migrations, models
+
+
+def populate_category_paths(apps, schema_editor):
+    """Fill path and depth from parent links; categories in a cycle become roots"""
+    Category = apps.get_model("inventory", "Category")
+    parents = dict(Category.objects.values_list("id", "parent_id"))
+    paths = {}
+    for category_id in parents:
+        chain = []
+        current = category_id
+        while current not in paths:
+            chain.append(current)
+            parent_id = parents[current]
+            if parent_id is None or parent_id not in parents or parent_id in chain:
+                break
+            current = parent_id
+        prefix = paths.get(current, "") if current not in chain else ""
+        for pk in reversed(chain):
+            prefix = f"{prefix}{pk}/"
+            paths[pk] = prefix
+
+    categories = list(Category.objects.all())
+    for category in categories:
+        category.path = paths[category.pk]
+        category.depth = category.path.count("/") - 1
+    Category.objects.bulk_update(categories, ["path", "depth"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0011_reorder_points"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="path",
+            field=models.CharField(db_index=True, default="", editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="depth",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_category_paths, migrations.RunPython.noop),
+    ]
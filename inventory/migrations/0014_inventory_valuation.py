@@ -0,0 +1,108 @@
+# Generated by Django 5.0.14 on 2026-10-16 22:10
+
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_valuation(apps, schema_editor):
+    """Value current stock at each product's cost price"""
+    InventoryValuation = apps.get_model("inventory", "InventoryValuation")
+    totals = defaultdict(lambda: [Decimal("0"), Decimal("0")])
+    def add(branch_id, category_id, quantity, cost_price):
+        total = totals[(branch_id, category_id)]
+        total[0] += quantity
+        total[1] += quantity * cost_price
+
+    for model_name in ("WarehouseStock", "BranchStock"):
+        rows = (
+            apps.get_model("inventory", model_name)
+            .objects.exclude(quantity=0)
+            .values_list("branch_id", "product__category_id", "quantity", "product__cost_price")
+        )
+        for row in rows.iterator(chunk_size=5000):
+            add(*row)
+    # Hot-SKU shop stock held in shard counters
+    shards = (
+        apps.get_model("inventory", "StockShard")
+        .objects.exclude(quantity=0)
+        .values_list(
+            "stock__branch_id",
+            "stock__product__category_id",
+            "quantity",
+            "stock__product__cost_price",
+        )
+    )
+    for row in shards.iterator(chunk_size=5000):
+        add(*row)
+    InventoryValuation.objects.bulk_create(
+        [
+            InventoryValuation(
+                branch_id=branch_id, category_id=category_id, quantity=quantity, value=value
+            )
+            for (branch_id, category_id), (quantity, value) in totals.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+        ("inventory", "0013_scan_index_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InventoryValuation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantity", models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ("value", models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "branch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="valuations",
+                        to="accounts.branch",
+                    ),
+                ),
+                (
+                    "category",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="inventory.category",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("category__isnull", False)),
+                        fields=("branch", "category"),
+                        name="uniq_valuation_category",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("category__isnull", True)),
+                        fields=("branch",),
+                        name="uniq_valuation_uncategorised",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(populate_valuation, migrations.RunPython.noop),
+    ]
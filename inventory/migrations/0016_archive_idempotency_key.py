@@ -0,0 +1,24 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0015_category_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stockmovementarchive",
+            name="idempotency_key",
+            field=models.CharField(
+                blank=True,
+                help_text="Kept so a late retry of an archived movement still replays",
+                max_length=100,
+                null=True,
+                unique=True,
+            ),
+        ),
+    ]
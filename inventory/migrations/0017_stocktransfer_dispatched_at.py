@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0016_archive_idempotency_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stocktransfer",
+            name="dispatched_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.0.14 on 2026-10-17 09:20
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_rows(apps, schema_editor):
+    """Fold stock rows without a variant that repeat a location into the oldest one"""
+    StockShard = apps.get_model("inventory", "StockShard")
+    for model_name in ("WarehouseStock", "BranchStock"):
+        Stock = apps.get_model("inventory", model_name)
+        duplicates = (
+            Stock.objects.filter(variant__isnull=True)
+            .values("branch_id", "product_id", "batch_number")
+            .order_by()
+            .annotate(rows=Count("id"), first_id=Min("id"))
+            .filter(rows__gt=1)
+        )
+        for duplicate in duplicates:
+            rows = Stock.objects.filter(
+                variant__isnull=True,
+                branch_id=duplicate["branch_id"],
+                product_id=duplicate["product_id"],
+                batch_number=duplicate["batch_number"],
+            )
+            extra = rows.exclude(id=duplicate["first_id"])
+            total = extra.aggregate(total=Sum("quantity"))["total"]
+            if model_name == "BranchStock":
+                in_shards = StockShard.objects.filter(stock__in=extra).aggregate(
+                    total=Sum("quantity")
+                )["total"]
+                total += in_shards or 0
+            kept = rows.get(id=duplicate["first_id"])
+            kept.quantity += total
+            kept.save(update_fields=["quantity"])
+            extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0017_stocktransfer_dispatched_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="warehousestock",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("variant__isnull", True)),
+                fields=("branch", "product", "batch_number"),
+                name="uniq_warehouse_stock_product",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="branchstock",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("variant__isnull", True)),
+                fields=("branch", "product", "batch_number"),
+                name="uniq_branch_stock_product",
+            ),
+        ),
+    ]
@@ -1,12 +1,17 @@
 from __future__ import annotations
 
-from django.db import models
-from django.db.models import Sum
+from django.db import models, transaction
 
 from accounts.models import Branch
 
 
 class Category(models.Model):
+    """
+    Product category. ``path`` lists the ids from the root down to this category
+    ("3/17/42/"), so a subtree is one indexed prefix match; it is kept up to date
+    by ``save`` and ``delete`` (rebuild with ``rebuild_category_tree``).
+    """
+
     name = models.CharField(max_length=150)
     parent = models.ForeignKey(
         "self",
@@ -15,6 +20,9 @@ class Category(models.Model):
         blank=True,
         related_name="children",
     )
+    path = models.CharField(max_length=255, db_index=True, editable=False, default="")
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -22,6 +30,25 @@ class Category(models.Model):
     def __str__(self) -> str:
         return self.name
 
+    def save(self, *args, **kwargs):
+        from inventory.services.categories import CategoryTreeService
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            CategoryTreeService.place(self)
+
+    def delete(self, *args, **kwargs):
+        from inventory.services.categories import CategoryTreeService
+        from inventory.services.valuation import InventoryValuationService
+
+        with transaction.atomic():
+            path = Category.objects.filter(pk=self.pk).values_list("path", flat=True).first()
+            # Its products become uncategorised; so does their valuation
+            InventoryValuationService.merge_categories([self.pk])
+            result = super().delete(*args, **kwargs)
+            CategoryTreeService.detach(path)
+        return result
+
 
 class Brand(models.Model):
     name = models.CharField(max_length=150, unique=True)
@@ -67,6 +94,10 @@ class Product(models.Model):
         default=30,
         help_text="Alert this many days before expiry"
     )
+    stock_shards = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Hot SKUs: split shop stock into this many counters (0 = off)"
+    )
     
     # Product details
     weight = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
@@ -74,23 +105,41 @@ class Product(models.Model):
     
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self) -> str:
         return self.name
 
+    def save(self, *args, **kwargs):
+        from inventory.services.valuation import InventoryValuationService
+
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = (
+                    Product.objects.filter(pk=self.pk)
+                    .values_list("category_id", "cost_price")
+                    .first()
+                )
+            super().save(*args, **kwargs)
+            if previous is not None:
+                # Stock already on hand is revalued at the new cost / category
+                InventoryValuationService.revalue(self, *previous)
+
     def total_stock_quantity(self) -> float:
         """
         Helper to get total stock across all branches/warehouses for this product.
-        For now this ignores variants for simplicity; later we can expand.
+        Reads the maintained ProductStockSummary total (all variants included);
+        querysets annotated with ``stock_total`` skip the query entirely.
         """
-        warehouse_total = (
-            self.warehousestock_set.aggregate(total=Sum("quantity"))["total"] or 0
-        )
-        branch_total = (
-            self.branchstock_set.aggregate(total=Sum("quantity"))["total"] or 0
+        if hasattr(self, "stock_total"):
+            return float(self.stock_total or 0)
+        total = (
+            ProductStockSummary.objects.filter(product=self, branch__isnull=True)
+            .values_list("quantity", flat=True)
+            .first()
         )
-        return float(warehouse_total + branch_total)
+        return float(total or 0)
 
 
 class ProductVariant(models.Model):
@@ -106,6 +155,7 @@ class ProductVariant(models.Model):
     sku = models.CharField(max_length=100, unique=True)
     barcode = models.CharField(max_length=100, blank=True, null=True, unique=True)
     is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self) -> str:
         return f"{self.product.name} - {self.name}"
@@ -129,6 +179,15 @@ class WarehouseStock(models.Model):
 
     class Meta:
         unique_together = ("branch", "product", "variant", "batch_number")
+        # NULLs never collide in unique_together, so rows without a variant
+        # need their own constraint
+        constraints = [
+            models.UniqueConstraint(
+                fields=["branch", "product", "batch_number"],
+                condition=models.Q(variant__isnull=True),
+                name="uniq_warehouse_stock_product",
+            ),
+        ]
         indexes = [
             models.Index(fields=["product", "branch"]),
             models.Index(fields=["expiry_date"]),
@@ -169,6 +228,15 @@ class BranchStock(models.Model):
 
     class Meta:
         unique_together = ("branch", "product", "variant", "batch_number")
+        # NULLs never collide in unique_together, so rows without a variant
+        # need their own constraint
+        constraints = [
+            models.UniqueConstraint(
+                fields=["branch", "product", "batch_number"],
+                condition=models.Q(variant__isnull=True),
+                name="uniq_branch_stock_product",
+            ),
+        ]
         indexes = [
             models.Index(fields=["product", "branch"]),
             models.Index(fields=["expiry_date"]),
@@ -191,6 +259,190 @@ class BranchStock(models.Model):
         return self.expiry_date <= alert_date
 
 
+class StockShard(models.Model):
+    """
+    Slice of a hot SKU's BranchStock that one group of registers sells from,
+    so concurrent sales don't queue on a single row. On-hand for the row is its
+    own quantity plus all of its shards (see ShardedStockService).
+    """
+    
+    stock = models.ForeignKey(
+        BranchStock, on_delete=models.CASCADE, related_name="shards"
+    )
+    shard = models.PositiveSmallIntegerField()
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    class Meta:
+        unique_together = ("stock", "shard")
+    
+    def __str__(self) -> str:
+        return f"{self.stock} [shard {self.shard}]: {self.quantity}"
+
+
+class LocationStock(models.Model):
+    """
+    Read-only database view over WarehouseStock and BranchStock, so company-wide
+    stock questions are one query instead of one per table. ``quantity`` is
+    on-hand, including stock held in StockShard rows. The view's ``id`` is
+    derived from the source row (``stock_id``), which keeps it unique across
+    both tables.
+    """
+
+    class LocationType(models.TextChoices):
+        WAREHOUSE = "warehouse", "Warehouse"
+        BRANCH = "branch", "Branch"
+
+    id = models.BigIntegerField(primary_key=True)
+    stock_id = models.BigIntegerField()
+    location_type = models.CharField(max_length=10, choices=LocationType.choices)
+    branch = models.ForeignKey(
+        Branch, on_delete=models.DO_NOTHING, related_name="location_stocks"
+    )
+    product = models.ForeignKey(
+        Product, on_delete=models.DO_NOTHING, related_name="location_stocks"
+    )
+    variant = models.ForeignKey(
+        ProductVariant, on_delete=models.DO_NOTHING, null=True, blank=True
+    )
+    quantity = models.DecimalField(max_digits=12, decimal_places=2)
+    expiry_date = models.DateField(null=True, blank=True)
+    batch_number = models.CharField(max_length=100, blank=True)
+    last_updated = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = "inventory_location_stock"
+
+    def __str__(self) -> str:
+        return f"{self.branch} - {self.product} ({self.variant or 'No variant'})"
+
+    def is_low_stock(self) -> bool:
+        """Check if stock is below reorder level"""
+        return self.quantity <= self.product.reorder_level
+
+    def is_expiring_soon(self) -> bool:
+        """Check if product is expiring soon"""
+        if not self.expiry_date:
+            return False
+        from django.utils import timezone
+        from datetime import timedelta
+        alert_date = timezone.now().date() + timedelta(days=self.product.expiry_alert_days)
+        return self.expiry_date <= alert_date
+
+
+class ProductStockSummary(models.Model):
+    """
+    Denormalized stock totals, kept in step with every movement by StockService.
+    
+    Rows with a branch hold one product/variant at one branch (all batches,
+    warehouse or shop). The row with ``branch`` NULL (and ``variant`` NULL) is the
+    company-wide total for the product. Rebuild with ``rebuild_stock_summary``.
+    """
+    
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="stock_summaries"
+    )
+    variant = models.ForeignKey(
+        ProductVariant, on_delete=models.CASCADE, null=True, blank=True
+    )
+    branch = models.ForeignKey(
+        Branch, on_delete=models.CASCADE, null=True, blank=True
+    )
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name_plural = "Product stock summaries"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "variant", "branch"],
+                condition=models.Q(variant__isnull=False),
+                name="uniq_stock_summary_variant",
+            ),
+            models.UniqueConstraint(
+                fields=["product", "branch"],
+                condition=models.Q(variant__isnull=True, branch__isnull=False),
+                name="uniq_stock_summary_product",
+            ),
+            models.UniqueConstraint(
+                fields=["product"],
+                condition=models.Q(branch__isnull=True),
+                name="uniq_stock_summary_total",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["branch", "product"]),
+        ]
+    
+    def __str__(self) -> str:
+        location = self.branch or "All locations"
+        return f"{self.product} ({self.variant or 'No variant'}) @ {location}: {self.quantity}"
+
+
+class InventoryValuation(models.Model):
+    """
+    Running on-hand quantity and value (quantity x ``Product.cost_price``) per
+    branch and product category, adjusted after every stock movement by
+    ``InventoryValuationService``. ``category`` NULL holds uncategorised
+    products. Recompute with ``recompute_inventory_valuation``.
+    """
+
+    branch = models.ForeignKey(
+        Branch, on_delete=models.CASCADE, related_name="valuations"
+    )
+    category = models.ForeignKey(
+        Category, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    quantity = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    value = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["branch", "category"],
+                condition=models.Q(category__isnull=False),
+                name="uniq_valuation_category",
+            ),
+            models.UniqueConstraint(
+                fields=["branch"],
+                condition=models.Q(category__isnull=True),
+                name="uniq_valuation_uncategorised",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.branch} / {self.category or 'Uncategorised'}: {self.value}"
+
+
+class ReorderPoint(models.Model):
+    """
+    Computed reorder level for a product at a branch, written by
+    ``compute_reorder_points`` from recent demand. Where a row exists, low stock
+    alerts use it instead of ``Product.reorder_level``.
+    """
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="reorder_points"
+    )
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    daily_demand = models.DecimalField(
+        max_digits=12, decimal_places=3, help_text="Average units out per day"
+    )
+    demand_std = models.DecimalField(
+        max_digits=12, decimal_places=3, help_text="Standard deviation of daily demand"
+    )
+    safety_stock = models.DecimalField(max_digits=12, decimal_places=2)
+    reorder_level = models.DecimalField(max_digits=12, decimal_places=2)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("product", "branch")
+
+    def __str__(self) -> str:
+        return f"{self.product} @ {self.branch}: {self.reorder_level}"
+
+
 class StockMovement(models.Model):
     class MovementType(models.TextChoices):
         PURCHASE_IN = "purchase_in", "Purchase (IN)"
@@ -203,6 +455,20 @@ class StockMovement(models.Model):
         ADJUSTMENT_IN = "adjustment_in", "Manual Adjustment (IN)"
         ADJUSTMENT_OUT = "adjustment_out", "Manual Adjustment (OUT)"
 
+    OUT_TYPES = frozenset({
+        MovementType.POS_SALE_OUT,
+        MovementType.ONLINE_ORDER_OUT,
+        MovementType.TRANSFER_OUT,
+        MovementType.DAMAGE_OUT,
+        MovementType.ADJUSTMENT_OUT,
+    })
+    IN_TYPES = frozenset({
+        MovementType.PURCHASE_IN,
+        MovementType.RETURN_IN,
+        MovementType.TRANSFER_IN,
+        MovementType.ADJUSTMENT_IN,
+    })
+
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     variant = models.ForeignKey(
         ProductVariant, on_delete=models.CASCADE, null=True, blank=True
@@ -239,6 +505,20 @@ class StockMovement(models.Model):
         blank=True,
         help_text="For FIFO cost tracking"
     )
+    cogs_amount = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        help_text="FIFO cost of goods for OUT movements"
+    )
+    idempotency_key = models.CharField(
+        max_length=100,
+        null=True,
+        blank=True,
+        unique=True,
+        help_text="Client-supplied key; a retried request with the same key is not applied twice",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(
         "accounts.User",
@@ -260,6 +540,195 @@ class StockMovement(models.Model):
         return f"{self.get_movement_type_display()} - {self.product} ({self.quantity})"
 
 
+class StockMovementArchive(models.Model):
+    """
+    StockMovement rows older than the archive horizon, moved here by
+    ``archive_stock_movements`` so the hot table and its indexes stay small.
+    Rows are grouped by ``month`` (first day of the month they were created in).
+    """
+
+    movement_id = models.BigIntegerField(unique=True, help_text="Original StockMovement id")
+    month = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    variant = models.ForeignKey(
+        ProductVariant, on_delete=models.CASCADE, null=True, blank=True
+    )
+    quantity = models.DecimalField(max_digits=12, decimal_places=2)
+    movement_type = models.CharField(max_length=50, choices=StockMovement.MovementType.choices)
+    source_branch = models.ForeignKey(
+        Branch,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="archived_movements_source",
+    )
+    dest_branch = models.ForeignKey(
+        Branch,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="archived_movements_dest",
+    )
+    reference = models.CharField(max_length=100, blank=True)
+    batch_number = models.CharField(max_length=100, blank=True)
+    expiry_date = models.DateField(null=True, blank=True)
+    notes = models.TextField(blank=True)
+    cost_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    cogs_amount = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
+    idempotency_key = models.CharField(
+        max_length=100,
+        null=True,
+        blank=True,
+        unique=True,
+        help_text="Kept so a late retry of an archived movement still replays",
+    )
+    created_at = models.DateTimeField()
+    created_by = models.ForeignKey(
+        "accounts.User",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="archived_movements_created",
+    )
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["month", "product"]),
+            models.Index(fields=["product", "-created_at"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"[{self.month:%Y-%m}] {self.get_movement_type_display()} - {self.product} ({self.quantity})"
+
+
+class StockMovementRollup(models.Model):
+    """
+    Monthly totals per (product, branch, movement type), kept for history
+    reports once the individual movements are archived. ``branch`` is the
+    source branch for OUT movements and the destination for IN movements.
+    """
+
+    month = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    branch = models.ForeignKey(
+        Branch, on_delete=models.CASCADE, related_name="movement_rollups"
+    )
+    movement_type = models.CharField(max_length=50, choices=StockMovement.MovementType.choices)
+    quantity = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cogs_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    movement_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-month"]
+        unique_together = ("month", "product", "branch", "movement_type")
+        indexes = [
+            models.Index(fields=["product", "-month"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.month:%Y-%m} {self.product} @ {self.branch}: {self.movement_type} {self.quantity}"
+
+
+class CostLayer(models.Model):
+    """
+    FIFO cost layer: the part of one IN movement still on hand at a location.
+    OUT movements consume the oldest open layers first (see CostLayerService).
+    """
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    variant = models.ForeignKey(
+        ProductVariant, on_delete=models.CASCADE, null=True, blank=True
+    )
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    movement = models.OneToOneField(
+        StockMovement, on_delete=models.CASCADE, related_name="cost_layer"
+    )
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=2)
+    original_quantity = models.DecimalField(max_digits=12, decimal_places=2)
+    remaining_quantity = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ["created_at", "id"]
+        indexes = [
+            # Only open layers are ever walked, so keep exhausted ones out of the index
+            models.Index(
+                fields=["product", "variant", "branch", "created_at"],
+                condition=models.Q(remaining_quantity__gt=0),
+                name="costlayer_open_fifo_idx",
+            ),
+        ]
+    
+    def __str__(self) -> str:
+        return f"{self.product} @ {self.branch}: {self.remaining_quantity} x {self.unit_cost}"
+
+
+class StockReservation(models.Model):
+    """
+    Temporary hold on stock at a location (e.g. an item in a customer's cart).
+    Live holds (``expires_at`` in the future) are subtracted from available-to-promise.
+    """
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    variant = models.ForeignKey(
+        ProductVariant, on_delete=models.CASCADE, null=True, blank=True
+    )
+    branch = models.ForeignKey(
+        Branch, on_delete=models.CASCADE, related_name="stock_reservations"
+    )
+    quantity = models.DecimalField(max_digits=12, decimal_places=2)
+    reference = models.CharField(
+        max_length=100,
+        help_text="Holder of the reservation, e.g. cart-item-42",
+    )
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ["expires_at"]
+        indexes = [
+            models.Index(fields=["product", "branch", "variant", "expires_at"]),
+            models.Index(fields=["expires_at"]),
+            models.Index(fields=["reference"]),
+        ]
+    
+    def __str__(self) -> str:
+        return f"{self.reference}: {self.product} x {self.quantity} @ {self.branch}"
+
+
+class StockCheckpoint(models.Model):
+    """
+    On-hand balance of a stock row at the end of ``as_of`` (local time).
+
+    Each checkpoint date holds a row for every non-zero balance at that date, so a
+    location missing from a checkpoint had nothing on hand. Written by the
+    ``create_stock_checkpoints`` command and read by StockHistoryService.
+    """
+
+    as_of = models.DateField()
+    branch = models.ForeignKey(
+        Branch, on_delete=models.CASCADE, related_name="stock_checkpoints"
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    variant = models.ForeignKey(
+        ProductVariant, on_delete=models.CASCADE, null=True, blank=True
+    )
+    batch_number = models.CharField(max_length=100, blank=True)
+    quantity = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-as_of"]
+        unique_together = ("as_of", "branch", "product", "variant", "batch_number")
+        indexes = [
+            models.Index(fields=["product", "-as_of"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.as_of}: {self.branch} - {self.product} = {self.quantity}"
+
+
 class StockAlert(models.Model):
     """Track low stock and expiry alerts"""
     
@@ -290,6 +759,19 @@ class StockAlert(models.Model):
     
     class Meta:
         ordering = ["-created_at"]
+        # At most one open alert per location and type; resolved alerts are history
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "variant", "branch", "alert_type"],
+                condition=models.Q(is_resolved=False, variant__isnull=False),
+                name="uniq_open_alert_variant",
+            ),
+            models.UniqueConstraint(
+                fields=["product", "branch", "alert_type"],
+                condition=models.Q(is_resolved=False, variant__isnull=True),
+                name="uniq_open_alert_product",
+            ),
+        ]
         indexes = [
             models.Index(fields=["is_resolved", "-created_at"]),
             models.Index(fields=["product", "branch"]),
@@ -351,6 +833,7 @@ class StockTransfer(models.Model):
     )
     
     approved_at = models.DateTimeField(null=True, blank=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
     received_at = models.DateTimeField(null=True, blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
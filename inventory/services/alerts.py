@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from django.db import connection, transaction
+from django.db.models import F, Max, OuterRef, QuerySet, Subquery
+from django.db.models.constants import OnConflict
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from inventory.models import (
+    LocationStock,
+    Product,
+    ProductStockSummary,
+    ReorderPoint,
+    StockAlert,
+)
+from inventory.services.keys import LOCATION_KEY_FIELDS, key_chunks, key_filter
+
+# (product_id, variant_id, branch_id, alert_type) -> (current_quantity, expiry_date)
+AlertState = Dict[tuple, Tuple[Decimal, Optional[date]]]
+
+
+class StockAlertService:
+    """
+    Set-based stock alert evaluation.
+
+    Conditions are evaluated per location (product, variant, branch), not per
+    batch row:
+
+    - out of stock: location total is zero or less
+    - low stock: location total is above zero but at or below the branch's
+      ReorderPoint, or ``Product.reorder_level`` where none was computed
+    - expired / expiring soon: batches with stock on hand whose ``expiry_date``
+      is past, or within the product's ``expiry_alert_days``
+
+    Totals come from ProductStockSummary and expiry from the LocationStock view,
+    each joined to Product in one query, so no per-row Python checks are needed.
+    """
+
+    @staticmethod
+    def _scoped(queryset: QuerySet, keys: Optional[set]) -> Iterator[QuerySet]:
+        """``queryset`` restricted to ``keys`` chunk by chunk (all rows when None)"""
+        if keys is None:
+            yield queryset
+            return
+        for chunk in key_chunks(keys):
+            yield queryset.filter(key_filter(LOCATION_KEY_FIELDS, chunk))
+
+    @staticmethod
+    def evaluate(keys: Optional[Iterable[tuple]] = None, today: Optional[date] = None) -> AlertState:
+        """
+        Alerts that currently apply.
+
+        Args:
+            keys: (product_id, variant_id, branch_id) locations to evaluate;
+                every location when None
+            today: Reference date for expiry checks (defaults to today)
+
+        Returns:
+            (current_quantity, expiry_date) per (product_id, variant_id,
+            branch_id, alert_type)
+        """
+        keys = None if keys is None else set(keys)
+        today = today or timezone.localdate()
+        state: AlertState = {}
+
+        # Computed reorder points take precedence over the product's own level
+        reorder_point = ReorderPoint.objects.filter(
+            product_id=OuterRef("product_id"), branch_id=OuterRef("branch_id")
+        ).values("reorder_level")[:1]
+        levels = (
+            ProductStockSummary.objects.filter(branch__isnull=False)
+            .annotate(level=Coalesce(Subquery(reorder_point), F("product__reorder_level")))
+            .filter(quantity__lte=F("level"))
+            .values_list("product_id", "variant_id", "branch_id", "quantity")
+        )
+        for queryset in StockAlertService._scoped(levels, keys):
+            for product_id, variant_id, branch_id, quantity in queryset.iterator(chunk_size=2000):
+                alert_type = (
+                    StockAlert.AlertType.OUT_OF_STOCK
+                    if quantity <= 0
+                    else StockAlert.AlertType.LOW_STOCK
+                )
+                state[(product_id, variant_id, branch_id, alert_type)] = (quantity, None)
+
+        # The constant horizon lets the expiry_date index narrow the scan; each
+        # product's own alert window is applied to the joined value below
+        longest = Product.objects.aggregate(days=Max("expiry_alert_days"))["days"] or 0
+        expiring = LocationStock.objects.filter(
+            quantity__gt=0,
+            expiry_date__isnull=False,
+            expiry_date__lte=today + timedelta(days=longest),
+        ).values_list(
+            "product_id", "variant_id", "branch_id", "expiry_date", "quantity",
+            "product__expiry_alert_days",
+        )
+        for queryset in StockAlertService._scoped(expiring, keys):
+            for product_id, variant_id, branch_id, expiry_date, quantity, days in queryset.iterator(
+                chunk_size=2000
+            ):
+                if expiry_date < today:
+                    alert_type = StockAlert.AlertType.EXPIRED
+                elif expiry_date <= today + timedelta(days=days):
+                    alert_type = StockAlert.AlertType.EXPIRING_SOON
+                else:
+                    continue
+                key = (product_id, variant_id, branch_id, alert_type)
+                total, earliest = state.get(key, (Decimal("0"), expiry_date))
+                state[key] = (total + quantity, min(earliest, expiry_date))
+        return state
+
+    @staticmethod
+    @transaction.atomic
+    def sync(keys: Optional[Iterable[tuple]] = None, today: Optional[date] = None) -> Dict[str, int]:
+        """
+        Bring open alerts in line with ``evaluate``: open alerts whose condition
+        has cleared are resolved with one UPDATE, and the rest are upserted, so
+        alerts that stay open carry the current quantity.
+
+        Args:
+            keys: (product_id, variant_id, branch_id) locations to sync; every
+                location when None
+
+        Returns:
+            Counts of ``created`` and ``resolved`` alerts
+        """
+        keys = None if keys is None else set(keys)
+        state = StockAlertService.evaluate(keys, today)
+
+        open_alerts: Dict[tuple, list] = defaultdict(list)
+        alerts = StockAlert.objects.filter(is_resolved=False).values_list(
+            "id", "product_id", "variant_id", "branch_id", "alert_type"
+        )
+        for queryset in StockAlertService._scoped(alerts, keys):
+            for alert_id, *key in queryset.iterator(chunk_size=2000):
+                open_alerts[tuple(key)].append(alert_id)
+
+        stale = [
+            alert_id
+            for key, alert_ids in open_alerts.items()
+            if key not in state
+            for alert_id in alert_ids
+        ]
+        created = sum(1 for key in state if key not in open_alerts)
+
+        resolved = 0
+        for start in range(0, len(stale), 5000):
+            resolved += StockAlert.objects.filter(pk__in=stale[start:start + 5000]).update(
+                is_resolved=True, resolved_at=timezone.now()
+            )
+        StockAlertService.upsert(state)
+        return {"created": created, "resolved": resolved}
+
+    @staticmethod
+    def upsert(state: AlertState) -> None:
+        """
+        Insert an open alert for every key of ``state`` or, where one is already
+        open, refresh its ``current_quantity`` and ``expiry_date``.
+
+        The partial unique indexes on open alerts arbitrate, so concurrent
+        callers can't create duplicates. Each key is one
+        ``INSERT ... ON CONFLICT DO UPDATE``; backends without conflict targets
+        (SQLite < 3.24) use an ignoring INSERT followed by an UPDATE instead.
+        """
+        if not state:
+            return
+        meta = StockAlert._meta
+        ops = connection.ops
+        quote = ops.quote_name
+        table = quote(meta.db_table)
+        insert_fields = [
+            meta.get_field(name)
+            for name in (
+                "product", "variant", "branch", "alert_type", "current_quantity",
+                "expiry_date", "is_resolved", "created_at",
+            )
+        ]
+        columns = ", ".join(quote(field.column) for field in insert_fields)
+        placeholders = ", ".join(["%s"] * len(insert_fields))
+        key_columns = {
+            True: ["product_id", "variant_id", "branch_id", "alert_type"],
+            False: ["product_id", "branch_id", "alert_type"],
+        }
+        now = timezone.now()
+
+        rows = {True: [], False: []}
+        for (product_id, variant_id, branch_id, alert_type), (quantity, expiry_date) in state.items():
+            values = (
+                product_id, variant_id, branch_id, alert_type, quantity, expiry_date, False, now,
+            )
+            rows[variant_id is not None].append([
+                field.get_db_prep_save(value, connection)
+                for field, value in zip(insert_fields, values)
+            ])
+
+        with connection.cursor() as cursor:
+            for has_variant, params in rows.items():
+                if not params:
+                    continue
+                predicate = (
+                    f"NOT {quote('is_resolved')} AND {quote('variant_id')} IS "
+                    f"{'NOT NULL' if has_variant else 'NULL'}"
+                )
+                if connection.features.supports_update_conflicts_with_target:
+                    cursor.executemany(
+                        f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) "
+                        f"ON CONFLICT ({', '.join(map(quote, key_columns[has_variant]))}) "
+                        f"WHERE {predicate} DO UPDATE SET "
+                        f"{quote('current_quantity')} = EXCLUDED.{quote('current_quantity')}, "
+                        f"{quote('expiry_date')} = EXCLUDED.{quote('expiry_date')}",
+                        params,
+                    )
+                    continue
+                cursor.executemany(
+                    f"{ops.insert_statement(on_conflict=OnConflict.IGNORE)} {table} ({columns}) "
+                    f"VALUES ({placeholders}) "
+                    f"{ops.on_conflict_suffix_sql(insert_fields, OnConflict.IGNORE, None, None)}",
+                    params,
+                )
+                match = " AND ".join(
+                    f"{quote(column)} = %s" for column in key_columns[has_variant]
+                )
+                positions = [0, 1, 2, 3] if has_variant else [0, 2, 3]
+                cursor.executemany(
+                    f"UPDATE {table} SET {quote('current_quantity')} = %s, "
+                    f"{quote('expiry_date')} = %s WHERE {match} AND {predicate}",
+                    [row[4:6] + [row[i] for i in positions] for row in params],
+                )
@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from django.db import models, transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from accounts.models import Branch
+from inventory.models import (
+    Product,
+    StockMovement,
+    StockMovementArchive,
+    StockMovementRollup,
+)
+from inventory.services.bulk import update_rows
+from inventory.services.keys import key_chunks, key_filter
+
+# Columns identifying a monthly rollup row
+ROLLUP_KEY_FIELDS = ("month", "product_id", "branch_id", "movement_type")
+
+# Movement columns copied into the archive as-is
+ARCHIVED_FIELDS = (
+    "product_id",
+    "variant_id",
+    "quantity",
+    "movement_type",
+    "source_branch_id",
+    "dest_branch_id",
+    "reference",
+    "batch_number",
+    "expiry_date",
+    "notes",
+    "cost_price",
+    "cogs_amount",
+    "idempotency_key",
+    "created_at",
+    "created_by_id",
+)
+
+
+class StockArchiveService:
+    """
+    Moves old StockMovement rows into StockMovementArchive and keeps monthly
+    StockMovementRollup totals, so the hot table stays small.
+
+    Movements whose FIFO cost layer still has stock on hand are never archived;
+    FIFO costing reads those layers. Readers that need the full ledger use
+    ``movement_sources``, which only adds the archive when the date range
+    reaches back into it.
+    """
+
+    @staticmethod
+    def archive(*, before: datetime, batch_size: int = 5000) -> int:
+        """
+        Archive movements created before ``before``, one transaction per batch.
+        Returns the number of movements archived.
+        """
+        archived = 0
+        while True:
+            ids = list(
+                StockMovement.objects.filter(created_at__lt=before)
+                .exclude(cost_layer__remaining_quantity__gt=0)
+                .order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                return archived
+            StockArchiveService._archive_batch(ids)
+            archived += len(ids)
+
+    @staticmethod
+    @transaction.atomic
+    def _archive_batch(ids: List[int]) -> None:
+        movements = list(
+            StockMovement.objects.select_for_update().filter(pk__in=ids).values("id", *ARCHIVED_FIELDS)
+        )
+        rollups: Dict[tuple, list] = defaultdict(lambda: [Decimal("0"), Decimal("0"), 0])
+        archive_rows = []
+        for movement in movements:
+            movement_id = movement.pop("id")
+            month = timezone.localtime(movement["created_at"]).date().replace(day=1)
+            archive_rows.append(
+                StockMovementArchive(movement_id=movement_id, month=month, **movement)
+            )
+            if movement["movement_type"] in StockMovement.OUT_TYPES:
+                branch_id = movement["source_branch_id"]
+            else:
+                branch_id = movement["dest_branch_id"]
+            if branch_id is None:
+                continue
+            totals = rollups[(month, movement["product_id"], branch_id, movement["movement_type"])]
+            totals[0] += movement["quantity"]
+            totals[1] += movement["cogs_amount"] or Decimal("0")
+            totals[2] += 1
+
+        StockMovementArchive.objects.bulk_create(archive_rows)
+        StockArchiveService._add_to_rollups(rollups)
+        # Cascades to the exhausted cost layers of archived IN movements
+        StockMovement.objects.filter(pk__in=ids).delete()
+
+    @staticmethod
+    def _add_to_rollups(rollups: Dict[tuple, list]) -> None:
+        if not rollups:
+            return
+        existing = {}
+        for chunk in key_chunks(rollups):
+            locked = StockMovementRollup.objects.select_for_update().filter(
+                key_filter(ROLLUP_KEY_FIELDS, chunk)
+            )
+            for row in locked:
+                existing[(row.month, row.product_id, row.branch_id, row.movement_type)] = row
+        to_update = []
+        to_create = []
+        for key, (quantity, cogs_amount, count) in rollups.items():
+            row = existing.get(key)
+            if row is None:
+                month, product_id, branch_id, movement_type = key
+                to_create.append(StockMovementRollup(
+                    month=month,
+                    product_id=product_id,
+                    branch_id=branch_id,
+                    movement_type=movement_type,
+                    quantity=quantity,
+                    cogs_amount=cogs_amount,
+                    movement_count=count,
+                ))
+                continue
+            row.quantity += quantity
+            row.cogs_amount += cogs_amount
+            row.movement_count += count
+            to_update.append(row)
+        update_rows(StockMovementRollup, to_update, ["quantity", "cogs_amount", "movement_count"])
+        if to_create:
+            StockMovementRollup.objects.bulk_create(to_create)
+
+    @staticmethod
+    def archived_replays(keys: Iterable[str]) -> Dict[str, StockMovement]:
+        """
+        Archived movements recorded under any of ``keys``, by idempotency key,
+        as unsaved StockMovement instances carrying their original id
+        """
+        keys = set(keys)
+        if not keys:
+            return {}
+        return {
+            row["idempotency_key"]: StockMovement(id=row.pop("movement_id"), **row)
+            for row in StockMovementArchive.objects.filter(idempotency_key__in=keys).values(
+                "movement_id", *ARCHIVED_FIELDS
+            )
+        }
+
+    @staticmethod
+    def archived_until() -> Optional[datetime]:
+        """Creation time of the newest archived movement (None if nothing is archived)"""
+        return StockMovementArchive.objects.aggregate(latest=Max("created_at"))["latest"]
+
+    @staticmethod
+    def movement_sources(
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> List[models.QuerySet]:
+        """
+        Querysets holding the movements created in [since, until).
+
+        Both models share field names, so callers can apply the same filters and
+        aggregates to each. The archive is only included when ``since`` reaches
+        back to archived data.
+        """
+        sources = []
+        for model in (StockMovement, StockMovementArchive):
+            if model is StockMovementArchive:
+                archived_until = StockArchiveService.archived_until()
+                if archived_until is None or (since is not None and since > archived_until):
+                    continue
+            queryset = model.objects.order_by()
+            if since is not None:
+                queryset = queryset.filter(created_at__gte=since)
+            if until is not None:
+                queryset = queryset.filter(created_at__lt=until)
+            sources.append(queryset)
+        return sources
+
+    @staticmethod
+    def history(
+        *,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        product: Optional[Product] = None,
+    ) -> models.QuerySet:
+        """
+        Movement rows from the hot table and, when the range needs it, the
+        archive, as one ``UNION ALL`` values queryset ordered newest first.
+        """
+        querysets = []
+        for queryset in StockArchiveService.movement_sources(since, until):
+            if product is not None:
+                queryset = queryset.filter(product=product)
+            # Archived rows report their original movement id in the "id" column
+            id_field = "movement_id" if queryset.model is StockMovementArchive else "id"
+            querysets.append(queryset.values(*ARCHIVED_FIELDS, id_field))
+        if len(querysets) == 1:
+            return querysets[0].order_by("-created_at")
+        return querysets[0].union(*querysets[1:], all=True).order_by("-created_at")
+
+    @staticmethod
+    def monthly_totals(
+        *,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+        product: Optional[Product] = None,
+        branch: Optional[Branch] = None,
+    ) -> Dict[tuple, Dict[str, Decimal]]:
+        """
+        Movement totals per (month, product_id, branch_id, movement_type).
+
+        Archived months come from the rollups and the rest is aggregated from the
+        hot table, so reports cover the whole history either way.
+
+        Args:
+            since: First month to include (any day in it)
+            until: Last month to include (any day in it)
+        """
+        totals: Dict[tuple, Dict[str, Decimal]] = defaultdict(
+            lambda: {"quantity": Decimal("0"), "cogs_amount": Decimal("0"), "movement_count": 0}
+        )
+
+        rollups = StockMovementRollup.objects.all()
+        if since is not None:
+            rollups = rollups.filter(month__gte=since.replace(day=1))
+        if until is not None:
+            rollups = rollups.filter(month__lte=until.replace(day=1))
+        if product is not None:
+            rollups = rollups.filter(product=product)
+        if branch is not None:
+            rollups = rollups.filter(branch=branch)
+        for row in rollups:
+            entry = totals[(row.month, row.product_id, row.branch_id, row.movement_type)]
+            entry["quantity"] += row.quantity
+            entry["cogs_amount"] += row.cogs_amount
+            entry["movement_count"] += row.movement_count
+
+        hot = StockMovement.objects.order_by().annotate(
+            month=TruncMonth("created_at", output_field=models.DateField())
+        )
+        if since is not None:
+            hot = hot.filter(month__gte=since.replace(day=1))
+        if until is not None:
+            hot = hot.filter(month__lte=until.replace(day=1))
+        if product is not None:
+            hot = hot.filter(product=product)
+        for branch_field, types in (
+            ("source_branch_id", StockMovement.OUT_TYPES),
+            ("dest_branch_id", StockMovement.IN_TYPES),
+        ):
+            grouped = hot.filter(movement_type__in=types, **{f"{branch_field}__isnull": False})
+            if branch is not None:
+                grouped = grouped.filter(**{branch_field: branch.pk})
+            grouped = grouped.values_list(
+                "month", "product_id", branch_field, "movement_type"
+            ).annotate(
+                quantity=Sum("quantity"), cogs=Sum("cogs_amount"), count=Count("id")
+            )
+            for month, product_id, branch_id, movement_type, quantity, cogs, count in grouped:
+                entry = totals[(month, product_id, branch_id, movement_type)]
+                entry["quantity"] += quantity
+                entry["cogs_amount"] += cogs or Decimal("0")
+                entry["movement_count"] += count
+        return dict(totals)
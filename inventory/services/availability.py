@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+import threading
+import uuid
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from accounts.models import Branch
+from inventory.models import BranchStock, LocationStock, Product, ProductVariant, WarehouseStock
+from inventory.services.keys import STOCK_KEY_FIELDS, key_chunks, key_filter
+from inventory.services.sharding import ShardedStockService
+
+
+class _Counters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+
+_counters = _Counters()
+
+
+class StockAvailabilityCache:
+    """
+    Read-through cache of on-hand quantities per stock row, keyed by
+    (branch_id, product_id, variant_id, batch_number).
+
+    Entries live in the Django cache named by ``STOCK_CACHE_ALIAS`` (local
+    memory by default; point it at Redis or memcached to share it between
+    processes). Each location (product, variant, branch) has a generation
+    token, and cached quantities carry the token that was current when they
+    were read. StockService replaces the token after a stock change commits,
+    so a value read before the commit can't be served afterwards, even if it
+    was written to the cache late. A missing token (never set, or evicted)
+    never matches.
+
+    Reads inside a transaction bypass the cache, so uncommitted quantities are
+    never cached.
+    """
+
+    @staticmethod
+    def _cache():
+        return caches[getattr(settings, "STOCK_CACHE_ALIAS", "default")]
+
+    @staticmethod
+    def _value_key(key: tuple) -> str:
+        branch_id, product_id, variant_id, batch_number = key
+        return f"stock:qty:{branch_id}:{product_id}:{variant_id or 0}:{quote(batch_number, safe='')}"
+
+    @staticmethod
+    def _generation_key(product_id: int, variant_id: Optional[int], branch_id: int) -> str:
+        return f"stock:gen:{branch_id}:{product_id}:{variant_id or 0}"
+
+    @staticmethod
+    def get(
+        product: Product,
+        variant: Optional[ProductVariant],
+        branch: Branch,
+        batch_number: str = "",
+    ) -> Decimal:
+        """On-hand quantity of one stock row (0 if it doesn't exist)"""
+        key = (branch.pk, product.pk, variant.pk if variant else None, batch_number or "")
+        return StockAvailabilityCache.get_many([key])[key]
+
+    @staticmethod
+    def get_many(keys: Iterable[tuple]) -> Dict[tuple, Decimal]:
+        """
+        On-hand quantities for many (branch_id, product_id, variant_id,
+        batch_number) keys: one cache round trip, plus one query per stock table
+        for the misses.
+        """
+        keys = set(keys)
+        if connection.in_atomic_block:
+            return StockAvailabilityCache.load_many(keys)
+
+        cache = StockAvailabilityCache._cache()
+        value_keys = {key: StockAvailabilityCache._value_key(key) for key in keys}
+        generation_keys = {
+            key: StockAvailabilityCache._generation_key(key[1], key[2], key[0]) for key in keys
+        }
+        cached = cache.get_many([*value_keys.values(), *generation_keys.values()])
+
+        result: Dict[tuple, Decimal] = {}
+        missing = []
+        for key in keys:
+            entry = cached.get(value_keys[key])
+            generation = cached.get(generation_keys[key])
+            if generation is not None and entry is not None and entry[0] == generation:
+                result[key] = entry[1]
+            else:
+                missing.append(key)
+
+        with _counters.lock:
+            _counters.hits += len(result)
+            _counters.misses += len(missing)
+        if not missing:
+            return result
+
+        # Locations without a token (new, or evicted) get one before the query;
+        # loaded values are tagged with the token current *before* the query
+        new_generations = {
+            generation_keys[key]: uuid.uuid4().hex
+            for key in missing
+            if cached.get(generation_keys[key]) is None
+        }
+        if new_generations:
+            cache.set_many(new_generations, timeout=None)
+            cached.update(new_generations)
+        loaded = StockAvailabilityCache.load_many(missing)
+        cache.set_many(
+            {
+                value_keys[key]: (cached[generation_keys[key]], quantity)
+                for key, quantity in loaded.items()
+            },
+            timeout=getattr(settings, "STOCK_CACHE_TIMEOUT", 300),
+        )
+        result.update(loaded)
+        return result
+
+    @staticmethod
+    def load_many(keys: Iterable[tuple]) -> Dict[tuple, Decimal]:
+        """Uncached on-hand quantities (shards included), one query per stock table"""
+        quantities = {key: Decimal("0") for key in keys}
+        by_model: Dict[type, list] = {WarehouseStock: [], BranchStock: []}
+        branches = Branch.objects.in_bulk({key[0] for key in quantities})
+        for key in quantities:
+            branch = branches.get(key[0])
+            if branch is not None:
+                by_model[WarehouseStock if branch.is_warehouse else BranchStock].append(key)
+
+        for stock_model, model_keys in by_model.items():
+            for chunk in key_chunks(model_keys):
+                rows = (
+                    stock_model.objects.filter(key_filter(STOCK_KEY_FIELDS, chunk))
+                    .annotate(on_hand=ShardedStockService.on_hand(stock_model))
+                    .values_list(*STOCK_KEY_FIELDS, "on_hand")
+                )
+                for branch_id, product_id, variant_id, batch_number, on_hand in rows:
+                    quantities[(branch_id, product_id, variant_id, batch_number)] = on_hand
+        return quantities
+
+    @staticmethod
+    def invalidate(locations: Iterable[tuple]) -> None:
+        """
+        Drop cached quantities of (product_id, variant_id, branch_id) locations,
+        and the cached variant matrices of their products, once the current
+        transaction commits (immediately outside one).
+        """
+        locations = set(locations)
+        generation_keys = [
+            StockAvailabilityCache._generation_key(*location) for location in locations
+        ] + [
+            VariantAvailabilityService._generation_key(product_id)
+            for product_id in {location[0] for location in locations}
+        ]
+        if not generation_keys:
+            return
+
+        def bump() -> None:
+            StockAvailabilityCache._cache().set_many(
+                {key: uuid.uuid4().hex for key in generation_keys}, timeout=None
+            )
+
+        transaction.on_commit(bump, robust=True)
+
+    @staticmethod
+    def stats() -> Dict[str, int]:
+        """Hit and miss counts of this process since start (or ``reset_stats``)"""
+        with _counters.lock:
+            return {"hits": _counters.hits, "misses": _counters.misses}
+
+    @staticmethod
+    def reset_stats() -> None:
+        with _counters.lock:
+            _counters.hits = _counters.misses = 0
+
+
+# variant_id (None for stock without a variant) -> branch_id -> on-hand quantity
+VariantMatrix = Dict[Optional[int], Dict[int, Decimal]]
+
+
+class VariantAvailabilityService:
+    """
+    Stock per variant x branch for whole products, for size/colour pickers.
+
+    Matrices are read with one grouped query over the ``LocationStock`` view
+    (both stock tables, shards included) for all uncached products at once,
+    and cached per product in the same cache and with the same generation
+    scheme as StockAvailabilityCache: any movement of a product replaces its
+    token once it commits. Only locations with stock are listed; anything
+    missing is zero.
+    """
+
+    @staticmethod
+    def _value_key(product_id: int) -> str:
+        return f"stock:variants:{product_id}"
+
+    @staticmethod
+    def _generation_key(product_id: int) -> str:
+        return f"stock:variants:gen:{product_id}"
+
+    @staticmethod
+    def matrix(
+        product_ids: Iterable[int],
+        branch_ids: Optional[Iterable[int]] = None,
+    ) -> Dict[int, VariantMatrix]:
+        """
+        Variant x branch on-hand quantities per product id, limited to
+        ``branch_ids`` if given. One cache round trip, plus one query for all
+        products that missed.
+        """
+        product_ids = set(product_ids)
+        if connection.in_atomic_block:
+            matrices = VariantAvailabilityService.load(product_ids)
+        else:
+            matrices = VariantAvailabilityService._cached(product_ids)
+        if branch_ids is None:
+            return matrices
+
+        branch_ids = set(branch_ids)
+        return {
+            product_id: {
+                variant_id: {
+                    branch_id: quantity
+                    for branch_id, quantity in by_branch.items()
+                    if branch_id in branch_ids
+                }
+                for variant_id, by_branch in matrix.items()
+            }
+            for product_id, matrix in matrices.items()
+        }
+
+    @staticmethod
+    def variant_totals(
+        product_id: int,
+        branch_ids: Optional[Iterable[int]] = None,
+    ) -> Dict[Optional[int], Decimal]:
+        """On-hand quantity per variant id of one product, branches combined"""
+        matrix = VariantAvailabilityService.matrix([product_id], branch_ids)[product_id]
+        return {
+            variant_id: sum(by_branch.values(), Decimal("0"))
+            for variant_id, by_branch in matrix.items()
+        }
+
+    @staticmethod
+    def _cached(product_ids: set) -> Dict[int, VariantMatrix]:
+        cache = StockAvailabilityCache._cache()
+        value_keys = {pid: VariantAvailabilityService._value_key(pid) for pid in product_ids}
+        generation_keys = {
+            pid: VariantAvailabilityService._generation_key(pid) for pid in product_ids
+        }
+        cached = cache.get_many([*value_keys.values(), *generation_keys.values()])
+
+        result: Dict[int, VariantMatrix] = {}
+        missing: List[int] = []
+        for product_id in product_ids:
+            entry = cached.get(value_keys[product_id])
+            generation = cached.get(generation_keys[product_id])
+            if generation is not None and entry is not None and entry[0] == generation:
+                result[product_id] = entry[1]
+            else:
+                missing.append(product_id)
+
+        with _counters.lock:
+            _counters.hits += len(result)
+            _counters.misses += len(missing)
+        if not missing:
+            return result
+
+        # As in StockAvailabilityCache: tag loaded values with the token
+        # current before the query
+        new_generations = {
+            generation_keys[pid]: uuid.uuid4().hex
+            for pid in missing
+            if cached.get(generation_keys[pid]) is None
+        }
+        if new_generations:
+            cache.set_many(new_generations, timeout=None)
+            cached.update(new_generations)
+        loaded = VariantAvailabilityService.load(missing)
+        cache.set_many(
+            {
+                value_keys[pid]: (cached[generation_keys[pid]], matrix)
+                for pid, matrix in loaded.items()
+            },
+            timeout=getattr(settings, "STOCK_CACHE_TIMEOUT", 300),
+        )
+        result.update(loaded)
+        return result
+
+    @staticmethod
+    def load(product_ids: Iterable[int]) -> Dict[int, VariantMatrix]:
+        """Uncached matrices, one grouped query for all of ``product_ids``"""
+        matrices: Dict[int, VariantMatrix] = {product_id: {} for product_id in product_ids}
+        if not matrices:
+            return matrices
+        rows = (
+            LocationStock.objects.filter(product_id__in=list(matrices), quantity__gt=0)
+            .order_by()
+            .values("product_id", "variant_id", "branch_id")
+            .annotate(total=Sum("quantity"))
+            .values_list("product_id", "variant_id", "branch_id", "total")
+        )
+        for product_id, variant_id, branch_id, total in rows:
+            matrices[product_id].setdefault(variant_id, {})[branch_id] = total
+        return matrices
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Sequence
+
+from django.db import DEFAULT_DB_ALIAS, connections, models
+from django.utils import timezone
+
+# Rows per INSERT on backends without a bound-parameter limit
+INSERT_BATCH_SIZE = 1000
+
+
+def _converter(field, db) -> Callable[[Any], Any]:
+    """
+    ``field.get_db_prep_save`` for ``db``, short-circuited for the values bulk
+    writes pass by the hundred thousand: ints and strings already in their
+    column's type, and Decimals, quantized once per field's scale instead of
+    through a fresh decimal context per value.
+    """
+    prep = field.get_db_prep_save
+    target = field.target_field if field.is_relation else field
+    if isinstance(target, models.DecimalField):
+        quantum = Decimal(1).scaleb(-target.decimal_places)
+
+        def convert(value):
+            if type(value) is Decimal and value.is_finite():
+                return format(value.quantize(quantum), "f")
+            return prep(value, db)
+        return convert
+    if isinstance(target, models.IntegerField):
+        native = int
+    elif isinstance(target, (models.CharField, models.TextField)):
+        native = str
+    else:
+        return lambda value: prep(value, db)
+    return lambda value: value if value is None or type(value) is native else prep(value, db)
+
+
+def update_rows(model, objs: Iterable, fields: Sequence[str]) -> None:
+    """
+    Write ``fields`` of already-loaded ``objs`` back by primary key.
+
+    One parameterized UPDATE is sent with ``executemany``; ``bulk_update``
+    builds a CASE expression with a branch per row, which gets far slower than
+    this once a call touches hundreds of rows.
+    """
+    meta = model._meta
+    db = connections[DEFAULT_DB_ALIAS]
+    quote = db.ops.quote_name
+    model_fields = [meta.get_field(name) for name in fields]
+    assignments = ", ".join(f"{quote(field.column)} = %s" for field in model_fields)
+    sql = f"UPDATE {quote(meta.db_table)} SET {assignments} WHERE {quote(meta.pk.column)} = %s"
+    prepare = [(field.attname, _converter(field, db)) for field in model_fields]
+    params = [
+        [convert(getattr(obj, attname)) for attname, convert in prepare] + [obj.pk]
+        for obj in objs
+    ]
+    if not params:
+        return
+    with db.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def add_to_rows(model, field: str, rows: Iterable[Sequence], *, fill: Sequence[str] = ()) -> None:
+    """
+    Add amounts to ``field`` of rows by primary key, relative to the stored
+    value, with one parameterized UPDATE sent by ``executemany``. The rows
+    needn't be loaded, only locked.
+
+    Each row is (pk, amount, *values for ``fill``); ``fill`` fields are only
+    set where they are NULL. ``auto_now`` fields get the current time.
+    """
+    meta = model._meta
+    db = connections[DEFAULT_DB_ALIAS]
+    quote = db.ops.quote_name
+    added = meta.get_field(field)
+    fill_fields = [meta.get_field(name) for name in fill]
+    touched = [
+        other for other in meta.concrete_fields
+        if getattr(other, "auto_now", False) and other.name != field and other.name not in fill
+    ]
+    assignments = [f"{quote(added.column)} = {quote(added.column)} + %s"]
+    assignments += [f"{quote(other.column)} = COALESCE({quote(other.column)}, %s)" for other in fill_fields]
+    assignments += [f"{quote(other.column)} = %s" for other in touched]
+    sql = (
+        f"UPDATE {quote(meta.db_table)} SET {', '.join(assignments)} "
+        f"WHERE {quote(meta.pk.column)} = %s"
+    )
+    now = timezone.now()
+    stamps = [
+        other.get_db_prep_save(now if isinstance(other, models.DateTimeField) else now.date(), db)
+        for other in touched
+    ]
+    convert_added = _converter(added, db)
+    convert_fill = [_converter(other, db) for other in fill_fields]
+    params = [
+        [convert_added(row[1])]
+        + [convert(value) for convert, value in zip(convert_fill, row[2:])]
+        + stamps
+        + [row[0]]
+        for row in rows
+    ]
+    if not params:
+        return
+    with db.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def insert_rows(model, rows: Iterable[Dict[str, Any]], *, returning: bool = False) -> List[int]:
+    """
+    Insert plain dicts of field values (by attname, e.g. ``product_id``) with
+    multi-row INSERTs, without building model instances or going through the
+    query compiler. Fields a row leaves out get their default; ``auto_now`` and
+    ``auto_now_add`` fields get the current time.
+
+    Returns:
+        Primary keys in row order if ``returning`` (else an empty list)
+    """
+    rows = list(rows)
+    meta = model._meta
+    # The connection itself, not the thread-local proxy: this runs per value
+    db = connections[DEFAULT_DB_ALIAS]
+    quote = db.ops.quote_name
+    now = timezone.now()
+    fields = [field for field in meta.concrete_fields if not field.primary_key]
+    # Values for fields rows leave out are prepared once, not per row; callable
+    # defaults (None here) are called per row
+    prepare = []
+    for field in fields:
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False):
+            value = now if isinstance(field, models.DateTimeField) else now.date()
+            default = field.get_db_prep_save(value, db)
+        elif field.has_default() and callable(field.default):
+            default = None
+        else:
+            default = field.get_db_prep_save(field.get_default(), db)
+        prepare.append((field, field.attname, _converter(field, db), default))
+
+    # One flat parameter list, sliced into statements below
+    params = []
+    append = params.append
+    for row in rows:
+        for field, attname, convert, default in prepare:
+            if attname in row:
+                append(convert(row[attname]))
+            elif default is None:
+                append(convert(field.get_default()))
+            else:
+                append(default)
+    if not params:
+        return []
+    if returning and not db.features.can_return_rows_from_bulk_insert:
+        objs = model.objects.bulk_create([model(**row) for row in rows])
+        return [obj.pk for obj in objs]
+
+    columns = ", ".join(quote(field.column) for field in fields)
+    placeholder = "(" + ", ".join(["%s"] * len(fields)) + ")"
+    max_params = db.features.max_query_params
+    batch_size = max(1, max_params // len(fields)) if max_params else INSERT_BATCH_SIZE
+    suffix = f" RETURNING {quote(meta.pk.column)}" if returning else ""
+    step = batch_size * len(fields)
+    pks: List[int] = []
+    with db.cursor() as cursor:
+        for start in range(0, len(params), step):
+            batch = params[start:start + step]
+            cursor.execute(
+                f"INSERT INTO {quote(meta.db_table)} ({columns}) "
+                f"VALUES {', '.join([placeholder] * (len(batch) // len(fields)))}{suffix}",
+                batch,
+            )
+            if returning:
+                pks.extend(row[0] for row in cursor.fetchall())
+    return pks
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import CharField, Count, F, Max, QuerySet, Value
+from django.db.models.functions import Concat, Substr
+from django.utils import timezone
+
+from inventory.models import Category
+from inventory.services.bulk import update_rows
+
+
+class _Tree:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (category count, latest updated_at) the tree was built from
+        self.version: Optional[tuple] = None
+        self.loaded_at = 0.0
+        self.checked_at = 0.0
+        self.nodes: Dict[int, dict] = {}
+        self.roots: List[dict] = []
+
+
+_tree = _Tree()
+
+
+class CategoryTreeService:
+    """
+    Category subtree index and navigation tree.
+
+    Every category stores its materialized ``path`` of ids ("3/17/42/"), so the
+    subtree of a category is the indexed prefix match ``path LIKE '3/17/%'``.
+    ``place`` and ``detach`` keep paths right when a category is saved, moved
+    or deleted (``Category.save`` / ``delete`` call them); a move rewrites the
+    whole subtree with one UPDATE.
+
+    The navigation tree is built from one query and held per process. At most
+    every ``CATEGORY_TREE_REFRESH_SECONDS`` a read compares the table's row
+    count and latest ``updated_at`` (path rewrites bump it too) with the ones
+    the tree was built from and rebuilds on a change, so every process picks up
+    a change within that interval; the process that made it does at once. The
+    tree is also rebuilt every ``CATEGORY_TREE_RELOAD_SECONDS``, which covers
+    rows committed with an older ``updated_at`` and ``QuerySet.update`` calls
+    that don't set it.
+    """
+
+    @staticmethod
+    def place(category: Category) -> None:
+        """
+        Set ``category``'s path below its parent's and move its subtree along.
+
+        Raises:
+            ValueError: If the new parent is the category itself or one of its
+                subcategories
+        """
+        old_path = Category.objects.filter(pk=category.pk).values_list("path", flat=True).get()
+        parent_path = ""
+        if category.parent_id:
+            parent_path = (
+                Category.objects.filter(pk=category.parent_id).values_list("path", flat=True).get()
+            )
+            if category.parent_id == category.pk or (old_path and parent_path.startswith(old_path)):
+                raise ValueError(f"Category {category} can't be moved under its own subcategory")
+
+        path = f"{parent_path}{category.pk}/"
+        depth = path.count("/") - 1
+        if path != old_path:
+            now = timezone.now()
+            Category.objects.filter(pk=category.pk).update(path=path, depth=depth, updated_at=now)
+            if old_path:
+                Category.objects.filter(path__startswith=old_path).exclude(pk=category.pk).update(
+                    path=Concat(Value(path), Substr("path", len(old_path) + 1), output_field=CharField()),
+                    depth=F("depth") + (depth - (old_path.count("/") - 1)),
+                    updated_at=now,
+                )
+        category.path = path
+        category.depth = depth
+        CategoryTreeService.invalidate()
+
+    @staticmethod
+    def detach(path: Optional[str]) -> None:
+        """
+        After the category at ``path`` was deleted, re-root its subtree (its
+        children lost their parent through ``on_delete=SET_NULL``).
+        """
+        if path:
+            Category.objects.filter(path__startswith=path).update(
+                path=Substr("path", len(path) + 1),
+                depth=F("depth") - path.count("/"),
+                updated_at=timezone.now(),
+            )
+        CategoryTreeService.invalidate()
+
+    @staticmethod
+    @transaction.atomic
+    def rebuild() -> int:
+        """
+        Recompute every path and depth from ``parent`` links, e.g. after bulk
+        updates or queryset deletes that bypass ``Category.save``. Categories
+        caught in a parent cycle become roots. Returns the number of rows fixed.
+        """
+        categories = {category.pk: category for category in Category.objects.select_for_update()}
+        paths: Dict[int, str] = {}
+        for pk in categories:
+            # Walk up to a resolved ancestor or a root, then fill in downwards
+            chain = []
+            current = pk
+            while current not in paths:
+                chain.append(current)
+                parent_id = categories[current].parent_id
+                if parent_id is None or parent_id not in categories or parent_id in chain:
+                    break
+                current = parent_id
+            prefix = paths.get(current, "") if current not in chain else ""
+            for pk_below in reversed(chain):
+                prefix = f"{prefix}{pk_below}/"
+                paths[pk_below] = prefix
+
+        changed = []
+        now = timezone.now()
+        for pk, category in categories.items():
+            path = paths[pk]
+            if category.path != path:
+                category.path = path
+                category.depth = path.count("/") - 1
+                category.updated_at = now
+                changed.append(category)
+        update_rows(Category, changed, ["path", "depth", "updated_at"])
+        CategoryTreeService.invalidate()
+        return len(changed)
+
+    @staticmethod
+    def subtree(category: Category, include_self: bool = True) -> QuerySet:
+        """``category`` and every category below it"""
+        queryset = Category.objects.filter(path__startswith=category.path)
+        return queryset if include_self else queryset.exclude(pk=category.pk)
+
+    @staticmethod
+    def products(queryset: QuerySet, category_id: int) -> QuerySet:
+        """
+        Narrow a Product queryset to the subtree of ``category_id``. The path
+        comes from the cached tree, so this adds no query of its own.
+        """
+        node = CategoryTreeService.nodes().get(category_id)
+        if node is None:
+            return queryset.none()
+        return queryset.filter(category__path__startswith=node["path"])
+
+    @staticmethod
+    def product_counts(queryset: QuerySet) -> Dict[int, int]:
+        """
+        Products of a Product queryset per category id, subcategories included:
+        one grouped query, rolled up along the cached tree's paths.
+        """
+        nodes = CategoryTreeService.nodes()
+        counts = {category_id: 0 for category_id in nodes}
+        direct = (
+            queryset.filter(category__isnull=False)
+            .order_by()
+            .values_list("category_id")
+            .annotate(count=Count("id"))
+        )
+        for category_id, count in direct:
+            node = nodes.get(category_id)
+            if node is None:
+                continue
+            for ancestor_id in node["ancestor_ids"]:
+                counts[ancestor_id] += count
+        return counts
+
+    @staticmethod
+    def tree() -> List[dict]:
+        """
+        Root nodes of the category tree, ordered by name. Each node is a dict
+        with ``id``, ``name``, ``parent_id``, ``depth``, ``path``,
+        ``ancestor_ids`` (root first, itself last) and ``children``.
+        """
+        CategoryTreeService._refresh()
+        return _tree.roots
+
+    @staticmethod
+    def nodes() -> Dict[int, dict]:
+        """Tree nodes by category id"""
+        CategoryTreeService._refresh()
+        return _tree.nodes
+
+    @staticmethod
+    def _refresh() -> None:
+        now = time.monotonic()
+        if _tree.version is not None and (
+            now - _tree.checked_at < getattr(settings, "CATEGORY_TREE_REFRESH_SECONDS", 5)
+        ):
+            return
+        stale = now - _tree.loaded_at >= getattr(settings, "CATEGORY_TREE_RELOAD_SECONDS", 300)
+
+        with _tree.lock:
+            if _tree.version is not None and now < _tree.checked_at:
+                # Another thread checked while this one waited for the lock
+                return
+            version = tuple(
+                Category.objects.aggregate(count=Count("id"), changed=Max("updated_at")).values()
+            )
+            _tree.checked_at = time.monotonic()
+            if version == _tree.version and not stale:
+                return
+            nodes: Dict[int, dict] = {}
+            rows = Category.objects.order_by("depth", "name").values_list(
+                "id", "name", "parent_id", "depth", "path"
+            )
+            for category_id, name, parent_id, depth, path in rows:
+                nodes[category_id] = {
+                    "id": category_id,
+                    "name": name,
+                    "parent_id": parent_id,
+                    "depth": depth,
+                    "path": path,
+                    "ancestor_ids": [int(part) for part in path.split("/") if part],
+                    "children": [],
+                }
+            roots = []
+            for node in nodes.values():
+                parent = nodes.get(node["parent_id"])
+                (parent["children"] if parent else roots).append(node)
+            # Swap both in together; readers use whatever they got last
+            _tree.nodes, _tree.roots, _tree.version = nodes, roots, version
+            _tree.loaded_at = _tree.checked_at
+
+    @staticmethod
+    def invalidate() -> None:
+        """
+        Rebuild this process's tree on its next read once the current
+        transaction commits (other processes notice within the refresh interval)
+        """
+        def expire() -> None:
+            _tree.version = None
+
+        transaction.on_commit(expire, robust=True)
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import functools
+import logging
+import random
+import time
+from typing import Callable, Optional, TypeVar
+
+from django.db import DatabaseError, connection
+
+logger = logging.getLogger(__name__)
+
+# Canonical row-lock order for multi-row stock operations. Every service locks
+# stock rows, then cost layers, then summary rows, each sorted by these columns,
+# so two transactions touching overlapping products can't wait on each other.
+STOCK_LOCK_ORDER = ("branch_id", "product_id", "variant_id", "batch_number")
+LOCATION_LOCK_ORDER = ("product_id", "variant_id", "branch_id")
+
+# SQLSTATEs worth retrying: serialization_failure, deadlock_detected
+RETRYABLE_SQLSTATES = {"40001", "40P01"}
+
+MAX_ATTEMPTS = 6
+BASE_DELAY = 0.05
+MAX_DELAY = 1.0
+
+F = TypeVar("F", bound=Callable)
+
+
+def is_retryable(exc: DatabaseError) -> bool:
+    """True for serialization failures, deadlocks and SQLite lock timeouts"""
+    cause = exc.__cause__
+    sqlstate = getattr(cause, "sqlstate", None) or getattr(cause, "pgcode", None)
+    if sqlstate in RETRYABLE_SQLSTATES:
+        return True
+    return "database is locked" in str(exc)
+
+
+def retry_on_conflict(
+    func: Optional[F] = None,
+    *,
+    attempts: int = MAX_ATTEMPTS,
+    base_delay: float = BASE_DELAY,
+) -> F:
+    """
+    Re-run a transactional stock operation when the database aborts it with a
+    serialization failure or deadlock, with jittered exponential backoff.
+    
+    Only the outermost transaction can be retried, so inside an existing
+    ``atomic`` block the error is passed on to whoever owns the transaction.
+    """
+    def decorator(inner: F) -> F:
+        @functools.wraps(inner)
+        def wrapper(*args, **kwargs):
+            for attempt in range(1, attempts + 1):
+                try:
+                    return inner(*args, **kwargs)
+                except DatabaseError as exc:
+                    if (
+                        attempt == attempts
+                        or connection.in_atomic_block
+                        or not is_retryable(exc)
+                    ):
+                        raise
+                    delay = min(MAX_DELAY, base_delay * 2 ** (attempt - 1))
+                    logger.warning(
+                        "Retrying %s after %s (attempt %d/%d)",
+                        inner.__qualname__, exc, attempt, attempts,
+                    )
+                    time.sleep(delay * random.uniform(0.5, 1.5))
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from collections import defaultdict, deque
+from decimal import Decimal
+from typing import Dict, Iterable, List
+
+from inventory.models import CostLayer, StockMovement
+from inventory.services.bulk import update_rows
+from inventory.services.concurrency import LOCATION_LOCK_ORDER
+from inventory.services.keys import LOCATION_KEY_FIELDS, key_chunks, key_filter
+
+
+class CostLayerService:
+    """FIFO cost layers built on StockMovement.cost_price"""
+
+    @staticmethod
+    def apply_movements(movements: Iterable[StockMovement]) -> None:
+        """
+        Open cost layers for IN movements and consume them for OUT movements.
+
+        Movements are processed in order and must already be saved. IN movements
+        open a layer at ``cost_price`` (falling back to ``Product.cost_price``).
+        OUT movements consume the oldest open layers at their location and get
+        ``cogs_amount`` set; any quantity not covered by layers (stock received
+        before layers existed) is costed at ``Product.cost_price``.
+
+        Open layers for the OUT locations are locked with one query (per chunk of
+        locations) over the open-layer index; exhausted layers and older history are never read.
+        """
+        movements = list(movements)
+        out_locations = {
+            CostLayerService._location(movement, out=True)
+            for movement in movements
+            if movement.movement_type in StockMovement.OUT_TYPES
+            and movement.source_branch_id
+        }
+
+        open_layers: Dict[tuple, deque] = defaultdict(deque)
+        for chunk in key_chunks(out_locations):
+            locked = (
+                CostLayer.objects.select_for_update()
+                .filter(
+                    key_filter(LOCATION_KEY_FIELDS, chunk),
+                    remaining_quantity__gt=0,
+                )
+                .order_by(*LOCATION_LOCK_ORDER, "created_at", "id")
+            )
+            for layer in locked:
+                open_layers[(layer.product_id, layer.variant_id, layer.branch_id)].append(layer)
+
+        new_layers: List[CostLayer] = []
+        touched: Dict[int, CostLayer] = {}
+        costed: List[StockMovement] = []
+
+        for movement in movements:
+            if movement.movement_type in StockMovement.IN_TYPES:
+                if not movement.dest_branch_id:
+                    continue
+                unit_cost = movement.cost_price
+                if unit_cost is None:
+                    unit_cost = movement.product.cost_price
+                layer = CostLayer(
+                    product_id=movement.product_id,
+                    variant_id=movement.variant_id,
+                    branch_id=movement.dest_branch_id,
+                    movement=movement,
+                    unit_cost=unit_cost,
+                    original_quantity=movement.quantity,
+                    remaining_quantity=movement.quantity,
+                )
+                new_layers.append(layer)
+                open_layers[CostLayerService._location(movement, out=False)].append(layer)
+                continue
+
+            if movement.movement_type not in StockMovement.OUT_TYPES:
+                continue
+            if not movement.source_branch_id:
+                continue
+
+            layers = open_layers[CostLayerService._location(movement, out=True)]
+            needed = movement.quantity
+            cogs = Decimal("0")
+            while needed > 0 and layers:
+                layer = layers[0]
+                taken = min(needed, layer.remaining_quantity)
+                layer.remaining_quantity -= taken
+                cogs += taken * layer.unit_cost
+                needed -= taken
+                if layer.pk:
+                    touched[layer.pk] = layer
+                if layer.remaining_quantity <= 0:
+                    layers.popleft()
+            if needed > 0:
+                cogs += needed * movement.product.cost_price
+            movement.cogs_amount = cogs.quantize(Decimal("0.01"))
+            costed.append(movement)
+
+        if new_layers:
+            CostLayer.objects.bulk_create(new_layers)
+        update_rows(CostLayer, touched.values(), ["remaining_quantity"])
+        update_rows(StockMovement, costed, ["cogs_amount"])
+
+    @staticmethod
+    def _location(movement: StockMovement, out: bool) -> tuple:
+        branch_id = movement.source_branch_id if out else movement.dest_branch_id
+        return (movement.product_id, movement.variant_id, branch_id)
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+
+class InsufficientStockError(Exception):
+    """Raised when there's not enough stock for an operation"""
+
+    def __init__(self, message: str = "", details: Optional[List[Dict[str, Any]]] = None):
+        super().__init__(message)
+        # One entry per failing line for batched movements
+        self.details = details or []
+
+
+class StockImportError(ValueError):
+    """Raised for a stock feed row that can't be imported"""
+
+    def __init__(self, line: int, message: str):
+        super().__init__(f"Line {line}: {message}")
+        self.line = line
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Dict, Optional
+
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from accounts.models import Branch
+from inventory.models import (
+    LocationStock,
+    Product,
+    ProductVariant,
+    StockCheckpoint,
+    StockMovement,
+)
+from inventory.services.archive import StockArchiveService
+
+
+class StockHistoryService:
+    """
+    Point-in-time stock balances.
+
+    ``as_of`` starts from the latest StockCheckpoint on or before the requested
+    date and replays only the movements after it, so the cost depends on the
+    checkpoint interval rather than on the length of the movement history.
+    Balances are keyed by (branch_id, product_id, variant_id, batch_number).
+    """
+
+    @staticmethod
+    def day_end(on_date: date) -> datetime:
+        """First instant after ``on_date`` in the current time zone"""
+        return timezone.make_aware(datetime.combine(on_date + timedelta(days=1), time.min))
+
+    @staticmethod
+    def movement_deltas(
+        *,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        product: Optional[Product] = None,
+        variant: Optional[ProductVariant] = None,
+        branch: Optional[Branch] = None,
+    ) -> Dict[tuple, Decimal]:
+        """
+        Net stock change per stock row from movements created in [since, until),
+        archived ones included. Filtering by product keeps the scan on the
+        (product, -created_at) index.
+        """
+        deltas: Dict[tuple, Decimal] = defaultdict(Decimal)
+        for movements in StockArchiveService.movement_sources(since, until):
+            if product is not None:
+                movements = movements.filter(product=product, variant=variant)
+            for branch_field, types, sign in (
+                ("dest_branch_id", StockMovement.IN_TYPES, 1),
+                ("source_branch_id", StockMovement.OUT_TYPES, -1),
+            ):
+                grouped = movements.filter(
+                    movement_type__in=types, **{f"{branch_field}__isnull": False}
+                )
+                if branch is not None:
+                    grouped = grouped.filter(**{branch_field: branch.pk})
+                grouped = grouped.values_list(
+                    branch_field, "product_id", "variant_id", "batch_number"
+                ).annotate(total=Sum("quantity"))
+                for branch_id, product_id, variant_id, batch_number, total in grouped:
+                    deltas[(branch_id, product_id, variant_id, batch_number)] += sign * total
+        return deltas
+
+    @staticmethod
+    def current_balances(
+        *,
+        product: Optional[Product] = None,
+        variant: Optional[ProductVariant] = None,
+        branch: Optional[Branch] = None,
+    ) -> Dict[tuple, Decimal]:
+        """On-hand per stock row right now, from the LocationStock view"""
+        rows = LocationStock.objects.exclude(quantity=0)
+        if product is not None:
+            rows = rows.filter(product=product, variant=variant)
+        if branch is not None:
+            rows = rows.filter(branch=branch)
+        return {
+            (branch_id, product_id, variant_id, batch_number): quantity
+            for branch_id, product_id, variant_id, batch_number, quantity in rows.values_list(
+                "branch_id", "product_id", "variant_id", "batch_number", "quantity"
+            )
+        }
+
+    @staticmethod
+    def as_of(
+        on_date: date,
+        *,
+        product: Optional[Product] = None,
+        variant: Optional[ProductVariant] = None,
+        branch: Optional[Branch] = None,
+    ) -> Dict[tuple, Decimal]:
+        """
+        Stock on hand at the end of ``on_date``.
+
+        Args:
+            on_date: Day to report (balances at its end, local time)
+            product: Limit to one product (and ``variant``)
+            branch: Limit to one branch
+
+        Returns:
+            Non-zero balances keyed by (branch_id, product_id, variant_id, batch_number)
+        """
+        # Checkpoints are complete, so a row missing from the latest one means zero
+        checkpoint_date = StockCheckpoint.objects.filter(as_of__lte=on_date).aggregate(
+            latest=Max("as_of")
+        )["latest"]
+
+        if checkpoint_date is None:
+            # No checkpoint yet: walk back from the live balances instead
+            balances = StockHistoryService.current_balances(
+                product=product, variant=variant, branch=branch
+            )
+            deltas = StockHistoryService.movement_deltas(
+                since=StockHistoryService.day_end(on_date),
+                product=product,
+                variant=variant,
+                branch=branch,
+            )
+            sign = -1
+        else:
+            rows = StockCheckpoint.objects.filter(as_of=checkpoint_date)
+            if product is not None:
+                rows = rows.filter(product=product, variant=variant)
+            if branch is not None:
+                rows = rows.filter(branch=branch)
+            balances = {
+                (branch_id, product_id, variant_id, batch_number): quantity
+                for branch_id, product_id, variant_id, batch_number, quantity in rows.values_list(
+                    "branch_id", "product_id", "variant_id", "batch_number", "quantity"
+                )
+            }
+            deltas = StockHistoryService.movement_deltas(
+                since=StockHistoryService.day_end(checkpoint_date),
+                until=StockHistoryService.day_end(on_date),
+                product=product,
+                variant=variant,
+                branch=branch,
+            )
+            sign = 1
+
+        balances = defaultdict(Decimal, balances)
+        for key, delta in deltas.items():
+            balances[key] += sign * delta
+        return {key: quantity for key, quantity in balances.items() if quantity}
+
+    @staticmethod
+    def quantity_as_of(
+        on_date: date,
+        *,
+        product: Product,
+        variant: Optional[ProductVariant] = None,
+        branch: Branch,
+    ) -> Decimal:
+        """Total on hand for a product at a branch at the end of ``on_date``, all batches"""
+        balances = StockHistoryService.as_of(
+            on_date, product=product, variant=variant, branch=branch
+        )
+        return sum(balances.values(), Decimal("0"))
+
+    @staticmethod
+    @transaction.atomic
+    def create_checkpoint(on_date: date, batch_size: int = 1000) -> int:
+        """
+        Write the checkpoint for the end of ``on_date``, replacing any existing one.
+
+        Balances are derived from the live stock minus the movements made since,
+        so a checkpoint can be (re)built for any past date. Returns the row count.
+        """
+        balances = defaultdict(Decimal, StockHistoryService.current_balances())
+        later = StockHistoryService.movement_deltas(
+            since=StockHistoryService.day_end(on_date)
+        )
+        for key, delta in later.items():
+            balances[key] -= delta
+
+        StockCheckpoint.objects.filter(as_of=on_date).delete()
+        StockCheckpoint.objects.bulk_create(
+            [
+                StockCheckpoint(
+                    as_of=on_date,
+                    branch_id=branch_id,
+                    product_id=product_id,
+                    variant_id=variant_id,
+                    batch_number=batch_number,
+                    quantity=quantity,
+                )
+                for (branch_id, product_id, variant_id, batch_number), quantity in balances.items()
+                if quantity
+            ],
+            batch_size=batch_size,
+        )
+        return sum(1 for quantity in balances.values() if quantity)
+
+    @staticmethod
+    def prune(*, keep_daily_days: int, today: Optional[date] = None) -> int:
+        """
+        Delete daily checkpoints older than ``keep_daily_days``, keeping month-ends.
+        Returns the number of rows deleted.
+        """
+        today = today or timezone.localdate()
+        cutoff = today - timedelta(days=keep_daily_days)
+        old_dates = (
+            StockCheckpoint.objects.filter(as_of__lt=cutoff)
+            .order_by()
+            .values_list("as_of", flat=True)
+            .distinct()
+        )
+        daily_dates = [
+            as_of for as_of in old_dates if (as_of + timedelta(days=1)).day != 1
+        ]
+        if not daily_dates:
+            return 0
+        deleted, _ = StockCheckpoint.objects.filter(as_of__in=daily_dates).delete()
+        return deleted
@@ -0,0 +1,359 @@
+from __future__ import annotations
+
+import csv
+import json
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from django.db import IntegrityError, transaction
+
+from accounts.models import Branch
+from inventory.models import (
+    BranchStock,
+    CostLayer,
+    Product,
+    ProductVariant,
+    StockMovement,
+    WarehouseStock,
+)
+from inventory.services.availability import StockAvailabilityCache
+from inventory.services.bulk import add_to_rows, insert_rows
+from inventory.services.concurrency import STOCK_LOCK_ORDER, retry_on_conflict
+from inventory.services.exceptions import StockImportError
+from inventory.services.keys import STOCK_KEY_FIELDS
+from inventory.services.stock import StockService
+from inventory.services.summary import StockSummaryService
+from inventory.services.valuation import InventoryValuationService
+
+# Movement types a stock feed may create; feeds only ever add stock
+IMPORT_MOVEMENT_TYPES = frozenset({
+    StockMovement.MovementType.PURCHASE_IN,
+    StockMovement.MovementType.ADJUSTMENT_IN,
+    StockMovement.MovementType.RETURN_IN,
+})
+
+
+class StockImportService:
+    """
+    Bulk stock loads from CSV or JSON Lines feeds.
+
+    Rows are parsed as a stream, product codes are resolved through one
+    in-memory map, and every chunk is applied in its own transaction with a
+    fixed number of queries. Feeds only add stock, so chunks skip the general
+    movement path: movements and cost layers are written as raw multi-row
+    INSERTs, stock rows are locked and updated in bulk, and the summary gets
+    one delta per location. The valuation and alert checks run once, after
+    the last chunk.
+
+    Each row needs ``sku`` (a product or variant SKU or barcode), ``branch``
+    (branch code) and ``quantity``. ``batch_number``, ``expiry_date``
+    (YYYY-MM-DD), ``cost_price``, ``movement_type`` and ``reference`` are optional.
+    """
+
+    @staticmethod
+    def read_rows(stream: TextIO, fmt: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Yield (line number, row) from a CSV (with header) or JSONL stream"""
+        if fmt == "csv":
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_no, text in enumerate(stream, start=1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError:
+                row = None
+            yield line_no, row
+
+    @staticmethod
+    def load_code_map() -> Dict[str, Tuple[int, Optional[int]]]:
+        """
+        Map every product/variant SKU and barcode to (product_id, variant_id),
+        in two queries.
+        """
+        codes: Dict[str, Tuple[int, Optional[int]]] = {}
+        for product_id, sku, barcode in Product.objects.values_list("id", "sku", "barcode").iterator():
+            codes[sku] = (product_id, None)
+            if barcode:
+                codes[barcode] = (product_id, None)
+        for variant_id, product_id, sku, barcode in ProductVariant.objects.values_list(
+            "id", "product_id", "sku", "barcode"
+        ).iterator():
+            codes[sku] = (product_id, variant_id)
+            if barcode:
+                codes[barcode] = (product_id, variant_id)
+        return codes
+
+    @staticmethod
+    def parse_row(
+        line: int,
+        row: Dict[str, Any],
+        codes: Dict[str, Tuple[int, Optional[int]]],
+        branches: Dict[str, Branch],
+        default_type: str,
+    ) -> Dict[str, Any]:
+        """
+        Validate a feed row and resolve its codes.
+
+        Raises:
+            StockImportError: If the row is incomplete or refers to unknown codes
+        """
+        if not isinstance(row, dict):
+            raise StockImportError(line, "Row is not a valid JSON object")
+        code = str(row.get("sku") or row.get("barcode") or "").strip()
+        if code not in codes:
+            raise StockImportError(line, f"Unknown SKU/barcode {code!r}")
+        branch_code = str(row.get("branch") or "").strip()
+        branch = branches.get(branch_code)
+        if branch is None:
+            raise StockImportError(line, f"Unknown branch {branch_code!r}")
+
+        movement_type = row.get("movement_type") or default_type
+        if movement_type not in IMPORT_MOVEMENT_TYPES:
+            raise StockImportError(line, f"Movement type {movement_type!r} can't be imported")
+
+        try:
+            quantity = Decimal(str(row.get("quantity")))
+            cost_price = row.get("cost_price")
+            cost_price = Decimal(str(cost_price)) if cost_price not in (None, "") else None
+        except InvalidOperation:
+            raise StockImportError(line, "Quantity and cost_price must be numbers")
+        if not quantity.is_finite() or quantity <= 0:
+            raise StockImportError(line, "Quantity must be positive")
+
+        expiry_date = row.get("expiry_date") or None
+        if expiry_date:
+            try:
+                expiry_date = date.fromisoformat(str(expiry_date))
+            except ValueError:
+                raise StockImportError(line, f"Invalid expiry_date {expiry_date!r}")
+
+        product_id, variant_id = codes[code]
+        return {
+            "product_id": product_id,
+            "variant_id": variant_id,
+            "dest_branch": branch,
+            "quantity": quantity,
+            "movement_type": movement_type,
+            "batch_number": str(row.get("batch_number") or "").strip(),
+            "expiry_date": expiry_date,
+            "cost_price": cost_price,
+            "reference": str(row.get("reference") or ""),
+        }
+
+    @staticmethod
+    @retry_on_conflict
+    @transaction.atomic
+    def apply_chunk(
+        lines: List[Dict[str, Any]], *, reference: str = "", created_by=None
+    ) -> Dict[tuple, Decimal]:
+        """
+        Apply parsed rows in one transaction.
+
+        Stock rows are locked in the canonical order of ``StockService`` and
+        written with one statement per stock table; rows created concurrently
+        since the lock query are added to, as in ``apply_stock_movements``.
+        Valuation and alerts are left to ``finish``.
+
+        Returns:
+            Quantity added per (product_id, variant_id, branch_id)
+        """
+        costs = dict(
+            Product.objects.filter(pk__in={line["product_id"] for line in lines})
+            .values_list("id", "cost_price")
+        )
+        keys_by_model: Dict[Any, set] = {WarehouseStock: set(), BranchStock: set()}
+        added: Dict[tuple, Decimal] = defaultdict(Decimal)
+        new_expiry: Dict[tuple, date] = {}
+        for line in lines:
+            branch = line["dest_branch"]
+            stock_model = WarehouseStock if branch.is_warehouse else BranchStock
+            key = (branch.pk, line["product_id"], line["variant_id"], line["batch_number"])
+            keys_by_model[stock_model].add(key)
+            added[(stock_model, key)] += line["quantity"]
+            if line["expiry_date"]:
+                new_expiry.setdefault((stock_model, key), line["expiry_date"])
+
+        locked = StockImportService._lock_rows(keys_by_model)
+        deltas: Dict[tuple, Decimal] = defaultdict(Decimal)
+        to_create: Dict[Any, list] = {WarehouseStock: [], BranchStock: []}
+        to_add: Dict[Any, list] = {WarehouseStock: [], BranchStock: []}
+        for row_key, quantity in added.items():
+            stock_model, (branch_id, product_id, variant_id, batch_number) = row_key
+            deltas[(product_id, variant_id, branch_id)] += quantity
+            pk = locked.get(row_key)
+            if pk is None:
+                to_create[stock_model].append({
+                    "branch_id": branch_id,
+                    "product_id": product_id,
+                    "variant_id": variant_id,
+                    "batch_number": batch_number,
+                    "quantity": quantity,
+                    "expiry_date": new_expiry.get(row_key),
+                })
+                continue
+            to_add[stock_model].append((pk, quantity, new_expiry.get(row_key)))
+
+        for stock_model in (WarehouseStock, BranchStock):
+            if to_create[stock_model]:
+                try:
+                    with transaction.atomic():
+                        insert_rows(stock_model, to_create[stock_model])
+                except IntegrityError:
+                    StockService._create_stock_rows(
+                        stock_model, [stock_model(**row) for row in to_create[stock_model]]
+                    )
+            add_to_rows(stock_model, "quantity", to_add[stock_model], fill=["expiry_date"])
+
+        created_by_id = created_by.pk if created_by else None
+        movement_ids = insert_rows(
+            StockMovement,
+            [
+                {
+                    "product_id": line["product_id"],
+                    "variant_id": line["variant_id"],
+                    "quantity": line["quantity"],
+                    "movement_type": line["movement_type"],
+                    "dest_branch_id": line["dest_branch"].pk,
+                    "reference": line["reference"] or reference,
+                    "batch_number": line["batch_number"],
+                    "expiry_date": line["expiry_date"],
+                    "cost_price": line["cost_price"],
+                    "created_by_id": created_by_id,
+                }
+                for line in lines
+            ],
+            returning=True,
+        )
+        # Every row is an IN movement, so each opens a FIFO layer (oldest id first)
+        insert_rows(
+            CostLayer,
+            [
+                {
+                    "product_id": line["product_id"],
+                    "variant_id": line["variant_id"],
+                    "branch_id": line["dest_branch"].pk,
+                    "movement_id": movement_id,
+                    "unit_cost": (
+                        line["cost_price"]
+                        if line["cost_price"] is not None
+                        else costs[line["product_id"]]
+                    ),
+                    "original_quantity": line["quantity"],
+                    "remaining_quantity": line["quantity"],
+                }
+                for line, movement_id in zip(lines, movement_ids)
+            ],
+        )
+
+        StockSummaryService.apply_deltas(deltas, valuation=False)
+        StockAvailabilityCache.invalidate(deltas.keys())
+        return deltas
+
+    @staticmethod
+    def _lock_rows(keys_by_model: Dict[Any, set]) -> Dict[tuple, int]:
+        """
+        Lock the existing stock rows of a chunk in the canonical order of
+        ``StockService`` and map (stock model, key) to their primary keys.
+
+        Rows are selected by the chunk's branches, products and batch numbers
+        rather than key by key: a feed chunk has thousands of distinct keys,
+        and a filter term per key costs more to compile than the extra rows in
+        this superset cost to lock.
+        """
+        locked: Dict[tuple, int] = {}
+        for stock_model in (WarehouseStock, BranchStock):
+            keys = keys_by_model.get(stock_model)
+            if not keys:
+                continue
+            rows = (
+                stock_model.objects.select_for_update()
+                .filter(
+                    branch_id__in={key[0] for key in keys},
+                    product_id__in={key[1] for key in keys},
+                    batch_number__in={key[3] for key in keys},
+                )
+                .order_by(*STOCK_LOCK_ORDER)
+                .values_list("pk", *STOCK_KEY_FIELDS)
+            )
+            for pk, *key in rows:
+                key = tuple(key)
+                if key in keys:
+                    locked[(stock_model, key)] = pk
+        return locked
+
+    @staticmethod
+    @transaction.atomic
+    def finish(deltas: Dict[tuple, Decimal]) -> None:
+        """
+        Value the imported stock and check its alerts, once for the whole
+        import, after commit
+        """
+        InventoryValuationService.queue_deltas(deltas)
+        StockService.queue_alert_check(deltas.keys())
+
+    @staticmethod
+    def import_rows(
+        rows: Iterable[Tuple[int, Dict[str, Any]]],
+        *,
+        chunk_size: int = 5000,
+        default_type: str = StockMovement.MovementType.PURCHASE_IN,
+        reference: str = "",
+        created_by=None,
+        dry_run: bool = False,
+        on_error: Optional[Callable[[StockImportError], None]] = None,
+        on_progress: Optional[Callable[[int], None]] = None,
+    ) -> Dict[str, int]:
+        """
+        Validate and apply feed rows chunk by chunk.
+
+        Bad rows are passed to ``on_error`` and skipped; without ``on_error``
+        the first bad row raises. Committed chunks stay committed if a later
+        chunk fails, and are still valued.
+
+        Returns:
+            Counts of ``imported`` and ``skipped`` rows
+        """
+        codes = StockImportService.load_code_map()
+        branches = {branch.code: branch for branch in Branch.objects.all()}
+        counts = {"imported": 0, "skipped": 0}
+        chunk: List[Dict[str, Any]] = []
+        # Quantity added by committed chunks, valued in one pass at the end
+        imported: Dict[tuple, Decimal] = defaultdict(Decimal)
+
+        def flush() -> None:
+            if chunk and not dry_run:
+                deltas = StockImportService.apply_chunk(
+                    chunk, reference=reference, created_by=created_by
+                )
+                for key, delta in deltas.items():
+                    imported[key] += delta
+            counts["imported"] += len(chunk)
+            chunk.clear()
+            if on_progress:
+                on_progress(counts["imported"])
+
+        try:
+            for line, row in rows:
+                try:
+                    chunk.append(
+                        StockImportService.parse_row(line, row, codes, branches, default_type)
+                    )
+                except StockImportError as exc:
+                    if on_error is None:
+                        raise
+                    counts["skipped"] += 1
+                    on_error(exc)
+                    continue
+                if len(chunk) >= chunk_size:
+                    flush()
+            if chunk:
+                flush()
+        finally:
+            if imported:
+                StockImportService.finish(imported)
+        return counts
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List
+
+from django.db.models import Q
+
+# Column tuples identifying stock rows (per batch) and stock locations
+STOCK_KEY_FIELDS = ("branch_id", "product_id", "variant_id", "batch_number")
+LOCATION_KEY_FIELDS = ("product_id", "variant_id", "branch_id")
+
+# Keys per key_filter query: SQLite rejects expression trees deeper than 1000
+KEY_CHUNK_SIZE = 250
+
+
+def key_filter(fields: tuple, keys: Iterable[tuple]) -> Q:
+    """
+    Build a filter matching any of ``keys``, each a tuple of values for ``fields``.
+    ``None`` values match NULL columns (e.g. rows without a variant).
+
+    Keys are folded into ``__in`` terms on the field with the most distinct
+    values, so a batch of many products at one branch becomes a single
+    ``product_id IN (...)`` term instead of one term per key.
+    """
+    keys = list(keys)
+    if not keys:
+        return Q(pk__in=[])
+    fold = max(range(len(fields)), key=lambda i: len({key[i] for key in keys}))
+    other_fields = fields[:fold] + fields[fold + 1:]
+    grouped: Dict[tuple, List] = defaultdict(list)
+    for key in keys:
+        grouped[key[:fold] + key[fold + 1:]].append(key[fold])
+
+    condition = Q(pk__in=[])
+    for others, fold_values in grouped.items():
+        lookups = {}
+        for field, value in zip(other_fields, others):
+            if value is None:
+                lookups[f"{field}__isnull"] = True
+            else:
+                lookups[field] = value
+        values = [value for value in fold_values if value is not None]
+        if len(values) == 1:
+            condition |= Q(**lookups, **{fields[fold]: values[0]})
+        elif values:
+            condition |= Q(**lookups, **{f"{fields[fold]}__in": values})
+        if len(values) != len(fold_values):
+            condition |= Q(**lookups, **{f"{fields[fold]}__isnull": True})
+    return condition
+
+
+def key_chunks(keys: Iterable[tuple], size: int = KEY_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """
+    Split ``keys`` into sorted chunks small enough for one ``key_filter`` query.
+    Keys are sorted field by field (NULLs last), so row locks taken chunk by
+    chunk still follow the canonical lock order.
+    """
+    ordered = sorted(
+        set(keys),
+        key=lambda key: tuple((value is None, 0 if value is None else value) for value in key),
+    )
+    for start in range(0, len(ordered), size):
+        yield ordered[start:start + size]
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import threading
+import time
+from decimal import Decimal
+from typing import Dict, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, Max, Sum
+
+from accounts.models import Branch
+from inventory.models import LocationStock, Product, ProductVariant
+
+
+class _BranchTree:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (branch count, latest updated_at) the map was built from
+        self.version: Optional[tuple] = None
+        self.checked_at = 0.0
+        self.children: Dict[Optional[int], List[int]] = {}
+
+
+_branches = _BranchTree()
+
+
+class LocationStockService:
+    """
+    Company-wide stock reads over the ``LocationStock`` view, which unions
+    WarehouseStock and BranchStock so callers don't dispatch on
+    ``branch.is_warehouse``. Filters on product/branch reach the indexes of
+    both underlying tables.
+    """
+
+    @staticmethod
+    def branch_tree_ids(branch: Branch) -> Set[int]:
+        """Ids of ``branch`` and every branch below it in the ``parent_branch`` tree"""
+        children = LocationStockService._children()
+        tree = {branch.pk}
+        pending = [branch.pk]
+        while pending:
+            for child_id in children.get(pending.pop(), []):
+                if child_id not in tree:
+                    tree.add(child_id)
+                    pending.append(child_id)
+        return tree
+
+    @staticmethod
+    def _children() -> Dict[Optional[int], List[int]]:
+        """
+        Child branch ids by parent id, held per process. Branch saves and
+        deletes expire it (see ``invalidate_branch_tree``); changes made by
+        other processes are noticed within ``BRANCH_TREE_REFRESH_SECONDS``.
+        """
+        now = time.monotonic()
+        if _branches.version is not None and (
+            now - _branches.checked_at < getattr(settings, "BRANCH_TREE_REFRESH_SECONDS", 5)
+        ):
+            return _branches.children
+
+        with _branches.lock:
+            if _branches.version is not None and now < _branches.checked_at:
+                # Another thread checked while this one waited for the lock
+                return _branches.children
+            version = tuple(
+                Branch.objects.aggregate(count=Count("id"), changed=Max("updated_at")).values()
+            )
+            _branches.checked_at = time.monotonic()
+            if version == _branches.version:
+                return _branches.children
+            children: Dict[Optional[int], List[int]] = {}
+            for branch_id, parent_id in Branch.objects.values_list("id", "parent_branch_id"):
+                children.setdefault(parent_id, []).append(branch_id)
+            _branches.children, _branches.version = children, version
+            return children
+
+    @staticmethod
+    def invalidate_branch_tree() -> None:
+        """
+        Rebuild this process's branch map on its next read, now and again once
+        the current transaction commits, so a read racing the commit can't
+        keep the old map
+        """
+        def expire() -> None:
+            _branches.version = None
+
+        expire()
+        transaction.on_commit(expire, robust=True)
+
+    @staticmethod
+    def queryset(
+        *,
+        product: Optional[Product] = None,
+        variant: Optional[ProductVariant] = None,
+        within: Optional[Branch] = None,
+        in_stock_only: bool = False,
+    ) -> models.QuerySet:
+        """
+        Stock rows across all locations.
+
+        Args:
+            product: Only rows for this product
+            variant: Only rows for this variant (requires ``product`` for meaning)
+            within: Only ``within`` and the branches under it in the hierarchy
+            in_stock_only: Skip rows with nothing on hand
+        """
+        queryset = LocationStock.objects.all()
+        if product is not None:
+            queryset = queryset.filter(product=product, variant=variant)
+        if within is not None:
+            queryset = queryset.filter(
+                branch_id__in=LocationStockService.branch_tree_ids(within)
+            )
+        if in_stock_only:
+            queryset = queryset.filter(quantity__gt=0)
+        return queryset
+
+    @staticmethod
+    def availability_by_branch(
+        product: Product,
+        variant: Optional[ProductVariant] = None,
+        *,
+        within: Optional[Branch] = None,
+    ) -> Dict[int, Decimal]:
+        """On-hand quantity per branch id, all batches combined, in one grouped query"""
+        return dict(
+            LocationStockService.queryset(
+                product=product, variant=variant, within=within, in_stock_only=True
+            )
+            .order_by()
+            .values("branch_id")
+            .annotate(total=Sum("quantity"))
+            .values_list("branch_id", "total")
+        )
+
+    @staticmethod
+    def transfer_sources(
+        product: Product,
+        variant: Optional[ProductVariant] = None,
+        *,
+        quantity: Decimal,
+        dest_branch: Branch,
+        within: Optional[Branch] = None,
+    ) -> List[Tuple[Branch, Decimal]]:
+        """
+        Branches that could send ``quantity`` to ``dest_branch``.
+
+        Returns:
+            (branch, available) pairs, largest stock first
+        """
+        rows = (
+            LocationStockService.queryset(
+                product=product, variant=variant, within=within, in_stock_only=True
+            )
+            .filter(branch__is_active=True)
+            .exclude(branch=dest_branch)
+            .order_by()
+            .values("branch_id")
+            .annotate(total=Sum("quantity"))
+            .filter(total__gte=quantity)
+            .order_by("-total", "branch_id")
+            .values_list("branch_id", "total")
+        )
+        rows = list(rows)
+        branches = Branch.objects.in_bulk([branch_id for branch_id, _ in rows])
+        return [(branches[branch_id], total) for branch_id, total in rows]
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from typing import Dict, Iterator, List, Tuple
+
+from django.db import connections
+from django.db.models import Max, Min, Sum
+
+from inventory.models import LocationStock, Product, StockMovement
+from inventory.services.archive import StockArchiveService
+
+
+def _init_worker() -> None:
+    """Process pool initializer: set Django up and drop inherited connections"""
+    import django
+
+    django.setup()
+    connections.close_all()
+
+
+def _reconcile_range(bounds: Tuple[int, int, int]) -> List[tuple]:
+    start, end, chunk_size = bounds
+    return StockReconciliationService.reconcile_range(start, end, chunk_size=chunk_size)
+
+
+class StockReconciliationService:
+    """
+    Checks that stock balances still equal the net of their StockMovement rows.
+
+    Work is split into product-id ranges. Each range is aggregated by the
+    database and streamed back in chunks, so memory is bounded by the number of
+    stock rows in one range, however long the movement history is.
+    """
+
+    @staticmethod
+    def product_ranges(step: int) -> Iterator[Tuple[int, int]]:
+        """Half-open [start, end) product-id ranges covering every product"""
+        bounds = Product.objects.aggregate(low=Min("id"), high=Max("id"))
+        if bounds["low"] is None:
+            return
+        for start in range(bounds["low"], bounds["high"] + 1, step):
+            yield start, start + step
+
+    @staticmethod
+    def ledger_totals(start: int, end: int, chunk_size: int = 2000) -> Dict[tuple, Decimal]:
+        """Net movement quantity (archive included) per stock row for products in [start, end)"""
+        totals: Dict[tuple, Decimal] = defaultdict(Decimal)
+        for movements in StockArchiveService.movement_sources():
+            movements = movements.filter(product_id__gte=start, product_id__lt=end)
+            for branch_field, types, sign in (
+                ("dest_branch_id", StockMovement.IN_TYPES, 1),
+                ("source_branch_id", StockMovement.OUT_TYPES, -1),
+            ):
+                grouped = (
+                    movements.filter(movement_type__in=types, **{f"{branch_field}__isnull": False})
+                    .values_list(branch_field, "product_id", "variant_id", "batch_number")
+                    .annotate(total=Sum("quantity"))
+                )
+                for branch_id, product_id, variant_id, batch_number, total in grouped.iterator(
+                    chunk_size=chunk_size
+                ):
+                    totals[(branch_id, product_id, variant_id, batch_number)] += sign * total
+        return totals
+
+    @staticmethod
+    def balances(start: int, end: int, chunk_size: int = 2000) -> Dict[tuple, Decimal]:
+        """On-hand per stock row (shards included) for products in [start, end)"""
+        rows = LocationStock.objects.filter(
+            product_id__gte=start, product_id__lt=end
+        ).values_list("branch_id", "product_id", "variant_id", "batch_number", "quantity")
+        return {
+            (branch_id, product_id, variant_id, batch_number): quantity
+            for branch_id, product_id, variant_id, batch_number, quantity in rows.iterator(
+                chunk_size=chunk_size
+            )
+        }
+
+    @staticmethod
+    def reconcile_range(start: int, end: int, chunk_size: int = 2000) -> List[tuple]:
+        """
+        Compare ledger and balances for products in [start, end).
+
+        Returns:
+            (key, ledger, balance) for every stock row that differs, keyed by
+            (branch_id, product_id, variant_id, batch_number)
+        """
+        ledger = StockReconciliationService.ledger_totals(start, end, chunk_size)
+        balances = StockReconciliationService.balances(start, end, chunk_size)
+        drift = []
+        for key in ledger.keys() | balances.keys():
+            expected = ledger.get(key, Decimal("0"))
+            actual = balances.get(key, Decimal("0"))
+            if expected != actual:
+                drift.append((key, expected, actual))
+        return drift
+
+    @staticmethod
+    def reconcile(
+        *,
+        products_per_range: int = 5000,
+        chunk_size: int = 2000,
+        workers: int = 1,
+    ) -> Iterator[tuple]:
+        """
+        Reconcile every product, yielding drift rows range by range.
+
+        With ``workers`` > 1 the ranges are spread over a process pool; each
+        worker opens its own database connection.
+        """
+        ranges = [
+            (start, end, chunk_size)
+            for start, end in StockReconciliationService.product_ranges(products_per_range)
+        ]
+        if workers <= 1:
+            for bounds in ranges:
+                yield from _reconcile_range(bounds)
+            return
+
+        # Forked workers must not share the parent's connection
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            for drift in pool.map(_reconcile_range, ranges):
+                yield from drift
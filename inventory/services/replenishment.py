@@ -0,0 +1,481 @@
+from __future__ import annotations
+
+import uuid
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from statistics import NormalDist
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, F, FloatField, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Cast, Coalesce, TruncDate
+from django.utils import timezone
+
+from accounts.models import Branch, User
+from inventory.models import (
+    ProductStockSummary,
+    ReorderPoint,
+    StockMovement,
+    StockTransfer,
+    StockTransferItem,
+)
+from inventory.services.archive import StockArchiveService
+
+# Movements that count as demand at their source branch: sales only.
+# Transfers just move stock inside the company (the destination's own sales
+# are its demand, so counting the transfer as well would count them twice),
+# and damage or adjustments are losses, not demand to stock up for.
+DEMAND_TYPES = frozenset({
+    StockMovement.MovementType.POS_SALE_OUT,
+    StockMovement.MovementType.ONLINE_ORDER_OUT,
+})
+
+
+def _group(columns: List[np.ndarray]) -> Tuple[List[np.ndarray], np.ndarray]:
+    """
+    Distinct rows of non-negative integer ``columns`` and, for every input row,
+    the index of its distinct row. Rows are packed into one int64 per row, which
+    sorts far faster than ``np.unique(axis=0)``.
+    """
+    widths = [int(column.max()) + 1 if len(column) else 1 for column in columns]
+    packed = np.zeros(len(columns[0]), dtype=np.int64)
+    for column, width in zip(columns, widths):
+        packed = packed * width + column
+    distinct, index = np.unique(packed, return_inverse=True)
+    unpacked = []
+    for width in reversed(widths):
+        unpacked.append(distinct % width)
+        distinct = distinct // width
+    return unpacked[::-1], index.reshape(-1)
+
+
+class ReorderPointService:
+    """
+    Demand-driven reorder levels per (product, branch).
+
+    Daily demand totals come from one grouped query over StockMovement (plus
+    one over the archive if the window reaches into it). The statistics are
+    computed with NumPy over all (product, branch) pairs at once:
+    per-pair sums of the daily totals and of their squares (``np.bincount``)
+    give the moving-average daily demand and its standard deviation over the
+    window, days without sales counting as zero. Then::
+
+        safety stock  = z(service level) * std * sqrt(lead time)
+        reorder level = daily demand * lead time + safety stock
+
+    Memory grows with the number of (pair, day) rows that had demand, not with
+    SKUs x branches x days.
+    """
+
+    @staticmethod
+    def daily_demand(since: date, until: date) -> Dict[str, np.ndarray]:
+        """
+        Demand per (product, branch, day) for days in [since, until), archive
+        included, as parallel ``product_id``, ``branch_id``, ``day`` (index from
+        ``since``) and ``quantity`` arrays.
+        """
+        tz = timezone.get_current_timezone()
+        product_ids, branch_ids, days, quantities = [], [], [], []
+        for movements in StockArchiveService.movement_sources(
+            timezone.make_aware(datetime.combine(since, time.min)),
+            timezone.make_aware(datetime.combine(until, time.min)),
+        ):
+            rows = (
+                movements.filter(movement_type__in=DEMAND_TYPES, source_branch__isnull=False)
+                .values_list("product_id", "source_branch_id", TruncDate("created_at", tzinfo=tz))
+                .annotate(total=Cast(Sum("quantity"), FloatField()))
+            )
+            for product_id, branch_id, day, total in rows.iterator(chunk_size=10000):
+                product_ids.append(product_id)
+                branch_ids.append(branch_id)
+                days.append((day - since).days)
+                quantities.append(total)
+
+        # A day straddling the archive boundary comes back from both sources
+        columns = [np.array(values, dtype=np.int64) for values in (product_ids, branch_ids, days)]
+        keys, index = _group(columns)
+        quantity = np.bincount(
+            index, weights=np.array(quantities, dtype=np.float64), minlength=len(keys[0])
+        )
+        return {
+            "product_id": keys[0],
+            "branch_id": keys[1],
+            "day": keys[2],
+            "quantity": quantity,
+        }
+
+    @staticmethod
+    def compute(
+        demand: Dict[str, np.ndarray],
+        *,
+        days: int,
+        lead_time_days: float,
+        service_level: float,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Reorder statistics for every (product, branch) pair in ``demand``.
+
+        Returns:
+            Parallel arrays ``product_id``, ``branch_id``, ``daily_demand``,
+            ``demand_std``, ``safety_stock`` and ``reorder_level``
+        """
+        (product_ids, branch_ids), pair_index = _group([demand["product_id"], demand["branch_id"]])
+        count = len(product_ids)
+
+        quantity = demand["quantity"]
+        total = np.bincount(pair_index, weights=quantity, minlength=count)
+        total_sq = np.bincount(pair_index, weights=quantity * quantity, minlength=count)
+
+        mean = total / days
+        # Sample variance over every day of the window, zero-demand days included
+        variance = (total_sq - days * mean * mean) / max(days - 1, 1)
+        std = np.sqrt(np.clip(variance, 0, None))
+
+        z = NormalDist().inv_cdf(service_level)
+        safety = z * std * np.sqrt(lead_time_days)
+        reorder = np.ceil(mean * lead_time_days + safety)
+        return {
+            "product_id": product_ids,
+            "branch_id": branch_ids,
+            "daily_demand": mean,
+            "demand_std": std,
+            "safety_stock": np.ceil(safety),
+            "reorder_level": reorder,
+        }
+
+    @staticmethod
+    @transaction.atomic
+    def save(points: Dict[str, np.ndarray], batch_size: int = 5000) -> int:
+        """
+        Replace stored reorder points with ``points``. Pairs without demand in
+        the window lose their row and fall back to ``Product.reorder_level``.
+        Returns the number of rows written.
+        """
+        now = timezone.now()
+        ReorderPoint.objects.all().delete()
+        rows = zip(
+            points["product_id"].tolist(),
+            points["branch_id"].tolist(),
+            np.round(points["daily_demand"], 3).tolist(),
+            np.round(points["demand_std"], 3).tolist(),
+            points["safety_stock"].tolist(),
+            points["reorder_level"].tolist(),
+        )
+        written = 0
+        batch = []
+        for product_id, branch_id, daily_demand, demand_std, safety_stock, reorder_level in rows:
+            batch.append(ReorderPoint(
+                product_id=product_id,
+                branch_id=branch_id,
+                daily_demand=Decimal(repr(daily_demand)),
+                demand_std=Decimal(repr(demand_std)),
+                safety_stock=Decimal(int(safety_stock)),
+                reorder_level=Decimal(int(reorder_level)),
+                computed_at=now,
+            ))
+            if len(batch) >= batch_size:
+                ReorderPoint.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        ReorderPoint.objects.bulk_create(batch)
+        return written + len(batch)
+
+    @staticmethod
+    def recompute(
+        *,
+        days: int = 90,
+        lead_time_days: float = 7,
+        service_level: float = 0.95,
+        until: Optional[date] = None,
+        dry_run: bool = False,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Compute reorder points from the ``days`` before ``until`` (default
+        today, exclusive) and store them unless ``dry_run``.
+        """
+        until = until or timezone.localdate()
+        demand = ReorderPointService.daily_demand(until - timedelta(days=days), until)
+        points = ReorderPointService.compute(
+            demand, days=days, lead_time_days=lead_time_days, service_level=service_level
+        )
+        if not dry_run:
+            ReorderPointService.save(points)
+        return points
+
+
+class RebalancingService:
+    """
+    Nightly inter-branch rebalancing along ``Branch.parent_branch``.
+
+    A branch and its active children form one group; stock only moves inside
+    a group, from the parent or (with ``allow_siblings``) a sibling to a child
+    whose stock position is at or below its reorder level. The stock position
+    is on-hand quantity plus open transfers inbound, minus pending or approved
+    transfers outbound, so repeated runs don't propose the same stock twice.
+    Reorder levels are the branch's ReorderPoint or ``Product.reorder_level``.
+
+    Planning is for products without variants (reorder levels are per product)
+    and in whole units:
+
+        deficit = ceil(fill_ratio * level - position)   where position <= level
+        surplus = floor(position - keep_ratio * level)  where position > that
+
+    Within every (group, product) the parent gives first, then siblings by
+    largest surplus; children with the largest deficit are served first. The
+    matching is done for all groups and products at once: sources and sinks
+    are laid out on one number line by cumulative quantity, and every interval
+    between two consecutive breakpoints is one transfer line. That yields at
+    most ``sources + sinks - 1`` lines per (group, product).
+    """
+
+    @staticmethod
+    def load_matrix() -> Dict[str, np.ndarray]:
+        """
+        Stock position per (product, branch) for active branches, as parallel
+        ``product_id``, ``branch_id``, ``position`` and ``level`` arrays (in
+        hundredths of a unit).
+        """
+        reorder_point = ReorderPoint.objects.filter(
+            product_id=OuterRef("product_id"), branch_id=OuterRef("branch_id")
+        ).values("reorder_level")[:1]
+        rows = (
+            ProductStockSummary.objects.filter(
+                branch__isnull=False, branch__is_active=True, variant__isnull=True
+            )
+            .order_by()
+            .values_list(
+                "product_id",
+                "branch_id",
+                Cast(F("quantity") * 100, BigIntegerField()),
+                Cast(
+                    Coalesce(Subquery(reorder_point), F("product__reorder_level")) * 100,
+                    BigIntegerField(),
+                ),
+            )
+        )
+        product_ids, branch_ids, quantities, levels = [], [], [], []
+        for product_id, branch_id, quantity, level in rows.iterator(chunk_size=10000):
+            product_ids.append(product_id)
+            branch_ids.append(branch_id)
+            quantities.append(quantity)
+            levels.append(level)
+        matrix = {
+            "product_id": np.array(product_ids, dtype=np.int64),
+            "branch_id": np.array(branch_ids, dtype=np.int64),
+            "position": np.array(quantities, dtype=np.int64),
+            "level": np.array(levels, dtype=np.int64),
+        }
+
+        outstanding = Case(
+            When(transfer__status=StockTransfer.Status.PENDING, then=F("requested_quantity")),
+            default=F("approved_quantity") - F("received_quantity"),
+        )
+        open_items = StockTransferItem.objects.filter(variant__isnull=True).order_by()
+        flows = (
+            (
+                open_items.filter(transfer__status__in=[
+                    StockTransfer.Status.PENDING,
+                    StockTransfer.Status.APPROVED,
+                    StockTransfer.Status.IN_TRANSIT,
+                ]),
+                "transfer__destination_branch_id",
+                1,
+            ),
+            (
+                open_items.filter(transfer__status__in=[
+                    StockTransfer.Status.PENDING,
+                    StockTransfer.Status.APPROVED,
+                ]),
+                "transfer__source_branch_id",
+                -1,
+            ),
+        )
+        flow_keys, flow_totals = [], []
+        for items, branch_field, sign in flows:
+            rows = items.values_list("product_id", branch_field).annotate(
+                total=Cast(Sum(outstanding) * 100, BigIntegerField())
+            )
+            for product_id, branch_id, total in rows.iterator(chunk_size=10000):
+                flow_keys.append((product_id, branch_id))
+                flow_totals.append(sign * total)
+
+        # Add open transfer quantities to matching matrix rows in one pass
+        if flow_keys and len(product_ids):
+            flows_product, flows_branch = np.array(flow_keys, dtype=np.int64).T
+            width = int(max(matrix["branch_id"].max(), flows_branch.max())) + 1
+            packed = matrix["product_id"] * width + matrix["branch_id"]
+            order = np.argsort(packed)
+            wanted = flows_product * width + flows_branch
+            at = np.minimum(np.searchsorted(packed, wanted, sorter=order), len(order) - 1)
+            found = packed[order[at]] == wanted
+            np.add.at(
+                matrix["position"], order[at][found], np.array(flow_totals, dtype=np.int64)[found]
+            )
+        return matrix
+
+    @staticmethod
+    def branch_groups() -> np.ndarray:
+        """
+        Group id indexed by branch id: the parent's id for a child of an active
+        branch, the branch's own id otherwise, -1 for inactive or unknown ids.
+        """
+        branches = dict(
+            Branch.objects.filter(is_active=True).values_list("id", "parent_branch_id")
+        )
+        groups = np.full(max(branches, default=0) + 1, -1, dtype=np.int64)
+        for branch_id, parent_id in branches.items():
+            groups[branch_id] = parent_id if parent_id in branches else branch_id
+        return groups
+
+    @staticmethod
+    def plan(
+        matrix: Dict[str, np.ndarray],
+        groups: np.ndarray,
+        *,
+        fill_ratio: float = 2,
+        keep_ratio: float = 2,
+        allow_siblings: bool = True,
+        min_quantity: int = 1,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Transfer lines that move surplus to deficit branches.
+
+        Returns:
+            Parallel ``product_id``, ``source_branch_id``, ``destination_branch_id``
+            and ``quantity`` (whole units) arrays
+        """
+        in_range = matrix["branch_id"] < len(groups)
+        known = in_range.copy()
+        known[in_range] = groups[matrix["branch_id"][in_range]] >= 0
+        product_ids = matrix["product_id"][known]
+        branch_ids = matrix["branch_id"][known]
+        position = matrix["position"][known]
+        level = matrix["level"][known]
+        group_ids = groups[branch_ids]
+        is_parent = group_ids == branch_ids
+
+        deficit = np.where(
+            ~is_parent & (level > 0) & (position <= level),
+            np.ceil((fill_ratio * level - position) / 100),
+            0,
+        ).astype(np.int64)
+        surplus = np.floor(np.clip(position - keep_ratio * level, 0, None) / 100).astype(np.int64)
+        if not allow_siblings:
+            surplus[~is_parent] = 0
+
+        # One matching problem per (group, product)
+        _, key = _group([group_ids, product_ids])
+        key_count = int(key.max()) + 1 if len(key) else 0
+        supply = np.bincount(key, weights=surplus, minlength=key_count).astype(np.int64)
+        demand = np.bincount(key, weights=deficit, minlength=key_count).astype(np.int64)
+        moved = np.minimum(supply, demand)
+        base = np.cumsum(moved) - moved
+
+        def line_ends(quantity, priority):
+            # Rows sorted by (key, priority), each ending at its cumulative
+            # quantity on the shared line, capped at what its key moves
+            rows = np.flatnonzero(quantity > 0)
+            rows = rows[np.lexsort((priority[rows], key[rows]))]
+            row_keys = key[rows]
+            amount = quantity[rows]
+            cumulative = np.cumsum(amount)
+            first = np.flatnonzero(np.r_[True, row_keys[1:] != row_keys[:-1]][:len(rows)])
+            start = np.zeros(key_count, dtype=np.int64)
+            start[row_keys[first]] = (cumulative - amount)[first]
+            within = cumulative - start[row_keys]
+            return rows, base[row_keys] + np.minimum(within, moved[row_keys])
+
+        # Parents give before siblings, larger surpluses and deficits go first
+        source_rows, source_ends = line_ends(surplus, np.where(is_parent, -np.inf, -surplus))
+        sink_rows, sink_ends = line_ends(deficit, -deficit.astype(np.float64))
+
+        breakpoints = np.unique(np.r_[source_ends, sink_ends])
+        starts = np.r_[0, breakpoints[:-1]] if len(breakpoints) else breakpoints
+        lengths = breakpoints - starts
+        keep = lengths >= max(min_quantity, 1)
+        starts, lengths = starts[keep], lengths[keep]
+        sources = source_rows[np.searchsorted(source_ends, starts, side="right")]
+        sinks = sink_rows[np.searchsorted(sink_ends, starts, side="right")]
+        return {
+            "product_id": product_ids[sources],
+            "source_branch_id": branch_ids[sources],
+            "destination_branch_id": branch_ids[sinks],
+            "quantity": lengths,
+        }
+
+    @staticmethod
+    @transaction.atomic
+    def save(
+        lines: Dict[str, np.ndarray],
+        *,
+        requested_by: User,
+        batch_size: int = 5000,
+    ) -> List[StockTransfer]:
+        """
+        Write ``lines`` as pending StockTransfers, one per (source, destination)
+        pair, for someone to review and approve.
+        """
+        now = timezone.now()
+        # The run id keeps two runs within the same second apart
+        stamp = timezone.localtime(now).strftime("%Y%m%d%H%M%S")
+        run_id = uuid.uuid4().hex[:8].upper()
+        pairs, pair_index = _group([lines["source_branch_id"], lines["destination_branch_id"]])
+        transfers = StockTransfer.objects.bulk_create(
+            [
+                StockTransfer(
+                    transfer_number=f"RB-{stamp}-{run_id}-{number:05d}",
+                    source_branch_id=source_id,
+                    destination_branch_id=destination_id,
+                    transfer_date=timezone.localdate(now),
+                    requested_by=requested_by,
+                    notes="Proposed by the rebalancing planner",
+                )
+                for number, (source_id, destination_id) in enumerate(
+                    zip(pairs[0].tolist(), pairs[1].tolist()), start=1
+                )
+            ],
+            batch_size=batch_size,
+        )
+        items = [
+            StockTransferItem(
+                transfer_id=transfers[index].pk,
+                product_id=product_id,
+                requested_quantity=Decimal(quantity),
+            )
+            for index, product_id, quantity in zip(
+                pair_index.tolist(), lines["product_id"].tolist(), lines["quantity"].tolist()
+            )
+        ]
+        StockTransferItem.objects.bulk_create(items, batch_size=batch_size)
+        return transfers
+
+    @staticmethod
+    def run(
+        *,
+        requested_by: Optional[User] = None,
+        fill_ratio: float = 2,
+        keep_ratio: float = 2,
+        allow_siblings: bool = True,
+        min_quantity: int = 1,
+        dry_run: bool = False,
+    ) -> Tuple[Dict[str, np.ndarray], List[StockTransfer]]:
+        """
+        Plan transfers for the whole network and, unless ``dry_run``, save them.
+
+        Returns:
+            The planned lines and the transfers created
+        """
+        lines = RebalancingService.plan(
+            RebalancingService.load_matrix(),
+            RebalancingService.branch_groups(),
+            fill_ratio=fill_ratio,
+            keep_ratio=keep_ratio,
+            allow_siblings=allow_siblings,
+            min_quantity=min_quantity,
+        )
+        if dry_run or not len(lines["quantity"]):
+            return lines, []
+        if requested_by is None:
+            raise ValueError("requested_by is needed to save transfers")
+        return lines, RebalancingService.save(lines, requested_by=requested_by)
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from accounts.models import Branch
+from inventory.models import (
+    Product,
+    ProductStockSummary,
+    ProductVariant,
+    StockReservation,
+)
+from inventory.services.keys import LOCATION_KEY_FIELDS, key_chunks, key_filter
+from inventory.services.exceptions import InsufficientStockError
+
+
+DEFAULT_RESERVATION_MINUTES = 15
+
+
+class ReservationService:
+    """Stock reservations and available-to-promise (on hand minus live holds)"""
+
+    @staticmethod
+    def available_to_promise(
+        product: Product,
+        variant: Optional[ProductVariant],
+        branch: Branch,
+    ) -> Decimal:
+        """Quantity that can still be promised at a branch"""
+        key = (product.pk, variant.pk if variant else None, branch.pk)
+        return ReservationService.available_to_promise_many([key])[key]
+
+    @staticmethod
+    def available_to_promise_many(keys: Iterable[tuple]) -> Dict[tuple, Decimal]:
+        """
+        Available-to-promise for many (product_id, variant_id, branch_id) keys.
+        
+        On-hand comes from ProductStockSummary and live reservations are summed in
+        correlated subqueries, so each chunk of keys is a single query.
+        """
+        keys = set(keys)
+        now = timezone.now()
+        amount = DecimalField(max_digits=12, decimal_places=2)
+
+        def reserved(**variant_lookup) -> Subquery:
+            return Subquery(
+                StockReservation.objects.filter(
+                    product_id=OuterRef("product_id"),
+                    branch_id=OuterRef("branch_id"),
+                    expires_at__gt=now,
+                    **variant_lookup,
+                )
+                .order_by()
+                .values("product_id")
+                .annotate(total=Sum("quantity"))
+                .values("total")[:1],
+                output_field=amount,
+            )
+
+        available = {key: Decimal("0") for key in keys}
+        for chunk in key_chunks(keys):
+            rows = (
+                ProductStockSummary.objects.filter(key_filter(LOCATION_KEY_FIELDS, chunk))
+                .annotate(
+                    reserved=Coalesce(
+                        Case(
+                            When(variant__isnull=True, then=reserved(variant__isnull=True)),
+                            default=reserved(variant_id=OuterRef("variant_id")),
+                        ),
+                        Value(Decimal("0")),
+                        output_field=amount,
+                    )
+                )
+                .annotate(available=F("quantity") - F("reserved"))
+                .values_list("product_id", "variant_id", "branch_id", "available")
+            )
+            for product_id, variant_id, branch_id, quantity in rows:
+                available[(product_id, variant_id, branch_id)] = quantity
+        return available
+
+    @staticmethod
+    def reserved_by_variant(product_id: int, branch_id: int) -> Dict[Optional[int], Decimal]:
+        """Live holds of one product at a branch per variant id, in one query"""
+        return dict(
+            StockReservation.objects.filter(
+                product_id=product_id, branch_id=branch_id, expires_at__gt=timezone.now()
+            )
+            .order_by()
+            .values_list("variant_id")
+            .annotate(total=Sum("quantity"))
+        )
+
+    @staticmethod
+    @transaction.atomic
+    def reserve(
+        *,
+        product: Product,
+        variant: Optional[ProductVariant] = None,
+        branch: Branch,
+        quantity: Decimal,
+        reference: str,
+        minutes: int = DEFAULT_RESERVATION_MINUTES,
+    ) -> StockReservation:
+        """
+        Hold ``quantity`` at ``branch`` for ``minutes``.
+        
+        An existing hold with the same reference and location is replaced, so
+        calling again refreshes or resizes it. Reservers of one location are
+        serialized on its summary row, which keeps two carts from both taking
+        the last unit.
+        
+        Raises:
+            InsufficientStockError: If available-to-promise is below ``quantity``
+        """
+        if quantity <= 0:
+            raise ValueError("Quantity must be positive for reservations.")
+
+        location = dict(product=product, variant=variant, branch=branch)
+        list(ProductStockSummary.objects.select_for_update().filter(**location))
+        StockReservation.objects.filter(reference=reference, **location).delete()
+
+        available = ReservationService.available_to_promise(product, variant, branch)
+        if available < quantity:
+            raise InsufficientStockError(
+                f"Insufficient stock for {product.name} at {branch.name}. "
+                f"Available: {available}, Requested: {quantity}",
+                details=[{
+                    "product": product,
+                    "variant": variant,
+                    "branch": branch,
+                    "available": available,
+                    "requested": quantity,
+                }],
+            )
+        return StockReservation.objects.create(
+            quantity=quantity,
+            reference=reference,
+            expires_at=timezone.now() + timedelta(minutes=minutes),
+            **location,
+        )
+
+    @staticmethod
+    def release(reference: str) -> int:
+        """Drop every hold with this reference (e.g. when the order is placed)"""
+        return ReservationService.release_many([reference])
+
+    @staticmethod
+    def release_many(references: Iterable[str]) -> int:
+        """Drop every hold with any of ``references``, in one query"""
+        references = set(references)
+        if not references:
+            return 0
+        deleted, _ = StockReservation.objects.filter(reference__in=references).delete()
+        return deleted
+
+    @staticmethod
+    def expire(batch_size: int = 5000) -> int:
+        """
+        Delete lapsed reservations in set-based chunks of ``batch_size``.
+        Returns the number of reservations removed.
+        """
+        total = 0
+        while True:
+            lapsed = StockReservation.objects.filter(
+                expires_at__lte=timezone.now()
+            ).values_list("pk", flat=True)[:batch_size]
+            deleted, _ = StockReservation.objects.filter(pk__in=lapsed).delete()
+            total += deleted
+            if deleted < batch_size:
+                return total
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from inventory.models import Product, ProductVariant
+
+# (product_id, variant_id, selling_price, unit short name)
+ScanEntry = Tuple[int, Optional[int], Decimal, str]
+
+# Rows committed late can carry an ``updated_at`` slightly before the previous
+# refresh started; each refresh re-reads this much of the past
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+# Seconds a miss waits before it may trigger a refresh of its own
+MISS_REFRESH_INTERVAL = 1.0
+
+
+class _Index:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries: Dict[str, ScanEntry] = {}
+        # ("product", id) / ("variant", id) -> codes that resolve through it
+        self.owners: Dict[Tuple[str, int], Set[str]] = {}
+        self.loaded_at: Optional[float] = None
+        self.refreshed_at = 0.0
+        self.watermark: Optional[datetime] = None
+
+
+_index = _Index()
+
+
+class BarcodeIndex:
+    """
+    Per-process map from every product/variant barcode and SKU to what a POS
+    line needs: (product_id, variant_id, selling_price, unit).
+
+    The map is loaded on first use with one query per table. After that,
+    ``resolve`` refreshes it at most every ``BARCODE_INDEX_REFRESH_SECONDS``
+    from rows whose ``updated_at`` moved (a product change reloads its
+    variants too, since they carry its price), and reloads it completely every
+    ``BARCODE_INDEX_RELOAD_SECONDS`` to drop deleted rows. A code that isn't
+    found may trigger one early refresh, so a product created a moment ago
+    scans. Between refreshes a lookup is a dict access and never touches the
+    database.
+
+    Changes made with ``QuerySet.update`` don't bump ``updated_at``; call
+    ``reload`` after those.
+    """
+
+    @staticmethod
+    def resolve(codes: Iterable[str]) -> Dict[str, Optional[ScanEntry]]:
+        """Entry per scanned code (``None`` if nothing matches), in one call"""
+        codes = [code.strip() for code in codes]
+        BarcodeIndex._ensure_fresh()
+        entries = _index.entries
+        result = {code: entries.get(code) for code in codes}
+        if None in result.values() and (
+            time.monotonic() - _index.refreshed_at >= MISS_REFRESH_INTERVAL
+        ):
+            BarcodeIndex.refresh()
+            entries = _index.entries
+            result = {code: entries.get(code) for code in codes}
+        return result
+
+    @staticmethod
+    def _ensure_fresh() -> None:
+        if _index.loaded_at is None:
+            BarcodeIndex.reload()
+            return
+        now = time.monotonic()
+        if now - _index.loaded_at >= getattr(settings, "BARCODE_INDEX_RELOAD_SECONDS", 3600):
+            BarcodeIndex.reload(blocking=False)
+        elif now - _index.refreshed_at >= getattr(settings, "BARCODE_INDEX_REFRESH_SECONDS", 5):
+            BarcodeIndex.refresh(blocking=False)
+
+    @staticmethod
+    def reload(blocking: bool = True) -> int:
+        """
+        Rebuild the whole map; returns the number of codes. Without
+        ``blocking``, returns at once (with -1) if another thread is updating
+        the map, and callers keep using the current one.
+        """
+        if not _index.lock.acquire(blocking):
+            return -1
+        try:
+            started = timezone.now()
+            entries: Dict[str, ScanEntry] = {}
+            owners: Dict[Tuple[str, int], Set[str]] = {}
+            BarcodeIndex._load(entries, owners, Product.objects.all(), ProductVariant.objects.all())
+            _index.entries, _index.owners = entries, owners
+            _index.watermark = started - REFRESH_OVERLAP
+            _index.loaded_at = _index.refreshed_at = time.monotonic()
+            return len(entries)
+        finally:
+            _index.lock.release()
+
+    @staticmethod
+    def refresh(blocking: bool = True) -> int:
+        """
+        Apply products and variants changed since the last refresh; returns the
+        number of rows re-read (-1 if skipped, as for ``reload``).
+        """
+        if _index.loaded_at is None:
+            return BarcodeIndex.reload(blocking)
+        if not _index.lock.acquire(blocking):
+            return -1
+        try:
+            started = timezone.now()
+            products = Product.objects.filter(updated_at__gte=_index.watermark)
+            # Variants carry their product's price and unit
+            variants = ProductVariant.objects.filter(
+                Q(updated_at__gte=_index.watermark) | Q(product__updated_at__gte=_index.watermark)
+            )
+            # Copy on write, so readers never see a half-applied refresh
+            entries = dict(_index.entries)
+            owners = dict(_index.owners)
+            count = BarcodeIndex._load(entries, owners, products, variants)
+            _index.entries, _index.owners = entries, owners
+            _index.watermark = started - REFRESH_OVERLAP
+            _index.refreshed_at = time.monotonic()
+            return count
+        finally:
+            _index.lock.release()
+
+    @staticmethod
+    def _load(entries, owners, products, variants) -> int:
+        """
+        Put the codes of ``products`` and ``variants`` into ``entries``,
+        replacing any codes they had before. Inactive rows only lose theirs.
+        """
+        def replace(owner: Tuple[str, int], codes: List[str], entry: ScanEntry, active: bool):
+            for code in owners.pop(owner, ()):
+                # A code another row has taken over since stays with that row
+                if entries.get(code, entry)[:2] == entry[:2]:
+                    entries.pop(code, None)
+            codes = [code for code in codes if code]
+            if active and codes:
+                owners[owner] = set(codes)
+                for code in codes:
+                    entries[code] = entry
+
+        count = 0
+        product_rows = products.order_by().values_list(
+            "id", "sku", "barcode", "selling_price", "unit__short_name", "is_active"
+        )
+        for product_id, sku, barcode, price, unit, is_active in product_rows.iterator(chunk_size=5000):
+            replace(("product", product_id), [sku, barcode], (product_id, None, price, unit), is_active)
+            count += 1
+
+        variant_rows = variants.order_by().values_list(
+            "id",
+            "product_id",
+            "sku",
+            "barcode",
+            "is_active",
+            "product__selling_price",
+            "product__unit__short_name",
+            "product__is_active",
+        )
+        for row in variant_rows.iterator(chunk_size=5000):
+            variant_id, product_id, sku, barcode, is_active, price, unit, product_active = row
+            replace(
+                ("variant", variant_id),
+                [sku, barcode],
+                (product_id, variant_id, price, unit),
+                is_active and product_active,
+            )
+            count += 1
+        return count
+
+    @staticmethod
+    def stats() -> Dict[str, int]:
+        """Codes and rows held by this process"""
+        return {"codes": len(_index.entries), "rows": len(_index.owners)}
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import random
+import zlib
+from decimal import ROUND_DOWN, Decimal
+from typing import Dict, Iterable, Optional
+
+from django.db import transaction
+from django.db.models import DecimalField, Expression, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from accounts.models import Branch
+from inventory.models import (
+    BranchStock,
+    Product,
+    ProductVariant,
+    StockShard,
+)
+from inventory.services.bulk import update_rows
+from inventory.services.exceptions import InsufficientStockError
+
+
+class ShardedStockService:
+    """
+    Sharded stock counters for hot SKUs (``Product.stock_shards`` > 0).
+
+    At shop branches, a hot product's BranchStock row acts as a pool and most of
+    its stock is handed out to N StockShard rows. Each register (``shard_key``)
+    always decrements the same shard with a conditional UPDATE, so concurrent
+    sales of the same item don't queue on one row. A shard that runs dry is
+    refilled from the pool, and when the pool is empty too the sibling shards are
+    drained back into it, so stock never goes below zero. On-hand is the pool plus
+    all of its shards.
+    """
+
+    @staticmethod
+    def is_sharded(product: Product, branch: Optional[Branch]) -> bool:
+        return bool(product.stock_shards) and branch is not None and not branch.is_warehouse
+
+    @staticmethod
+    def shard_for(product: Product, shard_key: str = "") -> int:
+        """Pick the shard a register/session decrements (random without a key)"""
+        if not shard_key:
+            return random.randrange(product.stock_shards)
+        return zlib.crc32(shard_key.encode()) % product.stock_shards
+
+    @staticmethod
+    def decrement(
+        *,
+        product: Product,
+        variant: Optional[ProductVariant],
+        branch: Branch,
+        quantity: Decimal,
+        batch_number: str = "",
+        shard_key: str = "",
+    ) -> None:
+        """
+        Take ``quantity`` from the caller's shard, refilling it if needed.
+
+        Raises:
+            InsufficientStockError: If pool and shards together can't cover it
+        """
+        stock_id = BranchStock.objects.filter(
+            branch=branch,
+            product=product,
+            variant=variant,
+            batch_number=batch_number or "",
+        ).values_list("pk", flat=True).first()
+        if stock_id is None:
+            raise InsufficientStockError(
+                f"No stock found for {product.name} at {branch.name}",
+                details=[{"available": Decimal("0"), "requested": quantity}],
+            )
+
+        shard_no = ShardedStockService.shard_for(product, shard_key)
+        # Fast path: the shard has enough, no other row is touched
+        taken = StockShard.objects.filter(
+            stock_id=stock_id, shard=shard_no, quantity__gte=quantity
+        ).update(quantity=F("quantity") - quantity)
+        if not taken:
+            ShardedStockService._refill_and_take(
+                stock_id, shard_no, quantity, product=product, branch=branch
+            )
+
+    @staticmethod
+    def _refill_and_take(
+        stock_id: int,
+        shard_no: int,
+        quantity: Decimal,
+        *,
+        product: Product,
+        branch: Branch,
+    ) -> None:
+        """Slow path: move stock from the pool (or drained siblings) into the shard"""
+        pool = BranchStock.objects.select_for_update().get(pk=stock_id)
+        shard, _ = StockShard.objects.select_for_update().get_or_create(
+            stock_id=stock_id, shard=shard_no
+        )
+        if shard.quantity + pool.quantity < quantity:
+            # Pool is short as well: pull every sibling's stock back into the pool
+            siblings = list(
+                StockShard.objects.select_for_update()
+                .filter(stock_id=stock_id)
+                .exclude(pk=shard.pk)
+                .order_by("shard")
+            )
+            for sibling in siblings:
+                pool.quantity += sibling.quantity
+                sibling.quantity = Decimal("0")
+            StockShard.objects.bulk_update(siblings, ["quantity"])
+
+        available = shard.quantity + pool.quantity
+        if available < quantity:
+            raise InsufficientStockError(
+                f"Insufficient stock for {product.name} at {branch.name}. "
+                f"Available: {available}, Requested: {quantity}",
+                details=[{"available": available, "requested": quantity}],
+            )
+
+        # Refill with what this sale needs, or a fair share of the pool if larger
+        share = (pool.quantity / product.stock_shards).quantize(
+            Decimal("0.01"), rounding=ROUND_DOWN
+        )
+        refill = min(pool.quantity, max(quantity - shard.quantity, share))
+        pool.quantity -= refill
+        pool.last_updated = timezone.now()
+        shard.quantity += refill - quantity
+        pool.save(update_fields=["quantity", "last_updated"])
+        shard.save(update_fields=["quantity"])
+
+    @staticmethod
+    def shard_totals(stock_ids: Iterable[int]) -> Dict[int, Decimal]:
+        """Stock held in shards per BranchStock id"""
+        return dict(
+            StockShard.objects.filter(stock_id__in=list(stock_ids))
+            .order_by()
+            .values("stock_id")
+            .annotate(total=Sum("quantity"))
+            .values_list("stock_id", "total")
+        )
+
+    @staticmethod
+    def on_hand(stock_model) -> Expression:
+        """Expression for a stock row's on-hand quantity, including its shards"""
+        if stock_model is not BranchStock:
+            return F("quantity")
+        amount = DecimalField(max_digits=12, decimal_places=2)
+        in_shards = Subquery(
+            StockShard.objects.filter(stock_id=OuterRef("pk"))
+            .order_by()
+            .values("stock_id")
+            .annotate(total=Sum("quantity"))
+            .values("total")[:1],
+            output_field=amount,
+        )
+        return F("quantity") + Coalesce(in_shards, Value(Decimal("0")), output_field=amount)
+
+    @staticmethod
+    def fold_into_pool(stock_id: int) -> bool:
+        """
+        Move a BranchStock row's shards back into the row itself.
+        Returns False if the row had no stock in shards.
+        """
+        shards = list(
+            StockShard.objects.select_for_update().filter(stock_id=stock_id, quantity__gt=0)
+        )
+        if not shards:
+            return False
+        BranchStock.objects.filter(pk=stock_id).update(
+            quantity=F("quantity") + sum(shard.quantity for shard in shards),
+            last_updated=timezone.now(),
+        )
+        StockShard.objects.filter(pk__in=[shard.pk for shard in shards]).update(
+            quantity=Decimal("0")
+        )
+        return True
+
+    @staticmethod
+    def fold_rows(stocks: Iterable[BranchStock]) -> None:
+        """
+        Fold the shards of already-locked BranchStock rows back into them, in
+        the database and on the instances. Rows without stock in shards (the
+        usual case) cost one query in total.
+        """
+        stocks = {stock.pk: stock for stock in stocks}
+        if not stocks:
+            return
+        shards = list(
+            StockShard.objects.select_for_update()
+            .filter(stock_id__in=list(stocks), quantity__gt=0)
+            .order_by("stock_id", "shard")
+        )
+        if not shards:
+            return
+        now = timezone.now()
+        folded = {}
+        for shard in shards:
+            stock = stocks[shard.stock_id]
+            stock.quantity += shard.quantity
+            stock.last_updated = now
+            folded[stock.pk] = stock
+        update_rows(BranchStock, folded.values(), ["quantity", "last_updated"])
+        StockShard.objects.filter(pk__in=[shard.pk for shard in shards]).update(
+            quantity=Decimal("0")
+        )
+
+    @staticmethod
+    @transaction.atomic
+    def consolidate(product: Product) -> None:
+        """Fold all of a product's shards back, e.g. after sharding is switched off"""
+        stock_ids = StockShard.objects.filter(stock__product=product).values_list(
+            "stock_id", flat=True
+        ).distinct()
+        for stock_id in list(stock_ids):
+            ShardedStockService.fold_into_pool(stock_id)
+        StockShard.objects.filter(stock__product=product).delete()
@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+import threading
+from collections import defaultdict
 from decimal import Decimal
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, List
 from datetime import date
 
-from django.db import transaction
-from django.db.models import F, Q
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q, Sum, Window
 from django.utils import timezone
 
 from accounts.models import Branch, User
@@ -15,19 +17,46 @@ from inventory.models import (
     ProductVariant,
     StockMovement,
     WarehouseStock,
-    StockAlert,
 )
+from inventory.services.alerts import StockAlertService
+from inventory.services.archive import StockArchiveService
+from inventory.services.availability import StockAvailabilityCache
+from inventory.services.bulk import update_rows
+from inventory.services.concurrency import STOCK_LOCK_ORDER, retry_on_conflict
+from inventory.services.costing import CostLayerService
+from inventory.services.exceptions import InsufficientStockError
+from inventory.services.keys import STOCK_KEY_FIELDS, key_chunks, key_filter
+from inventory.services.reservations import ReservationService
+from inventory.services.sharding import ShardedStockService
+from inventory.services.summary import StockSummaryService
 
 
-class InsufficientStockError(Exception):
-    """Raised when there's not enough stock for an operation"""
-    pass
+OUT_MOVEMENT_TYPES = StockMovement.OUT_TYPES
+IN_MOVEMENT_TYPES = StockMovement.IN_TYPES
+
+# Their COGS prices the matching TRANSFER_IN, so hot-SKU lines of these types
+# consume cost layers inside the transaction instead of after commit
+IMMEDIATE_COST_TYPES = {StockMovement.MovementType.TRANSFER_OUT}
+
+# Re-allocations allowed when picked batches change before they're locked
+FEFO_ALLOCATION_ATTEMPTS = 3
+
+
+class _PendingAlerts(threading.local):
+    """Alert keys waiting for the current thread's transaction to commit"""
+
+    def __init__(self):
+        self.keys: set = set()
+
+
+_pending_alerts = _PendingAlerts()
 
 
 class StockService:
     """Centralized service for all stock operations"""
     
     @staticmethod
+    @retry_on_conflict
     @transaction.atomic
     def apply_stock_movement(
         *,
@@ -43,6 +72,9 @@ class StockService:
         cost_price: Optional[Decimal] = None,
         notes: str = "",
         created_by: Optional[User] = None,
+        shard_key: str = "",
+        idempotency_key: Optional[str] = None,
+        reservation: str = "",
     ) -> StockMovement:
         """
         Central service for all stock changes.
@@ -63,9 +95,15 @@ class StockService:
             cost_price: Cost per unit (for FIFO tracking)
             notes: Additional notes
             created_by: User who created this movement
+            shard_key: Register/session id; picks the stock shard for hot SKUs
+            idempotency_key: Client key for retries; if a movement with this key
+                exists it is returned and nothing is applied again
+            reservation: Reference of the StockReservation this movement fulfils
+                (e.g. ``CartItem.reservation_reference()``); the hold is released
+                in the same transaction
             
         Returns:
-            Created StockMovement instance
+            Created StockMovement instance (or the original one on a replay)
             
         Raises:
             InsufficientStockError: If there's not enough stock for OUT movements
@@ -73,9 +111,13 @@ class StockService:
         """
         if quantity <= 0:
             raise ValueError("Quantity must be positive for stock movements.")
+        if idempotency_key:
+            replay = StockService.find_replays([idempotency_key]).get(idempotency_key)
+            if replay is not None:
+                return replay
         
         # Create the stock movement record
-        movement = StockMovement.objects.create(
+        movement = StockMovement(
             product=product,
             variant=variant,
             quantity=quantity,
@@ -88,24 +130,40 @@ class StockService:
             cost_price=cost_price,
             notes=notes,
             created_by=created_by,
+            idempotency_key=idempotency_key or None,
         )
+        if not idempotency_key:
+            movement.save()
+        else:
+            try:
+                with transaction.atomic():
+                    movement.save()
+            except IntegrityError:
+                # A concurrent request with the same key committed first
+                replay = StockService.find_replays([idempotency_key]).get(idempotency_key)
+                if replay is None:
+                    raise
+                return replay
         
         # Determine which branches to update based on movement type
-        out_types = {
-            StockMovement.MovementType.POS_SALE_OUT,
-            StockMovement.MovementType.ONLINE_ORDER_OUT,
-            StockMovement.MovementType.TRANSFER_OUT,
-            StockMovement.MovementType.DAMAGE_OUT,
-            StockMovement.MovementType.ADJUSTMENT_OUT,
-        }
-        in_types = {
-            StockMovement.MovementType.PURCHASE_IN,
-            StockMovement.MovementType.RETURN_IN,
-            StockMovement.MovementType.TRANSFER_IN,
-            StockMovement.MovementType.ADJUSTMENT_IN,
-        }
-
-        if movement_type in out_types:
+        sharded = False
+        if movement_type in OUT_MOVEMENT_TYPES and ShardedStockService.is_sharded(
+            product, source_branch
+        ):
+            branch = source_branch
+            delta = -quantity
+            sharded = True
+            ShardedStockService.decrement(
+                product=product,
+                variant=variant,
+                branch=source_branch,
+                quantity=quantity,
+                batch_number=batch_number,
+                shard_key=shard_key,
+            )
+        elif movement_type in OUT_MOVEMENT_TYPES:
+            branch = source_branch
+            delta = -quantity
             StockService._apply_out_movement(
                 product=product,
                 variant=variant,
@@ -113,7 +171,9 @@ class StockService:
                 quantity=quantity,
                 batch_number=batch_number,
             )
-        elif movement_type in in_types:
+        elif movement_type in IN_MOVEMENT_TYPES:
+            branch = dest_branch
+            delta = quantity
             StockService._apply_in_movement(
                 product=product,
                 variant=variant,
@@ -125,11 +185,472 @@ class StockService:
         else:
             raise ValueError(f"Unknown movement type: {movement_type}")
 
-        # Check for low stock alerts after movement
-        StockService.check_and_create_alerts(product, variant, dest_branch or source_branch)
+        if reservation:
+            ReservationService.release(reservation)
+
+        location = (product.pk, variant.pk if variant else None, branch.pk if branch else None)
+        if branch is not None:
+            StockAvailabilityCache.invalidate([location])
+
+        if sharded:
+            # Summary and cost layer rows are shared by every register; update them
+            # after commit so hot-SKU sales don't hold their locks for the whole sale
+            if movement_type in IMMEDIATE_COST_TYPES:
+                CostLayerService.apply_movements([movement])
+                StockService._defer_projections([], {location: delta})
+            else:
+                StockService._defer_projections([movement], {location: delta})
+            return movement
+
+        CostLayerService.apply_movements([movement])
+
+        if branch is not None:
+            StockSummaryService.apply_deltas({location: delta})
+            # Alerts are evaluated once the transaction commits
+            StockService.queue_alert_check([location])
 
         return movement
 
+    @staticmethod
+    @retry_on_conflict
+    @transaction.atomic
+    def apply_stock_movements(
+        *,
+        lines: Iterable[Dict[str, Any]],
+        reference: str = "",
+        created_by: Optional[User] = None,
+    ) -> List[StockMovement]:
+        """
+        Apply many stock movements at once (POS baskets, purchase receipts, etc.).
+        
+        Each line is a dict taking the same keys as ``apply_stock_movement``
+        (product, variant, quantity, movement_type, source_branch, dest_branch,
+        batch_number, expiry_date, cost_price, notes, reference, shard_key,
+        idempotency_key, reservation). ``reference`` and ``created_by`` are used
+        for lines that don't set their own. The holds named by ``reservation``
+        are released together with the movements.
+        
+        The idempotency keys of all lines are checked up front with
+        ``find_replays`` (archived movements included); lines whose key already
+        exists are skipped and return their original movement. A concurrent batch committing the same key first makes this
+        one fail with IntegrityError, and retrying it then replays.
+        
+        All affected stock rows are locked with one query per stock table, the
+        movements are bulk inserted and the new quantities are written back in bulk,
+        so the query count doesn't grow with the number of lines. Lines are applied
+        in order, so an IN followed by an OUT of the same batch is allowed.
+        
+        Returns:
+            StockMovement instances in line order (originals for replayed lines)
+            
+        Raises:
+            InsufficientStockError: If any OUT line can't be covered. Nothing is
+                applied and ``details`` lists every failing line.
+            ValueError: If a line has an invalid quantity or movement type, or
+                two lines share an idempotency key
+        """
+        lines = list(lines)
+        replays = StockService.find_replays(
+            line["idempotency_key"] for line in lines if line.get("idempotency_key")
+        )
+        # Line indexes answered from ``replays``; they're not applied again
+        replayed: set = set()
+        batch_keys: set = set()
+        movements: List[StockMovement] = []
+        # (stock model, (branch_id, product_id, variant_id, batch_number)) per line
+        line_keys: List[Optional[tuple]] = []
+        keys_by_model: Dict[Any, set] = {WarehouseStock: set(), BranchStock: set()}
+        branches: Dict[int, Branch] = {}
+        # Hot-SKU OUT lines go through their stock shards instead of the row lock
+        sharded_lines: List[int] = []
+        # Shop rows sold from without sharding; shards left over from when the
+        # product was sharded are folded back into them
+        unsharded_keys: set = set()
+
+        for index, line in enumerate(lines):
+            idempotency_key = line.get("idempotency_key") or None
+            if idempotency_key in replays:
+                movements.append(replays[idempotency_key])
+                line_keys.append(None)
+                replayed.add(index)
+                continue
+            if idempotency_key is not None:
+                if idempotency_key in batch_keys:
+                    raise ValueError(
+                        f"Line {index}: Duplicate idempotency key {idempotency_key!r}"
+                    )
+                batch_keys.add(idempotency_key)
+            quantity = line["quantity"]
+            movement_type = line["movement_type"]
+            if quantity <= 0:
+                raise ValueError(
+                    f"Line {index}: Quantity must be positive for stock movements."
+                )
+            if movement_type in OUT_MOVEMENT_TYPES:
+                branch = line.get("source_branch")
+            elif movement_type in IN_MOVEMENT_TYPES:
+                branch = line.get("dest_branch")
+            else:
+                raise ValueError(f"Line {index}: Unknown movement type: {movement_type}")
+
+            variant = line.get("variant")
+            batch_number = line.get("batch_number") or ""
+            movements.append(StockMovement(
+                product=line["product"],
+                variant=variant,
+                quantity=quantity,
+                movement_type=movement_type,
+                source_branch=line.get("source_branch"),
+                dest_branch=line.get("dest_branch"),
+                reference=line.get("reference", reference),
+                batch_number=batch_number,
+                expiry_date=line.get("expiry_date"),
+                cost_price=line.get("cost_price"),
+                notes=line.get("notes", ""),
+                created_by=line.get("created_by", created_by),
+                idempotency_key=idempotency_key,
+            ))
+
+            if branch is None:
+                line_keys.append(None)
+                continue
+            branches[branch.pk] = branch
+            if movement_type in OUT_MOVEMENT_TYPES and ShardedStockService.is_sharded(
+                line["product"], branch
+            ):
+                sharded_lines.append(index)
+                line_keys.append(None)
+                continue
+            stock_model = StockService._get_stock_model_for_branch(branch)
+            key = (
+                branch.pk,
+                line["product"].pk,
+                variant.pk if variant else None,
+                batch_number,
+            )
+            keys_by_model[stock_model].add(key)
+            line_keys.append((stock_model, key))
+            if stock_model is BranchStock and movement_type in OUT_MOVEMENT_TYPES:
+                unsharded_keys.add((stock_model, key))
+
+        # Lock every affected row up front, in canonical order
+        rows = StockService._lock_stock_rows(keys_by_model)
+        if unsharded_keys:
+            ShardedStockService.fold_rows(
+                [rows[row_key] for row_key in unsharded_keys if row_key in rows]
+            )
+
+        # Replay the lines against the locked balances before writing anything
+        balances = {row_key: stock.quantity for row_key, stock in rows.items()}
+        new_expiry: Dict[tuple, Optional[date]] = {}
+        failures: List[Dict[str, Any]] = []
+        for index, (line, row_key) in enumerate(zip(lines, line_keys)):
+            if row_key is None:
+                continue
+            quantity = line["quantity"]
+            if line["movement_type"] in IN_MOVEMENT_TYPES:
+                balances[row_key] = balances.get(row_key, Decimal("0")) + quantity
+                if line.get("expiry_date") and not new_expiry.get(row_key):
+                    new_expiry[row_key] = line["expiry_date"]
+                continue
+
+            available = balances.get(row_key)
+            if available is None or available < quantity:
+                failures.append({
+                    "line": index,
+                    "product": line["product"],
+                    "variant": line.get("variant"),
+                    "branch": branches[row_key[1][0]],
+                    "batch_number": row_key[1][3],
+                    "available": available or Decimal("0"),
+                    "requested": quantity,
+                })
+                continue
+            balances[row_key] = available - quantity
+
+        if failures:
+            raise StockService._insufficient(failures)
+
+        StockMovement.objects.bulk_create(
+            [movement for index, movement in enumerate(movements) if index not in replayed]
+        )
+        ReservationService.release_many(
+            line["reservation"]
+            for index, line in enumerate(lines)
+            if line.get("reservation") and index not in replayed
+        )
+
+        sharded_deltas: Dict[tuple, Decimal] = defaultdict(Decimal)
+        for index in sharded_lines:
+            line = lines[index]
+            variant = line.get("variant")
+            try:
+                ShardedStockService.decrement(
+                    product=line["product"],
+                    variant=variant,
+                    branch=line["source_branch"],
+                    quantity=line["quantity"],
+                    batch_number=line.get("batch_number") or "",
+                    shard_key=line.get("shard_key", ""),
+                )
+            except InsufficientStockError as exc:
+                # Pool plus shards, as counted when the line came up short
+                failures.append({
+                    "line": index,
+                    "product": line["product"],
+                    "variant": variant,
+                    "branch": line["source_branch"],
+                    "batch_number": line.get("batch_number") or "",
+                    "available": exc.details[0]["available"],
+                    "requested": line["quantity"],
+                })
+                continue
+            sharded_deltas[(
+                line["product"].pk,
+                variant.pk if variant else None,
+                line["source_branch"].pk,
+            )] -= line["quantity"]
+        if failures:
+            # Rolls back the movements and shard updates above
+            raise StockService._insufficient(failures)
+        deferred = [
+            index for index in sharded_lines
+            if lines[index]["movement_type"] not in IMMEDIATE_COST_TYPES
+        ]
+        if sharded_lines:
+            StockService._defer_projections(
+                [movements[index] for index in deferred], sharded_deltas
+            )
+        skipped = replayed.union(deferred)
+        CostLayerService.apply_movements(
+            [movement for index, movement in enumerate(movements) if index not in skipped]
+        )
+
+        now = timezone.now()
+        to_update: Dict[Any, list] = {WarehouseStock: [], BranchStock: []}
+        to_create: Dict[Any, list] = {WarehouseStock: [], BranchStock: []}
+        summary_deltas: Dict[tuple, Decimal] = defaultdict(Decimal)
+        for row_key, quantity in balances.items():
+            stock_model, (branch_id, product_id, variant_id, batch_number) = row_key
+            stock = rows.get(row_key)
+            summary_deltas[(product_id, variant_id, branch_id)] += (
+                quantity - (stock.quantity if stock else Decimal("0"))
+            )
+            if stock is None:
+                to_create[stock_model].append(stock_model(
+                    branch_id=branch_id,
+                    product_id=product_id,
+                    variant_id=variant_id,
+                    batch_number=batch_number,
+                    quantity=quantity,
+                    expiry_date=new_expiry.get(row_key),
+                ))
+                continue
+            if stock.quantity == quantity and not (
+                new_expiry.get(row_key) and not stock.expiry_date
+            ):
+                continue
+            stock.quantity = quantity
+            if new_expiry.get(row_key) and not stock.expiry_date:
+                stock.expiry_date = new_expiry[row_key]
+            stock.last_updated = now
+            to_update[stock_model].append(stock)
+
+        for stock_model in (WarehouseStock, BranchStock):
+            if to_create[stock_model]:
+                StockService._create_stock_rows(stock_model, to_create[stock_model])
+            if to_update[stock_model]:
+                update_rows(
+                    stock_model,
+                    to_update[stock_model],
+                    ["quantity", "expiry_date", "last_updated"],
+                )
+        StockSummaryService.apply_deltas(summary_deltas)
+
+        # Alerts are evaluated once for the whole batch, after commit
+        locations = {(key[1], key[2], key[0]) for _, key in filter(None, line_keys)}
+        StockService.queue_alert_check(locations)
+        StockAvailabilityCache.invalidate(locations | sharded_deltas.keys())
+
+        return movements
+
+    @staticmethod
+    def _create_stock_rows(stock_model, stocks: List[Any]) -> None:
+        """
+        Insert the new stock rows of a batch in one statement.
+        
+        A concurrent transaction may create one of them after our lock query
+        found nothing. The insert then fails inside its savepoint and the rows
+        are written one by one instead: each is created, or its quantity (the
+        net delta of the batch, as it started from zero) is added to the row
+        that now exists, as ``_apply_in_movement`` does.
+        """
+        try:
+            with transaction.atomic():
+                stock_model.objects.bulk_create(stocks)
+            return
+        except IntegrityError:
+            pass
+        for stock in stocks:
+            row = dict(
+                branch=Branch(pk=stock.branch_id),
+                product=Product(pk=stock.product_id),
+                variant=ProductVariant(pk=stock.variant_id) if stock.variant_id else None,
+                batch_number=stock.batch_number,
+            )
+            try:
+                with transaction.atomic():
+                    stock.save(force_insert=True)
+            except IntegrityError:
+                StockService._adjust_stock_row(
+                    stock_model, delta=stock.quantity, expiry_date=stock.expiry_date, **row
+                )
+
+    @staticmethod
+    def _insufficient(failures: List[Dict[str, Any]]) -> InsufficientStockError:
+        """Error for the failing lines of a batch, with one detail dict per line"""
+        return InsufficientStockError(
+            "Insufficient stock for "
+            + "; ".join(
+                f"line {failure['line']} ({failure['product'].name} at "
+                f"{failure['branch'].name}: available {failure['available']}, "
+                f"requested {failure['requested']})"
+                for failure in failures
+            ),
+            details=failures,
+        )
+
+    @staticmethod
+    def find_replays(keys: Iterable[str]) -> Dict[str, StockMovement]:
+        """
+        Movements already recorded under any of ``keys``, by idempotency key.
+        One query, plus one on the archive for keys the hot table doesn't have.
+        """
+        keys = set(keys)
+        if not keys:
+            return {}
+        replays = StockMovement.objects.in_bulk(keys, field_name="idempotency_key")
+        if len(replays) < len(keys):
+            replays.update(StockArchiveService.archived_replays(keys - replays.keys()))
+        return replays
+
+    @staticmethod
+    @retry_on_conflict
+    @transaction.atomic
+    def apply_fefo_movement(
+        *,
+        product: Product,
+        variant: Optional[ProductVariant] = None,
+        quantity: Decimal,
+        movement_type: str,
+        source_branch: Branch,
+        reference: str = "",
+        notes: str = "",
+        created_by: Optional[User] = None,
+        reservation: str = "",
+    ) -> List[StockMovement]:
+        """
+        OUT movement that picks batches itself, first-expiry-first-out.
+        
+        Batches are consumed in ``expiry_date`` order (batches without an expiry
+        last); expired batches are never picked. One window query finds just the
+        batches needed to cover ``quantity``, which are then locked and moved
+        through ``apply_stock_movements``, so the query count doesn't depend on
+        how many batches the branch holds. If a picked batch is drained by a
+        concurrent sale before it's locked, the allocation is retried.
+        ``reservation`` is released with the movements, as for
+        ``apply_stock_movement``.
+        
+        Returns:
+            One StockMovement per batch consumed, in FEFO order
+            
+        Raises:
+            InsufficientStockError: If unexpired stock can't cover the quantity
+            ValueError: If quantity or movement type is invalid
+        """
+        if quantity <= 0:
+            raise ValueError("Quantity must be positive for stock movements.")
+        if movement_type not in OUT_MOVEMENT_TYPES:
+            raise ValueError(f"FEFO allocation needs an OUT movement type: {movement_type}")
+
+        stock_model = StockService._get_stock_model_for_branch(source_branch)
+        fefo_order = [F("expiry_date").asc(nulls_last=True), F("id").asc()]
+
+        for attempt in range(FEFO_ALLOCATION_ATTEMPTS):
+            # Keep batches until the running total before them already covers quantity
+            batches = list(
+                stock_model.objects.filter(
+                    Q(expiry_date__isnull=True) | Q(expiry_date__gte=timezone.now().date()),
+                    branch=source_branch,
+                    product=product,
+                    variant=variant,
+                    quantity__gt=0,
+                )
+                .annotate(on_hand=ShardedStockService.on_hand(stock_model))
+                .annotate(running=Window(Sum("on_hand"), order_by=fefo_order))
+                .filter(running__lt=F("on_hand") + quantity)
+                .order_by(*fefo_order)
+                .values_list("batch_number", "expiry_date", "on_hand", "running")
+            )
+            available = batches[-1][3] if batches else Decimal("0")
+            if available < quantity:
+                raise InsufficientStockError(
+                    f"Insufficient stock for {product.name} at {source_branch.name}. "
+                    f"Available: {available}, Requested: {quantity}"
+                )
+
+            lines = []
+            remaining = quantity
+            for batch_number, expiry_date, batch_quantity, _ in batches:
+                taken = min(remaining, batch_quantity)
+                remaining -= taken
+                lines.append({
+                    "product": product,
+                    "variant": variant,
+                    "quantity": taken,
+                    "movement_type": movement_type,
+                    "source_branch": source_branch,
+                    "batch_number": batch_number,
+                    "expiry_date": expiry_date,
+                    "notes": notes,
+                    "reservation": reservation,
+                })
+            try:
+                return StockService.apply_stock_movements(
+                    lines=lines, reference=reference, created_by=created_by
+                )
+            except InsufficientStockError:
+                if attempt == FEFO_ALLOCATION_ATTEMPTS - 1:
+                    raise
+
+    @staticmethod
+    def _lock_stock_rows(keys_by_model: Dict[Any, set]) -> Dict[tuple, Any]:
+        """
+        Lock stock rows with one ``SELECT ... FOR UPDATE`` per stock table (per
+        ``KEY_CHUNK_SIZE`` keys).
+        
+        Tables are always locked warehouse first and rows in ``STOCK_LOCK_ORDER``,
+        so two transactions touching overlapping rows queue instead of deadlocking.
+        
+        Returns:
+            Locked rows keyed by (stock model, (branch_id, product_id, variant_id, batch_number))
+        """
+        rows: Dict[tuple, Any] = {}
+        for stock_model in (WarehouseStock, BranchStock):
+            keys = keys_by_model.get(stock_model)
+            if not keys:
+                continue
+            for chunk in key_chunks(keys):
+                locked = (
+                    stock_model.objects.select_for_update()
+                    .filter(key_filter(STOCK_KEY_FIELDS, chunk))
+                    .order_by(*STOCK_LOCK_ORDER)
+                )
+                for stock in locked:
+                    key = (stock.branch_id, stock.product_id, stock.variant_id, stock.batch_number)
+                    rows[(stock_model, key)] = stock
+        return rows
+
     @staticmethod
     def _get_stock_model_for_branch(branch: Branch):
         """Return appropriate stock model based on branch type"""
@@ -137,6 +658,85 @@ class StockService:
             return WarehouseStock
         return BranchStock
 
+    @staticmethod
+    def _adjust_stock_row(
+        stock_model,
+        *,
+        branch: Branch,
+        product: Product,
+        variant: Optional[ProductVariant],
+        batch_number: str,
+        delta: Decimal,
+        expiry_date: Optional[date] = None,
+    ) -> Optional[Decimal]:
+        """
+        Add ``delta`` to a single stock row with one conditional UPDATE and return
+        the new quantity.
+        
+        A negative delta only applies while the row still holds enough stock
+        (``quantity >= -delta``), so the availability check, the row lock and the
+        write are a single statement. ``expiry_date`` only fills an empty expiry.
+        Uses ``UPDATE ... RETURNING`` where the backend supports it (PostgreSQL,
+        SQLite 3.35+) and otherwise reads the updated row back.
+        
+        Returns:
+            New quantity, or None if no row matched (missing, or short for an OUT)
+        """
+        meta = stock_model._meta
+        ops = connection.ops
+
+        def column(name: str) -> str:
+            return ops.quote_name(meta.get_field(name).column)
+
+        where = [
+            f"{column('branch')} = %s",
+            f"{column('product')} = %s",
+            f"{column('batch_number')} = %s",
+        ]
+        where_params: List[Any] = [branch.pk, product.pk, batch_number or ""]
+        if variant is None:
+            where.append(f"{column('variant')} IS NULL")
+        else:
+            where.append(f"{column('variant')} = %s")
+            where_params.append(variant.pk)
+        if delta < 0:
+            where.append(f"{column('quantity')} >= %s")
+            where_params.append(ops.adapt_decimalfield_value(-delta, 12, 2))
+
+        sql = (
+            f"UPDATE {ops.quote_name(meta.db_table)} SET "
+            f"{column('quantity')} = {column('quantity')} + %s, "
+            f"{column('expiry_date')} = COALESCE({column('expiry_date')}, %s), "
+            f"{column('last_updated')} = %s "
+            f"WHERE {' AND '.join(where)}"
+        )
+        params = [
+            ops.adapt_decimalfield_value(delta, 12, 2),
+            ops.adapt_datefield_value(expiry_date),
+            ops.adapt_datetimefield_value(timezone.now()),
+            *where_params,
+        ]
+
+        with connection.cursor() as cursor:
+            if connection.features.can_return_columns_from_insert:
+                cursor.execute(f"{sql} RETURNING {column('quantity')}", params)
+                row = cursor.fetchone()
+                if row is None:
+                    return None
+                return Decimal(str(row[0])).quantize(Decimal("0.01"))
+
+            cursor.execute(sql, params)
+            if cursor.rowcount == 0:
+                return None
+
+        # No RETURNING support: the row is already locked by the UPDATE above
+        return stock_model.objects.filter(
+            branch=branch,
+            product=product,
+            variant=variant,
+            batch_number=batch_number or "",
+        ).values_list("quantity", flat=True).first()
+
     @staticmethod
     def _apply_in_movement(
         *,
@@ -146,24 +746,35 @@ class StockService:
         quantity: Decimal,
         batch_number: str = "",
         expiry_date: Optional[date] = None
-    ) -> None:
-        """Handle stock increase (IN movements)"""
+    ) -> Optional[Decimal]:
+        """Handle stock increase (IN movements). Returns the new quantity."""
         if branch is None:
-            return
+            return None
 
         stock_model = StockService._get_stock_model_for_branch(branch)
-        stock, _ = stock_model.objects.select_for_update().get_or_create(
+        row = dict(
             branch=branch,
             product=product,
             variant=variant,
             batch_number=batch_number or "",
-            defaults={"quantity": Decimal("0"), "expiry_date": expiry_date},
         )
-        stock.quantity = F('quantity') + quantity
-        if expiry_date and not stock.expiry_date:
-            stock.expiry_date = expiry_date
-        stock.save()
-        stock.refresh_from_db()
+        new_quantity = StockService._adjust_stock_row(
+            stock_model, delta=quantity, expiry_date=expiry_date, **row
+        )
+        if new_quantity is not None:
+            return new_quantity
+
+        try:
+            with transaction.atomic():
+                stock_model.objects.create(
+                    quantity=quantity, expiry_date=expiry_date, **row
+                )
+            return quantity
+        except IntegrityError:
+            # Created concurrently since our UPDATE; apply on top of it
+            return StockService._adjust_stock_row(
+                stock_model, delta=quantity, expiry_date=expiry_date, **row
+            )
 
     @staticmethod
     def _apply_out_movement(
@@ -173,34 +784,49 @@ class StockService:
         branch: Optional[Branch],
         quantity: Decimal,
         batch_number: str = ""
-    ) -> None:
-        """Handle stock decrease (OUT movements)"""
+    ) -> Optional[Decimal]:
+        """Handle stock decrease (OUT movements). Returns the new quantity."""
         if branch is None:
-            return
+            return None
 
         stock_model = StockService._get_stock_model_for_branch(branch)
-        
-        try:
-            stock = stock_model.objects.select_for_update().get(
-                branch=branch,
-                product=product,
-                variant=variant,
-                batch_number=batch_number or "",
+        row = dict(
+            branch=branch,
+            product=product,
+            variant=variant,
+            batch_number=batch_number or "",
+        )
+        new_quantity = StockService._adjust_stock_row(
+            stock_model, delta=-quantity, **row
+        )
+        if new_quantity is not None:
+            return new_quantity
+
+        # Stock may still sit in shards if hot-SKU sharding was switched off
+        stock_id = stock_model.objects.filter(**row).values_list("pk", flat=True).first()
+        if (
+            stock_model is BranchStock
+            and stock_id is not None
+            and ShardedStockService.fold_into_pool(stock_id)
+        ):
+            new_quantity = StockService._adjust_stock_row(
+                stock_model, delta=-quantity, **row
             )
-        except stock_model.DoesNotExist:
+            if new_quantity is not None:
+                return new_quantity
+
+        # Only reached on failure: find out why for the error message
+        available = stock_model.objects.filter(**row).values_list(
+            "quantity", flat=True
+        ).first()
+        if available is None:
             raise InsufficientStockError(
                 f"No stock found for {product.name} at {branch.name}"
             )
-        
-        if stock.quantity < quantity:
-            raise InsufficientStockError(
-                f"Insufficient stock for {product.name} at {branch.name}. "
-                f"Available: {stock.quantity}, Requested: {quantity}"
-            )
-        
-        stock.quantity = F('quantity') - quantity
-        stock.save()
-        stock.refresh_from_db()
+        raise InsufficientStockError(
+            f"Insufficient stock for {product.name} at {branch.name}. "
+            f"Available: {available}, Requested: {quantity}"
+        )
 
     @staticmethod
     def get_available_stock(
@@ -209,19 +835,13 @@ class StockService:
         branch: Branch,
         batch_number: str = ""
     ) -> Decimal:
-        """Get available stock quantity for a product at a branch"""
-        stock_model = StockService._get_stock_model_for_branch(branch)
+        """
+        Get available stock quantity for a product at a branch.
         
-        try:
-            stock = stock_model.objects.get(
-                branch=branch,
-                product=product,
-                variant=variant,
-                batch_number=batch_number or "",
-            )
-            return stock.quantity
-        except stock_model.DoesNotExist:
-            return Decimal("0")
+        Served through ``StockAvailabilityCache``; use its ``get_many`` for
+        several rows at once.
+        """
+        return StockAvailabilityCache.get(product, variant, branch, batch_number)
 
     @staticmethod
     def check_and_create_alerts(
@@ -230,43 +850,74 @@ class StockService:
         branch: Branch
     ) -> None:
         """Check stock levels and create alerts if needed"""
-        stock_model = StockService._get_stock_model_for_branch(branch)
-        
-        stocks = stock_model.objects.filter(
-            branch=branch,
-            product=product,
-            variant=variant
+        StockService.check_alerts_for_keys(
+            [(product.pk, variant.pk if variant else None, branch.pk)]
         )
+
+    @staticmethod
+    def _defer_projections(movements: List[StockMovement], deltas: Dict[tuple, Decimal]) -> None:
+        """
+        Apply cost layers and summary deltas for hot-SKU movements after commit.
+        Movements in ``IMMEDIATE_COST_TYPES`` are costed by the caller and not
+        passed here.
         
-        for stock in stocks:
-            # Check for low stock
-            if stock.is_low_stock():
-                StockAlert.objects.get_or_create(
-                    product=product,
-                    variant=variant,
-                    branch=branch,
-                    alert_type=StockAlert.AlertType.LOW_STOCK,
-                    is_resolved=False,
-                    defaults={
-                        'current_quantity': stock.quantity
-                    }
-                )
-            
-            # Check for expiring soon
-            if stock.is_expiring_soon():
-                StockAlert.objects.get_or_create(
-                    product=product,
-                    variant=variant,
-                    branch=branch,
-                    alert_type=StockAlert.AlertType.EXPIRING_SOON,
-                    is_resolved=False,
-                    defaults={
-                        'current_quantity': stock.quantity,
-                        'expiry_date': stock.expiry_date
-                    }
-                )
+        The callback belongs to the current savepoint, so a rollback discards it
+        together with the movements. If it fails, ``rebuild_stock_summary``
+        repairs the summary.
+        """
+        def apply() -> None:
+            with transaction.atomic():
+                if movements:
+                    CostLayerService.apply_movements(movements)
+                StockSummaryService.apply_deltas(deltas)
+                StockService.queue_alert_check(deltas.keys())
+
+        transaction.on_commit(apply, robust=True)
 
     @staticmethod
+    def queue_alert_check(keys: Iterable[tuple]) -> None:
+        """
+        Queue (product_id, variant_id, branch_id) keys for alert evaluation after
+        the current transaction commits.
+        
+        Keys touched anywhere in the transaction are coalesced and evaluated in one
+        ``check_alerts_for_keys`` pass, so alert queries don't run while stock rows
+        are locked and a 50-line sale is evaluated once. Keys left behind by a
+        rollback are simply re-evaluated with the next flush.
+        """
+        keys = set(keys)
+        if not keys:
+            return
+        _pending_alerts.keys.update(keys)
+        # Callbacks of a rolled back savepoint are dropped, so register every time;
+        # the first callback to run drains the queue and later ones are no-ops.
+        transaction.on_commit(StockService._flush_alert_checks, robust=True)
+
+    @staticmethod
+    def _flush_alert_checks() -> None:
+        """Evaluate every queued alert key (``on_commit`` callback)"""
+        keys = _pending_alerts.keys
+        if not keys:
+            return
+        _pending_alerts.keys = set()
+        with transaction.atomic():
+            StockService.check_alerts_for_keys(keys)
+
+    @staticmethod
+    def check_alerts_for_keys(keys: Iterable[tuple]) -> None:
+        """
+        Set-based version of ``check_and_create_alerts``.
+        
+        ``keys`` are (product_id, variant_id, branch_id) tuples. Alerts for those
+        locations are synced by ``StockAlertService``: missing ones are inserted
+        in bulk and ones whose condition has cleared are resolved.
+        """
+        keys = set(keys)
+        if keys:
+            StockAlertService.sync(keys)
+
+    @staticmethod
+    @retry_on_conflict
     @transaction.atomic
     def transfer_stock(
         *,
@@ -280,7 +931,17 @@ class StockService:
     ) -> tuple[StockMovement, StockMovement]:
         """
         Transfer stock between branches (creates two movements: OUT and IN)
+        
+        Both stock rows are locked together before either is changed, so
+        opposite transfers between the same two branches can't deadlock.
         """
+        keys_by_model: Dict[Any, set] = defaultdict(set)
+        for branch in (source_branch, dest_branch):
+            keys_by_model[StockService._get_stock_model_for_branch(branch)].add(
+                (branch.pk, product.pk, variant.pk if variant else None, "")
+            )
+        StockService._lock_stock_rows(keys_by_model)
+
         # First, remove from source
         out_movement = StockService.apply_stock_movement(
             product=product,
@@ -292,7 +953,7 @@ class StockService:
             created_by=created_by
         )
         
-        # Then, add to destination
+        # Then, add to destination, carrying over the FIFO cost of what left
         in_movement = StockService.apply_stock_movement(
             product=product,
             variant=variant,
@@ -300,13 +961,15 @@ class StockService:
             movement_type=StockMovement.MovementType.TRANSFER_IN,
             dest_branch=dest_branch,
             reference=reference,
+            cost_price=(out_movement.cogs_amount / quantity).quantize(Decimal("0.01")),
             created_by=created_by
         )
         
         return out_movement, in_movement
 
 
-# Export main function for backwards compatibility
+# Export main functions for backwards compatibility
 apply_stock_movement = StockService.apply_stock_movement
+apply_stock_movements = StockService.apply_stock_movements
 
 
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, List
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from inventory.models import (
+    BranchStock,
+    ProductStockSummary,
+    StockShard,
+    WarehouseStock,
+)
+from inventory.services.bulk import add_to_rows, insert_rows
+from inventory.services.concurrency import LOCATION_LOCK_ORDER
+from inventory.services.keys import KEY_CHUNK_SIZE, LOCATION_KEY_FIELDS
+from inventory.services.valuation import InventoryValuationService
+
+
+class StockSummaryService:
+    """Maintains and reads the denormalized ProductStockSummary totals"""
+
+    @staticmethod
+    def apply_deltas(deltas: Dict[tuple, Decimal], *, valuation: bool = True) -> None:
+        """
+        Add quantity deltas to the summary.
+
+        ``deltas`` is keyed by (product_id, variant_id, branch_id); each product's
+        company-wide total row is adjusted as well, and the deltas are queued for
+        the inventory valuation (unless ``valuation`` is False and the caller
+        queues them itself). Must run inside the same transaction as the stock
+        change it mirrors.
+        """
+        all_deltas: Dict[tuple, Decimal] = defaultdict(Decimal)
+        for (product_id, variant_id, branch_id), delta in deltas.items():
+            if not delta:
+                continue
+            all_deltas[(product_id, variant_id, branch_id)] += delta
+            all_deltas[(product_id, None, None)] += delta
+        if all_deltas:
+            StockSummaryService._apply(all_deltas, retry=True)
+            if valuation:
+                InventoryValuationService.queue_deltas(deltas)
+
+    @staticmethod
+    def _apply(deltas: Dict[tuple, Decimal], retry: bool) -> None:
+        # Every delta also moves its product's total row, which already makes
+        # writers of a product wait for each other; locking the product's rows
+        # whole costs no extra contention and needs one IN term per chunk
+        # instead of a filter term per location.
+        products = sorted({product_id for product_id, _, _ in deltas})
+        locked = {}
+        for start in range(0, len(products), KEY_CHUNK_SIZE):
+            rows = (
+                ProductStockSummary.objects.select_for_update()
+                .filter(product_id__in=products[start:start + KEY_CHUNK_SIZE])
+                .order_by(*LOCATION_LOCK_ORDER)
+                .values_list("pk", *LOCATION_KEY_FIELDS)
+            )
+            for pk, *key in rows:
+                locked[tuple(key)] = pk
+        to_update = []
+        to_create = []
+        for key, delta in deltas.items():
+            pk = locked.get(key)
+            if pk is None:
+                product_id, variant_id, branch_id = key
+                to_create.append({
+                    "product_id": product_id,
+                    "variant_id": variant_id,
+                    "branch_id": branch_id,
+                    "quantity": delta,
+                })
+                continue
+            to_update.append((pk, delta))
+
+        add_to_rows(ProductStockSummary, "quantity", to_update)
+        if not to_create:
+            return
+        try:
+            with transaction.atomic():
+                insert_rows(ProductStockSummary, to_create)
+        except IntegrityError:
+            if not retry:
+                raise
+            # Another transaction created some of these rows first; apply on top of them
+            StockSummaryService._apply(
+                {
+                    (row["product_id"], row["variant_id"], row["branch_id"]): row["quantity"]
+                    for row in to_create
+                },
+                retry=False,
+            )
+
+    @staticmethod
+    def with_stock_totals(queryset: models.QuerySet) -> models.QuerySet:
+        """
+        Annotate a Product queryset with ``stock_total`` from the summary, so
+        ``Product.total_stock_quantity()`` needs no query per row.
+        """
+        total = ProductStockSummary.objects.filter(
+            product=OuterRef("pk"), branch__isnull=True
+        ).values("quantity")[:1]
+        return queryset.annotate(
+            stock_total=Coalesce(
+                Subquery(total),
+                Value(Decimal("0")),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            )
+        )
+
+    @staticmethod
+    def totals_for(product_ids: Iterable[int]) -> Dict[int, Decimal]:
+        """Company-wide stock totals for the given products, in one query"""
+        return dict(
+            ProductStockSummary.objects.filter(
+                product_id__in=list(product_ids), branch__isnull=True
+            ).values_list("product_id", "quantity")
+        )
+
+    @staticmethod
+    def expected_totals() -> Dict[tuple, Decimal]:
+        """Summary rows as they should be, computed from the stock tables"""
+        expected: Dict[tuple, Decimal] = defaultdict(Decimal)
+        for stock_model in (WarehouseStock, BranchStock):
+            grouped = (
+                stock_model.objects.order_by()
+                .values("product_id", "variant_id", "branch_id")
+                .annotate(total=Sum("quantity"))
+            )
+            if stock_model is BranchStock:
+                grouped = list(grouped) + list(
+                    StockShard.objects.order_by()
+                    .values(
+                        product_id=F("stock__product_id"),
+                        variant_id=F("stock__variant_id"),
+                        branch_id=F("stock__branch_id"),
+                    )
+                    .annotate(total=Sum("quantity"))
+                )
+            for row in grouped:
+                expected[(row["product_id"], row["variant_id"], row["branch_id"])] += row["total"]
+                expected[(row["product_id"], None, None)] += row["total"]
+        return expected
+
+    @staticmethod
+    @transaction.atomic
+    def rebuild(batch_size: int = 1000) -> int:
+        """Recreate every summary row from the stock tables. Returns the row count."""
+        expected = StockSummaryService.expected_totals()
+        ProductStockSummary.objects.all().delete()
+        ProductStockSummary.objects.bulk_create(
+            [
+                ProductStockSummary(
+                    product_id=product_id,
+                    variant_id=variant_id,
+                    branch_id=branch_id,
+                    quantity=quantity,
+                )
+                for (product_id, variant_id, branch_id), quantity in expected.items()
+            ],
+            batch_size=batch_size,
+        )
+        return len(expected)
+
+    @staticmethod
+    def verify() -> List[tuple]:
+        """
+        Compare the summary against the stock tables.
+
+        Returns:
+            (key, expected, actual) for every mismatching summary row
+        """
+        expected = StockSummaryService.expected_totals()
+        actual = {
+            (row.product_id, row.variant_id, row.branch_id): row.quantity
+            for row in ProductStockSummary.objects.all()
+        }
+        mismatches = []
+        for key in expected.keys() | actual.keys():
+            expected_quantity = expected.get(key, Decimal("0"))
+            actual_quantity = actual.get(key, Decimal("0"))
+            if expected_quantity != actual_quantity:
+                mismatches.append((key, expected_quantity, actual_quantity))
+        return mismatches
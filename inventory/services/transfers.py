@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import User
+from inventory.models import StockMovement, StockTransfer, StockTransferItem
+from inventory.services.bulk import update_rows
+from inventory.services.concurrency import retry_on_conflict
+from inventory.services.stock import StockService
+
+
+class StockTransferService:
+    """
+    Whole-document StockTransfer workflow: approve, dispatch, receive.
+
+    Each step locks the transfer row, then applies every item with a single
+    ``apply_stock_movements`` call (one lock query per stock table, bulk
+    inserts), and saves item quantities and the document status in the same
+    transaction. Movements use the transfer number as their reference.
+    """
+
+    @staticmethod
+    def _lock(transfer: StockTransfer) -> StockTransfer:
+        """Re-read the transfer under a row lock, so concurrent steps serialize"""
+        locked = StockTransfer.objects.select_for_update().get(pk=transfer.pk)
+        for field in StockTransfer._meta.concrete_fields:
+            setattr(transfer, field.attname, getattr(locked, field.attname))
+        return transfer
+
+    @staticmethod
+    def _items(transfer: StockTransfer) -> List[StockTransferItem]:
+        return list(transfer.items.select_related("product", "variant").order_by("id"))
+
+    @staticmethod
+    @retry_on_conflict
+    @transaction.atomic
+    def approve(
+        transfer: StockTransfer,
+        *,
+        approved_by: User,
+        quantities: Optional[Dict[int, Decimal]] = None,
+    ) -> StockTransfer:
+        """
+        Approve a pending transfer.
+
+        Args:
+            quantities: Approved quantity per item id; items not listed are
+                approved at their requested quantity
+
+        Raises:
+            ValueError: If the transfer isn't pending or a quantity is invalid
+        """
+        StockTransferService._lock(transfer)
+        if not transfer.can_be_approved():
+            raise ValueError(f"Transfer {transfer.transfer_number} is {transfer.status}, not pending")
+
+        quantities = quantities or {}
+        items = StockTransferService._items(transfer)
+        for item in items:
+            approved = quantities.get(item.pk, item.requested_quantity)
+            if approved < 0 or approved > item.requested_quantity:
+                raise ValueError(
+                    f"Approved quantity for {item.product.name} must be between 0 and "
+                    f"{item.requested_quantity}"
+                )
+            item.approved_quantity = approved
+        update_rows(StockTransferItem, items, ["approved_quantity"])
+
+        transfer.status = StockTransfer.Status.APPROVED
+        transfer.approved_by = approved_by
+        transfer.approved_at = timezone.now()
+        transfer.save(update_fields=["status", "approved_by", "approved_at", "updated_at"])
+        return transfer
+
+    @staticmethod
+    @retry_on_conflict
+    @transaction.atomic
+    def dispatch(
+        transfer: StockTransfer,
+        *,
+        dispatched_by: Optional[User] = None,
+    ) -> List[StockMovement]:
+        """
+        Take every approved item out of the source branch and mark the transfer
+        in transit.
+
+        Returns:
+            The TRANSFER_OUT movements, in item order
+
+        Raises:
+            ValueError: If the transfer isn't approved
+            InsufficientStockError: If the source can't cover every item; nothing
+                is moved and ``details`` lists each short item
+        """
+        StockTransferService._lock(transfer)
+        if transfer.status != StockTransfer.Status.APPROVED:
+            raise ValueError(f"Transfer {transfer.transfer_number} is {transfer.status}, not approved")
+
+        movements = StockService.apply_stock_movements(
+            lines=[
+                {
+                    "product": item.product,
+                    "variant": item.variant,
+                    "quantity": item.approved_quantity,
+                    "movement_type": StockMovement.MovementType.TRANSFER_OUT,
+                    "source_branch": transfer.source_branch,
+                    "batch_number": item.batch_number,
+                }
+                for item in StockTransferService._items(transfer)
+                if item.approved_quantity > 0
+            ],
+            reference=transfer.transfer_number,
+            created_by=dispatched_by,
+        )
+
+        transfer.status = StockTransfer.Status.IN_TRANSIT
+        transfer.dispatched_at = timezone.now()
+        transfer.save(update_fields=["status", "dispatched_at", "updated_at"])
+        return movements
+
+    @staticmethod
+    @retry_on_conflict
+    @transaction.atomic
+    def receive(
+        transfer: StockTransfer,
+        *,
+        received_by: User,
+        quantities: Optional[Dict[int, Decimal]] = None,
+    ) -> List[StockMovement]:
+        """
+        Book received items into the destination branch.
+
+        An approved transfer is dispatched first. Receipts can be partial and
+        repeated; ``received_quantity`` accumulates and the transfer completes
+        once every item is fully received. Items arrive at the FIFO cost they
+        left the source with.
+
+        Args:
+            quantities: Quantity received now per item id; by default everything
+                still outstanding
+
+        Returns:
+            The TRANSFER_IN movements created by this receipt
+
+        Raises:
+            ValueError: If the transfer can't be received or a quantity exceeds
+                what is outstanding
+        """
+        StockTransferService._lock(transfer)
+        if not transfer.can_be_received():
+            raise ValueError(f"Transfer {transfer.transfer_number} is {transfer.status} and can't be received")
+        if transfer.status == StockTransfer.Status.APPROVED:
+            StockTransferService.dispatch(transfer, dispatched_by=received_by)
+
+        items = StockTransferService._items(transfer)
+        unit_costs = StockTransferService._dispatch_costs(transfer, items)
+        lines = []
+        received_items = []
+        for item in items:
+            outstanding = item.approved_quantity - item.received_quantity
+            quantity = outstanding if quantities is None else quantities.get(item.pk, Decimal("0"))
+            if quantity < 0 or quantity > outstanding:
+                raise ValueError(
+                    f"Received quantity for {item.product.name} must be between 0 and {outstanding}"
+                )
+            if not quantity:
+                continue
+            item.received_quantity += quantity
+            received_items.append(item)
+            lines.append({
+                "product": item.product,
+                "variant": item.variant,
+                "quantity": quantity,
+                "movement_type": StockMovement.MovementType.TRANSFER_IN,
+                "dest_branch": transfer.destination_branch,
+                "batch_number": item.batch_number,
+                "expiry_date": item.expiry_date,
+                "cost_price": unit_costs.get(
+                    (item.product_id, item.variant_id, item.batch_number)
+                ),
+            })
+
+        movements = StockService.apply_stock_movements(
+            lines=lines, reference=transfer.transfer_number, created_by=received_by
+        ) if lines else []
+        update_rows(StockTransferItem, received_items, ["received_quantity"])
+
+        now = timezone.now()
+        transfer.received_by = received_by
+        transfer.received_at = now
+        update_fields = ["received_by", "received_at", "updated_at"]
+        if all(item.is_fully_received() for item in items):
+            transfer.status = StockTransfer.Status.COMPLETED
+            transfer.actual_delivery = timezone.localdate(now)
+            update_fields += ["status", "actual_delivery"]
+        transfer.save(update_fields=update_fields)
+        return movements
+
+    @staticmethod
+    def _dispatch_costs(
+        transfer: StockTransfer, items: List[StockTransferItem]
+    ) -> Dict[tuple, Decimal]:
+        """
+        FIFO unit cost per (product_id, variant_id, batch_number) of what was
+        dispatched, weighted by quantity across every dispatch movement of the
+        key (a batch may go out in several movements at different costs).
+
+        Raises:
+            ValueError: If a dispatch movement has no COGS yet, rather than
+                booking the receipt at a guessed cost
+        """
+        totals: Dict[tuple, List[Decimal]] = defaultdict(lambda: [Decimal("0"), Decimal("0")])
+        dispatched = StockMovement.objects.filter(
+            product_id__in={item.product_id for item in items},
+            reference=transfer.transfer_number,
+            movement_type=StockMovement.MovementType.TRANSFER_OUT,
+            source_branch=transfer.source_branch,
+        ).values_list("product_id", "variant_id", "batch_number", "quantity", "cogs_amount")
+        for product_id, variant_id, batch_number, quantity, cogs_amount in dispatched:
+            if cogs_amount is None:
+                raise ValueError(
+                    f"Transfer {transfer.transfer_number} has a dispatch movement without "
+                    f"COGS; apply its cost layers before receiving"
+                )
+            total = totals[(product_id, variant_id, batch_number)]
+            total[0] += cogs_amount
+            total[1] += quantity
+        return {
+            key: (cogs / quantity).quantize(Decimal("0.01"))
+            for key, (cogs, quantity) in totals.items()
+            if quantity
+        }
@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from inventory.models import (
+    Category,
+    InventoryValuation,
+    LocationStock,
+    Product,
+    ProductStockSummary,
+)
+from inventory.services.bulk import update_rows
+from inventory.services.categories import CategoryTreeService
+
+# (branch_id, category_id) -> (quantity delta, value delta)
+Adjustments = Dict[Tuple[int, Optional[int]], Tuple[Decimal, Decimal]]
+
+RECOMPUTE_CHUNK_SIZE = 5000
+
+
+class InventoryValuationService:
+    """
+    Running on-hand value per (branch, category).
+
+    Every quantity delta that reaches ProductStockSummary is priced at the
+    product's ``cost_price`` inside the stock transaction and applied to
+    InventoryValuation once that transaction commits. The rows are shared by
+    every movement of a branch, so they are only locked for the short
+    follow-up transaction, not the whole sale. A callback lost to a crash
+    leaves drift that ``recompute`` (or ``verify``) finds.
+
+    Changing a product's cost price or category revalues its stock on hand
+    (``Product.save`` calls ``revalue``); ``QuerySet.update`` bypasses that, so
+    run a recompute after bulk price updates.
+    """
+
+    @staticmethod
+    def queue_deltas(deltas: Dict[tuple, Decimal]) -> None:
+        """
+        Price (product_id, variant_id, branch_id) quantity deltas and apply them
+        once the current transaction commits.
+        """
+        deltas = {key: delta for key, delta in deltas.items() if delta and key[2] is not None}
+        if not deltas:
+            return
+        products = dict(
+            (product_id, (category_id, cost_price))
+            for product_id, category_id, cost_price in Product.objects.filter(
+                pk__in={key[0] for key in deltas}
+            ).values_list("id", "category_id", "cost_price")
+        )
+        adjustments: Dict[tuple, List[Decimal]] = defaultdict(lambda: [Decimal("0"), Decimal("0")])
+        for (product_id, _, branch_id), delta in deltas.items():
+            category_id, cost_price = products[product_id]
+            adjustment = adjustments[(branch_id, category_id)]
+            adjustment[0] += delta
+            adjustment[1] += delta * cost_price
+        InventoryValuationService._defer(adjustments)
+
+    @staticmethod
+    def revalue(product: Product, old_category_id: Optional[int], old_cost_price: Decimal) -> None:
+        """
+        Move ``product``'s stock on hand from its old (category, cost price) to
+        its current ones, after commit.
+        """
+        if (old_category_id, old_cost_price) == (product.category_id, Decimal(product.cost_price)):
+            return
+        quantities = (
+            ProductStockSummary.objects.filter(product=product, branch__isnull=False)
+            .order_by()
+            .values("branch_id")
+            .annotate(total=Sum("quantity"))
+            .values_list("branch_id", "total")
+        )
+        adjustments: Dict[tuple, List[Decimal]] = defaultdict(lambda: [Decimal("0"), Decimal("0")])
+        for branch_id, quantity in quantities:
+            if not quantity:
+                continue
+            old = adjustments[(branch_id, old_category_id)]
+            old[0] -= quantity
+            old[1] -= quantity * old_cost_price
+            new = adjustments[(branch_id, product.category_id)]
+            new[0] += quantity
+            new[1] += quantity * Decimal(product.cost_price)
+        InventoryValuationService._defer(adjustments)
+
+    @staticmethod
+    def _defer(adjustments: Dict[tuple, List[Decimal]]) -> None:
+        # Bound to the current savepoint: a rollback drops it with the movements
+        adjustments = {
+            key: (quantity, value)
+            for key, (quantity, value) in adjustments.items()
+            if quantity or value
+        }
+        if adjustments:
+            transaction.on_commit(
+                lambda: InventoryValuationService.apply(adjustments), robust=True
+            )
+
+    @staticmethod
+    @transaction.atomic
+    def apply(adjustments: Adjustments, retry: bool = True) -> None:
+        """Add (quantity, value) adjustments to the valuation rows"""
+        # Categories deleted since the adjustment was priced count as uncategorised
+        existing = set(
+            Category.objects.filter(
+                pk__in={category_id for _, category_id in adjustments if category_id}
+            ).values_list("pk", flat=True)
+        )
+        merged: Dict[tuple, List[Decimal]] = defaultdict(lambda: [Decimal("0"), Decimal("0")])
+        for (branch_id, category_id), (quantity, value) in adjustments.items():
+            row = merged[(branch_id, category_id if category_id in existing else None)]
+            row[0] += quantity
+            row[1] += value
+
+        rows = {
+            (row.branch_id, row.category_id): row
+            for row in InventoryValuation.objects.select_for_update()
+            .filter(branch_id__in={branch_id for branch_id, _ in merged})
+            .order_by("branch_id", "category_id")
+            if (row.branch_id, row.category_id) in merged
+        }
+        now = timezone.now()
+        to_update = []
+        to_create = []
+        for (branch_id, category_id), (quantity, value) in merged.items():
+            row = rows.get((branch_id, category_id))
+            if row is None:
+                to_create.append(InventoryValuation(
+                    branch_id=branch_id, category_id=category_id, quantity=quantity, value=value
+                ))
+                continue
+            row.quantity += quantity
+            row.value += value
+            row.updated_at = now
+            to_update.append(row)
+
+        if to_update:
+            update_rows(InventoryValuation, to_update, ["quantity", "value", "updated_at"])
+        if not to_create:
+            return
+        try:
+            with transaction.atomic():
+                InventoryValuation.objects.bulk_create(to_create)
+        except IntegrityError:
+            if not retry:
+                raise
+            # Another transaction created some of these rows first; apply on top of them
+            InventoryValuationService.apply(
+                {(row.branch_id, row.category_id): (row.quantity, row.value) for row in to_create},
+                retry=False,
+            )
+
+    @staticmethod
+    @transaction.atomic
+    def merge_categories(category_ids: Iterable[int]) -> None:
+        """Fold the rows of categories about to be deleted into the uncategorised rows"""
+        rows = list(
+            InventoryValuation.objects.select_for_update().filter(category_id__in=list(category_ids))
+        )
+        if not rows:
+            return
+        adjustments: Dict[tuple, List[Decimal]] = defaultdict(lambda: [Decimal("0"), Decimal("0")])
+        for row in rows:
+            adjustment = adjustments[(row.branch_id, None)]
+            adjustment[0] += row.quantity
+            adjustment[1] += row.value
+        InventoryValuation.objects.filter(pk__in=[row.pk for row in rows]).delete()
+        InventoryValuationService.apply(
+            {key: (quantity, value) for key, (quantity, value) in adjustments.items()}
+        )
+
+    @staticmethod
+    def expected_totals(chunk_size: int = RECOMPUTE_CHUNK_SIZE) -> Adjustments:
+        """
+        (quantity, value) per (branch, category) computed from the stock rows,
+        streamed ``chunk_size`` at a time so memory stays flat.
+        """
+        totals: Dict[tuple, List[Decimal]] = defaultdict(lambda: [Decimal("0"), Decimal("0")])
+        rows = (
+            LocationStock.objects.exclude(quantity=0)
+            .order_by()
+            .values_list("branch_id", "product__category_id", "quantity", "product__cost_price")
+        )
+        for branch_id, category_id, quantity, cost_price in rows.iterator(chunk_size=chunk_size):
+            total = totals[(branch_id, category_id)]
+            total[0] += quantity
+            total[1] += quantity * cost_price
+        return {key: (quantity, value) for key, (quantity, value) in totals.items()}
+
+    @staticmethod
+    @transaction.atomic
+    def recompute(chunk_size: int = RECOMPUTE_CHUNK_SIZE) -> int:
+        """
+        Replace every valuation row with totals from the stock rows. Rows stay
+        locked until the new totals are in, so adjustments committed meanwhile
+        wait and land on top. Returns the number of rows written.
+        """
+        list(InventoryValuation.objects.select_for_update().values_list("pk", flat=True))
+        expected = InventoryValuationService.expected_totals(chunk_size)
+        InventoryValuation.objects.all().delete()
+        InventoryValuation.objects.bulk_create(
+            [
+                InventoryValuation(
+                    branch_id=branch_id, category_id=category_id, quantity=quantity, value=value
+                )
+                for (branch_id, category_id), (quantity, value) in expected.items()
+                if quantity or value
+            ],
+            batch_size=1000,
+        )
+        return InventoryValuation.objects.count()
+
+    @staticmethod
+    def verify(chunk_size: int = RECOMPUTE_CHUNK_SIZE) -> List[tuple]:
+        """
+        Compare valuation rows with the stock rows.
+
+        Returns:
+            (key, expected, actual) for every (branch_id, category_id) whose
+            (quantity, value) differs
+        """
+        zero = (Decimal("0"), Decimal("0"))
+        expected = InventoryValuationService.expected_totals(chunk_size)
+        actual = {
+            (branch_id, category_id): (quantity, value)
+            for branch_id, category_id, quantity, value in InventoryValuation.objects.values_list(
+                "branch_id", "category_id", "quantity", "value"
+            )
+        }
+        mismatches = []
+        for key in expected.keys() | actual.keys():
+            want = expected.get(key, zero)
+            have = actual.get(key, zero)
+            # Stored values are rounded to cents
+            if want[0] != have[0] or abs(want[1] - have[1]) >= Decimal("0.01"):
+                mismatches.append((key, want, have))
+        return sorted(mismatches, key=lambda mismatch: (mismatch[0][0], mismatch[0][1] or 0))
+
+    @staticmethod
+    def totals(
+        *,
+        branch_ids: Optional[Iterable[int]] = None,
+        category_ids: Optional[Iterable[int]] = None,
+    ) -> Dict[str, Decimal]:
+        """Company-wide (or filtered) quantity and value, from the valuation rows only"""
+        queryset = InventoryValuation.objects.all()
+        if branch_ids is not None:
+            queryset = queryset.filter(branch_id__in=list(branch_ids))
+        if category_ids is not None:
+            queryset = queryset.filter(category_id__in=list(category_ids))
+        totals = queryset.aggregate(quantity=Sum("quantity"), value=Sum("value"))
+        return {key: total or Decimal("0") for key, total in totals.items()}
+
+    @staticmethod
+    def by_branch() -> Dict[int, Decimal]:
+        """On-hand value per branch id"""
+        return dict(
+            InventoryValuation.objects.order_by()
+            .values("branch_id")
+            .annotate(total=Sum("value"))
+            .values_list("branch_id", "total")
+        )
+
+    @staticmethod
+    def by_category(
+        branch_ids: Optional[Iterable[int]] = None,
+        include_subcategories: bool = False,
+    ) -> Dict[Optional[int], Decimal]:
+        """
+        On-hand value per category id (None: uncategorised). With
+        ``include_subcategories``, each category also counts everything below
+        it, rolled up along the cached category tree.
+        """
+        queryset = InventoryValuation.objects.order_by()
+        if branch_ids is not None:
+            queryset = queryset.filter(branch_id__in=list(branch_ids))
+        direct = dict(
+            queryset.values("category_id")
+            .annotate(total=Sum("value"))
+            .values_list("category_id", "total")
+        )
+        if not include_subcategories:
+            return direct
+
+        nodes = CategoryTreeService.nodes()
+        rolled: Dict[Optional[int], Decimal] = defaultdict(Decimal)
+        for category_id, total in direct.items():
+            node = nodes.get(category_id)
+            for ancestor_id in node["ancestor_ids"] if node else [category_id]:
+                rolled[ancestor_id] += total
+        return dict(rolled)
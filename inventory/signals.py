@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import Branch
+from inventory.services.locations import LocationStockService
+
+
+@receiver([post_save, post_delete], sender=Branch)
+def expire_branch_tree(sender, **kwargs) -> None:
+    """Branches moved, added or removed: rebuild the cached branch hierarchy"""
+    LocationStockService.invalidate_branch_tree()
@@ -0,0 +1,137 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from inventory.models import StockAlert, StockMovement
+from inventory.services.alerts import StockAlertService
+from inventory.services.stock import StockService
+from inventory.tests.utils import make_branch, make_product, receive
+
+SALE = StockMovement.MovementType.POS_SALE_OUT
+LOW = StockAlert.AlertType.LOW_STOCK
+OUT = StockAlert.AlertType.OUT_OF_STOCK
+EXPIRED = StockAlert.AlertType.EXPIRED
+EXPIRING = StockAlert.AlertType.EXPIRING_SOON
+
+
+class DeferredAlertTests(TestCase):
+    def setUp(self):
+        self.branch = make_branch(is_warehouse=True)
+        self.product = make_product(reorder_level=Decimal("5"))
+        self.other = make_product(reorder_level=Decimal("5"))
+        with self.captureOnCommitCallbacks(execute=True):
+            receive(self.product, self.branch, 10)
+            receive(self.other, self.branch, 10)
+
+    def sell(self, product, quantity):
+        StockService.apply_stock_movement(
+            product=product, quantity=Decimal(quantity), movement_type=SALE, source_branch=self.branch
+        )
+
+    def test_alerts_wait_for_commit_and_run_once_per_transaction(self):
+        check = StockService.check_alerts_for_keys
+        with mock.patch.object(StockService, "check_alerts_for_keys", side_effect=check) as checked:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    self.sell(self.product, 3)
+                    self.sell(self.product, 3)
+                    self.sell(self.other, 6)
+                    self.assertFalse(StockAlert.objects.exists())
+        checked.assert_called_once()
+        (keys,) = checked.call_args.args
+        self.assertEqual(
+            keys,
+            {(self.product.pk, None, self.branch.pk), (self.other.pk, None, self.branch.pk)},
+        )
+        self.assertEqual(StockAlert.objects.filter(alert_type=LOW, is_resolved=False).count(), 2)
+
+    def test_rolled_back_keys_are_checked_with_the_next_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.sell(self.product, 6)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            self.sell(self.other, 6)
+        # The product's stock is back at 10, so only the other one is low
+        self.assertEqual(
+            list(StockAlert.objects.values_list("product_id", flat=True)), [self.other.pk]
+        )
+
+
+class SweepTests(TestCase):
+    def setUp(self):
+        self.branch = make_branch(is_warehouse=True)
+        self.today = timezone.localdate()
+        self.product = make_product(reorder_level=Decimal("5"), expiry_alert_days=7)
+        receive(self.product, self.branch, 3, batch_number="A", expiry_date=self.today - timedelta(days=1))
+        receive(self.product, self.branch, 4, batch_number="B", expiry_date=self.today + timedelta(days=3))
+        receive(self.product, self.branch, 6, batch_number="C", expiry_date=self.today + timedelta(days=60))
+        self.empty = make_product(reorder_level=Decimal("5"))
+        receive(self.empty, self.branch, 1)
+        StockService.apply_stock_movement(
+            product=self.empty, quantity=Decimal("1"), movement_type=SALE, source_branch=self.branch
+        )
+
+    def open_alerts(self):
+        return {
+            (alert.product_id, alert.alert_type): (alert.current_quantity, alert.expiry_date)
+            for alert in StockAlert.objects.filter(is_resolved=False)
+        }
+
+    def test_sweep_raises_alerts_per_location(self):
+        output = StringIO()
+        call_command("sweep_stock_alerts", stdout=output)
+        self.assertIn("Created 3 alerts", output.getvalue())
+        self.assertEqual(self.open_alerts(), {
+            (self.product.pk, EXPIRED): (Decimal("3"), self.today - timedelta(days=1)),
+            (self.product.pk, EXPIRING): (Decimal("4"), self.today + timedelta(days=3)),
+            (self.empty.pk, OUT): (Decimal("0"), None),
+        })
+
+    def test_cleared_conditions_are_resolved(self):
+        StockAlertService.sync()
+        receive(self.empty, self.branch, 10)
+        counts = StockAlertService.sync(today=self.today - timedelta(days=10))
+        self.assertEqual(counts, {"created": 0, "resolved": 3})
+        self.assertEqual(self.open_alerts(), {})
+
+
+class AlertDeduplicationTests(TestCase):
+    def setUp(self):
+        self.branch = make_branch(is_warehouse=True)
+        self.product = make_product()
+
+    def upsert(self, quantity):
+        StockAlertService.upsert({
+            (self.product.pk, None, self.branch.pk, LOW): (Decimal(quantity), None)
+        })
+
+    def test_upsert_refreshes_the_open_alert(self):
+        self.upsert(4)
+        self.upsert(2)
+        alert = StockAlert.objects.get()
+        self.assertEqual(alert.current_quantity, Decimal("2"))
+
+    def test_resolved_alerts_dont_block_a_new_one(self):
+        self.upsert(4)
+        StockAlert.objects.update(is_resolved=True, resolved_at=timezone.now())
+        self.upsert(3)
+        self.assertEqual(
+            sorted(StockAlert.objects.values_list("is_resolved", "current_quantity")),
+            [(False, Decimal("3")), (True, Decimal("4"))],
+        )
+
+    def test_second_open_alert_is_rejected_by_the_database(self):
+        self.upsert(4)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            StockAlert.objects.create(
+                product=self.product, branch=self.branch, alert_type=LOW, current_quantity=Decimal("4")
+            )
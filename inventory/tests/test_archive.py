@@ -0,0 +1,48 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from inventory.models import StockMovement, StockMovementArchive, StockMovementRollup
+from inventory.services.archive import StockArchiveService
+from inventory.services.stock import StockService
+from inventory.tests.utils import make_branch, make_product, receive
+
+SALE = StockMovement.MovementType.POS_SALE_OUT
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.branch = make_branch(is_warehouse=True)
+        self.product = make_product()
+        receive(self.product, self.branch, 100)
+
+    def sell(self, quantity):
+        StockService.apply_stock_movement(
+            product=self.product, quantity=Decimal(quantity), movement_type=SALE, source_branch=self.branch
+        )
+
+    def archive(self):
+        return StockArchiveService.archive(before=timezone.now() + timedelta(seconds=1))
+
+    def test_movements_with_open_cost_layers_stay_hot(self):
+        self.sell(4)
+        self.assertEqual(self.archive(), 1)
+        self.assertEqual(StockMovement.objects.get().movement_type, StockMovement.MovementType.PURCHASE_IN)
+        self.assertEqual(StockMovementArchive.objects.get().quantity, Decimal("4"))
+
+    def test_repeated_runs_add_to_the_monthly_rollup(self):
+        self.sell(4)
+        self.archive()
+        self.sell(6)
+        self.archive()
+        rollup = StockMovementRollup.objects.get(movement_type=SALE)
+        self.assertEqual(
+            (rollup.quantity, rollup.cogs_amount, rollup.movement_count),
+            (Decimal("10.00"), Decimal("100.00"), 2),
+        )
+        totals = StockArchiveService.monthly_totals(product=self.product)
+        self.assertEqual(
+            totals[(rollup.month, self.product.pk, self.branch.pk, SALE)]["quantity"], Decimal("10.00")
+        )
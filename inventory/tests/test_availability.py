@@ -0,0 +1,59 @@
+from decimal import Decimal
+
+from django.test import TransactionTestCase
+
+from inventory.models import StockMovement
+from inventory.services.availability import StockAvailabilityCache, VariantAvailabilityService
+from inventory.services.stock import StockService
+from inventory.tests.utils import make_branch, make_product, receive
+
+
+class AvailabilityCacheTests(TransactionTestCase):
+    """Outside TestCase's transaction: reads inside one bypass the cache"""
+
+    def setUp(self):
+        StockAvailabilityCache._cache().clear()
+        StockAvailabilityCache.reset_stats()
+        self.branch = make_branch(is_warehouse=True)
+        self.product = make_product()
+        receive(self.product, self.branch, 5)
+
+    def get(self):
+        return StockAvailabilityCache.get(self.product, None, self.branch)
+
+    def test_repeated_reads_are_served_from_the_cache(self):
+        self.assertEqual(self.get(), Decimal("5"))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(), Decimal("5"))
+        self.assertEqual(StockAvailabilityCache.stats(), {"hits": 1, "misses": 1})
+
+    def test_committed_movements_replace_the_generation(self):
+        self.get()
+        StockService.apply_stock_movement(
+            product=self.product,
+            quantity=Decimal("2"),
+            movement_type=StockMovement.MovementType.POS_SALE_OUT,
+            source_branch=self.branch,
+        )
+        self.assertEqual(self.get(), Decimal("3"))
+
+    def test_value_read_before_a_change_is_not_served_after_it(self):
+        key = (self.branch.pk, self.product.pk, None, "")
+        cache = StockAvailabilityCache._cache()
+        self.get()
+        old_generation = cache.get(
+            StockAvailabilityCache._generation_key(self.product.pk, None, self.branch.pk)
+        )
+        receive(self.product, self.branch, 1)
+        # A slow reader writes what it loaded under the old token, after the commit
+        cache.set(StockAvailabilityCache._value_key(key), (old_generation, Decimal("5")))
+        self.assertEqual(self.get(), Decimal("6"))
+
+    def test_variant_matrix_follows_movements(self):
+        self.assertEqual(
+            VariantAvailabilityService.variant_totals(self.product.pk), {None: Decimal("5")}
+        )
+        receive(self.product, self.branch, 2)
+        self.assertEqual(
+            VariantAvailabilityService.variant_totals(self.product.pk), {None: Decimal("7")}
+        )
@@ -0,0 +1,90 @@
+from datetime import date
+from decimal import Decimal
+
+from django.test import TestCase
+
+from inventory.models import ProductStockSummary, WarehouseStock
+from inventory.services.bulk import add_to_rows, insert_rows, update_rows
+from inventory.services.keys import LOCATION_KEY_FIELDS, STOCK_KEY_FIELDS, key_filter
+from inventory.tests.utils import make_branch, make_product
+
+
+class KeyFilterTests(TestCase):
+    def setUp(self):
+        self.branch = make_branch(is_warehouse=True)
+        self.products = [make_product() for _ in range(3)]
+        for product in self.products:
+            WarehouseStock.objects.create(branch=self.branch, product=product, quantity=Decimal("1"))
+        WarehouseStock.objects.create(
+            branch=self.branch, product=self.products[0], batch_number="L1", quantity=Decimal("1")
+        )
+
+    def test_keys_at_one_branch_fold_into_one_in_term(self):
+        keys = [(self.branch.pk, product.pk, None, "") for product in self.products]
+        condition = key_filter(STOCK_KEY_FIELDS, keys)
+        # The empty seed term plus one term for all three products
+        self.assertEqual(len(condition.children), 2)
+        self.assertEqual(
+            set(WarehouseStock.objects.filter(condition).values_list("product_id", "batch_number")),
+            {(product.pk, "") for product in self.products},
+        )
+
+    def test_none_matches_null_columns_and_no_keys_match_nothing(self):
+        product = self.products[0]
+        ProductStockSummary.objects.create(product=product, quantity=Decimal("2"))
+        ProductStockSummary.objects.create(product=product, branch=self.branch, quantity=Decimal("2"))
+        rows = ProductStockSummary.objects.filter(
+            key_filter(LOCATION_KEY_FIELDS, [(product.pk, None, None)])
+        )
+        self.assertEqual(list(rows.values_list("branch_id", flat=True)), [None])
+        self.assertFalse(WarehouseStock.objects.filter(key_filter(STOCK_KEY_FIELDS, [])).exists())
+
+
+class BulkWriteTests(TestCase):
+    def setUp(self):
+        self.branch = make_branch(is_warehouse=True)
+        self.product = make_product()
+
+    def test_insert_rows_returns_pks_in_order_and_fills_defaults(self):
+        pks = insert_rows(
+            WarehouseStock,
+            [
+                {"branch_id": self.branch.pk, "product_id": self.product.pk, "batch_number": batch,
+                 "quantity": Decimal("1.005")}
+                for batch in ("A", "B")
+            ],
+            returning=True,
+        )
+        rows = WarehouseStock.objects.in_bulk(pks)
+        self.assertEqual([rows[pk].batch_number for pk in pks], ["A", "B"])
+        self.assertEqual(rows[pks[0]].quantity, Decimal("1.00"))
+        self.assertIsNone(rows[pks[0]].expiry_date)
+        self.assertIsNotNone(rows[pks[0]].last_updated)
+
+    def test_update_rows_writes_loaded_values(self):
+        stock = WarehouseStock.objects.create(branch=self.branch, product=self.product, quantity=Decimal("1"))
+        stock.quantity = Decimal("7.50")
+        update_rows(WarehouseStock, [stock], ["quantity"])
+        stock.refresh_from_db()
+        self.assertEqual(stock.quantity, Decimal("7.50"))
+
+    def test_add_to_rows_adds_to_the_stored_value_and_only_fills_nulls(self):
+        empty = WarehouseStock.objects.create(
+            branch=self.branch, product=self.product, batch_number="A", quantity=Decimal("1")
+        )
+        dated = WarehouseStock.objects.create(
+            branch=self.branch, product=self.product, batch_number="B", quantity=Decimal("1"),
+            expiry_date=date(2027, 1, 1),
+        )
+        # Stale in-memory quantities don't matter: the amount is added in SQL
+        WarehouseStock.objects.filter(pk=empty.pk).update(quantity=Decimal("3"))
+        add_to_rows(
+            WarehouseStock,
+            "quantity",
+            [(empty.pk, Decimal("2"), date(2028, 1, 1)), (dated.pk, Decimal("2"), date(2028, 1, 1))],
+            fill=["expiry_date"],
+        )
+        empty.refresh_from_db()
+        dated.refresh_from_db()
+        self.assertEqual((empty.quantity, empty.expiry_date), (Decimal("5"), date(2028, 1, 1)))
+        self.assertEqual((dated.quantity, dated.expiry_date), (Decimal("3"), date(2027, 1, 1)))
@@ -0,0 +1,113 @@
+from importlib import import_module
+
+from django.apps import apps
+from django.test import TestCase, override_settings
+
+from inventory.models import Category, Product
+from inventory.services.categories import CategoryTreeService
+from inventory.tests.utils import make_product
+
+
+class CategoryPathTests(TestCase):
+    def setUp(self):
+        self.food = Category.objects.create(name="Food")
+        self.drinks = Category.objects.create(name="Drinks", parent=self.food)
+        self.tea = Category.objects.create(name="Tea", parent=self.drinks)
+
+    def test_paths_follow_parents(self):
+        self.tea.refresh_from_db()
+        self.assertEqual(self.tea.path, f"{self.food.pk}/{self.drinks.pk}/{self.tea.pk}/")
+        self.assertEqual(self.tea.depth, 2)
+
+    def test_moving_a_category_moves_its_subtree(self):
+        other = Category.objects.create(name="Other")
+        self.drinks.parent = other
+        self.drinks.save()
+        self.tea.refresh_from_db()
+        self.assertEqual(self.tea.path, f"{other.pk}/{self.drinks.pk}/{self.tea.pk}/")
+        self.assertEqual(
+            set(CategoryTreeService.subtree(self.food).values_list("pk", flat=True)), {self.food.pk}
+        )
+
+    def test_category_cant_move_under_its_subcategory(self):
+        self.food.parent = self.tea
+        with self.assertRaises(ValueError):
+            self.food.save()
+
+    def test_deleting_a_category_reroots_its_children(self):
+        self.food.delete()
+        self.tea.refresh_from_db()
+        self.assertEqual(self.tea.path, f"{self.drinks.pk}/{self.tea.pk}/")
+        self.assertEqual(self.tea.depth, 1)
+
+
+@override_settings(CATEGORY_TREE_REFRESH_SECONDS=0)
+class CategoryTreeCacheTests(TestCase):
+    def test_change_from_another_process_is_picked_up(self):
+        food = Category.objects.create(name="Food")
+        self.assertEqual([node["name"] for node in CategoryTreeService.tree()], ["Food"])
+        # No on_commit callbacks run here, as for a change made by another process
+        food.name = "Groceries"
+        food.save()
+        Category.objects.create(name="Drinks", parent=food)
+        (root,) = CategoryTreeService.tree()
+        self.assertEqual(root["name"], "Groceries")
+        self.assertEqual([child["name"] for child in root["children"]], ["Drinks"])
+
+    def test_deleted_category_is_dropped(self):
+        food = Category.objects.create(name="Food")
+        Category.objects.create(name="Drinks")
+        CategoryTreeService.tree()
+        Category.objects.filter(pk=food.pk).delete()
+        self.assertEqual([node["name"] for node in CategoryTreeService.tree()], ["Drinks"])
+
+    def test_products_include_subcategories(self):
+        food = Category.objects.create(name="Food")
+        tea = Category.objects.create(name="Tea", parent=food)
+        product = make_product(category=tea)
+        make_product()
+        products = CategoryTreeService.products(Product.objects.all(), food.pk)
+        self.assertEqual(list(products), [product])
+
+
+class CategoryPathBackfillTests(TestCase):
+    """The 0012 data migration that filled path and depth for existing rows"""
+
+    def backfill(self):
+        migration = import_module("inventory.migrations.0012_category_path")
+        migration.populate_category_paths(apps, None)
+
+    def test_paths_are_built_from_parent_links(self):
+        food = Category.objects.create(name="Food")
+        drinks = Category.objects.create(name="Drinks", parent=food)
+        tea = Category.objects.create(name="Tea", parent=drinks)
+        other = Category.objects.create(name="Other")
+        Category.objects.update(path="", depth=0)
+
+        self.backfill()
+        paths = dict(Category.objects.values_list("pk", "path"))
+        self.assertEqual(paths, {
+            food.pk: f"{food.pk}/",
+            drinks.pk: f"{food.pk}/{drinks.pk}/",
+            tea.pk: f"{food.pk}/{drinks.pk}/{tea.pk}/",
+            other.pk: f"{other.pk}/",
+        })
+        tea.refresh_from_db()
+        self.assertEqual(tea.depth, 2)
+
+    def test_a_parent_cycle_is_broken_into_a_root(self):
+        first = Category.objects.create(name="First")
+        second = Category.objects.create(name="Second", parent=first)
+        child = Category.objects.create(name="Child", parent=second)
+        # Old data could loop; saving through the model refuses to
+        Category.objects.filter(pk=first.pk).update(parent=second)
+        Category.objects.update(path="", depth=0)
+
+        self.backfill()
+        paths = dict(Category.objects.values_list("pk", "path"))
+        roots = [pk for pk in (first.pk, second.pk) if paths[pk] == f"{pk}/"]
+        self.assertEqual(len(roots), 1)
+        (root,) = roots
+        looped = first.pk if root == second.pk else second.pk
+        self.assertEqual(paths[looped], f"{root}/{looped}/")
+        self.assertEqual(paths[child.pk], f"{paths[second.pk]}{child.pk}/")
@@ -0,0 +1,41 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from inventory.models import CostLayer, StockMovement
+from inventory.services.stock import StockService
+from inventory.tests.utils import make_branch, make_product, receive
+
+SALE = StockMovement.MovementType.POS_SALE_OUT
+
+
+class CostLayerTests(TestCase):
+    def setUp(self):
+        self.branch = make_branch(is_warehouse=True)
+        self.product = make_product(cost_price=Decimal("9.00"))
+
+    def sell(self, quantity):
+        return StockService.apply_stock_movement(
+            product=self.product, quantity=Decimal(quantity), movement_type=SALE, source_branch=self.branch
+        )
+
+    def remaining(self):
+        return list(CostLayer.objects.filter(product=self.product).values_list("remaining_quantity", flat=True))
+
+    def test_sales_consume_the_oldest_layers_first(self):
+        receive(self.product, self.branch, 4, cost_price="2.00")
+        receive(self.product, self.branch, 4, cost_price="3.00")
+        self.assertEqual(self.sell(3).cogs_amount, Decimal("6.00"))
+        self.assertEqual(self.sell(3).cogs_amount, Decimal("8.00"))
+        self.assertEqual(self.remaining(), [Decimal("0"), Decimal("2")])
+
+    def test_receipt_without_cost_uses_the_product_cost(self):
+        receive(self.product, self.branch, 2)
+        self.assertEqual(CostLayer.objects.get(product=self.product).unit_cost, Decimal("9.00"))
+
+    def test_stock_older_than_the_layers_is_costed_at_the_product_cost(self):
+        receive(self.product, self.branch, 2, cost_price="2.00")
+        # Stock that predates cost layers: on hand, but with no open layer
+        CostLayer.objects.filter(product=self.product).delete()
+        receive(self.product, self.branch, 1, cost_price="4.00")
+        self.assertEqual(self.sell(3).cogs_amount, Decimal("22.00"))
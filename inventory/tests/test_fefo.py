@@ -0,0 +1,48 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from inventory.models import StockMovement, WarehouseStock
+from inventory.services.exceptions import InsufficientStockError
+from inventory.services.stock import StockService
+from inventory.tests.utils import make_branch, make_product, receive
+
+SALE = StockMovement.MovementType.POS_SALE_OUT
+
+
+class FefoTests(TestCase):
+    def setUp(self):
+        self.branch = make_branch(is_warehouse=True)
+        self.product = make_product()
+        today = timezone.localdate()
+        receive(self.product, self.branch, 5, batch_number="LATE", expiry_date=today + timedelta(days=30))
+        receive(self.product, self.branch, 5, batch_number="NONE")
+        receive(self.product, self.branch, 5, batch_number="SOON", expiry_date=today + timedelta(days=2))
+        receive(self.product, self.branch, 5, batch_number="GONE", expiry_date=today - timedelta(days=1))
+
+    def take(self, quantity):
+        return StockService.apply_fefo_movement(
+            product=self.product,
+            quantity=Decimal(quantity),
+            movement_type=SALE,
+            source_branch=self.branch,
+        )
+
+    def batch(self, batch_number):
+        return WarehouseStock.objects.get(product=self.product, batch_number=batch_number).quantity
+
+    def test_earliest_expiry_first_and_undated_last(self):
+        movements = self.take(12)
+        self.assertEqual(
+            [(movement.batch_number, movement.quantity) for movement in movements],
+            [("SOON", Decimal("5")), ("LATE", Decimal("5")), ("NONE", Decimal("2"))],
+        )
+        self.assertEqual(self.batch("NONE"), Decimal("3"))
+
+    def test_expired_batches_are_never_picked(self):
+        with self.assertRaises(InsufficientStockError):
+            self.take(16)
+        self.assertEqual(self.batch("GONE"), Decimal("5"))
+        self.assertEqual(self.batch("SOON"), Decimal("5"))
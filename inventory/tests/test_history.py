@@ -0,0 +1,63 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from inventory.models import StockCheckpoint, StockMovement
+from inventory.services.history import StockHistoryService
+from inventory.services.stock import StockService
+from inventory.tests.utils import make_branch, make_product, receive
+
+
+class StockHistoryTests(TestCase):
+    def setUp(self):
+        self.branch = make_branch(is_warehouse=True)
+        self.product = make_product()
+        self.today = timezone.localdate()
+        self.backdate(receive(self.product, self.branch, 10), days=5)
+        sale = StockService.apply_stock_movement(
+            product=self.product,
+            quantity=Decimal("3"),
+            movement_type=StockMovement.MovementType.POS_SALE_OUT,
+            source_branch=self.branch,
+        )
+        self.backdate(sale, days=3)
+        self.backdate(receive(self.product, self.branch, 2), days=1)
+
+    def backdate(self, movement, days):
+        StockMovement.objects.filter(pk=movement.pk).update(
+            created_at=timezone.now() - timedelta(days=days)
+        )
+
+    def quantity(self, days_ago):
+        return StockHistoryService.quantity_as_of(
+            self.today - timedelta(days=days_ago), product=self.product, branch=self.branch
+        )
+
+    def test_balances_without_a_checkpoint_walk_back_from_live_stock(self):
+        self.assertEqual(
+            [self.quantity(days) for days in (6, 4, 2, 0)],
+            [Decimal("0"), Decimal("10"), Decimal("7"), Decimal("9")],
+        )
+
+    def test_balances_replay_forward_from_the_latest_checkpoint(self):
+        self.assertEqual(StockHistoryService.create_checkpoint(self.today - timedelta(days=4)), 1)
+        checkpoint = StockCheckpoint.objects.get()
+        self.assertEqual(checkpoint.quantity, Decimal("10"))
+        # Reads start from the checkpoint row, not from live stock
+        StockCheckpoint.objects.update(quantity=Decimal("100"))
+        self.assertEqual(self.quantity(4), Decimal("100"))
+        self.assertEqual(self.quantity(2), Decimal("97"))
+        self.assertEqual(self.quantity(6), Decimal("0"))
+
+    def test_prune_keeps_month_ends(self):
+        for as_of in (date(2024, 1, 30), date(2024, 1, 31), date(2024, 2, 1)):
+            StockCheckpoint.objects.create(
+                as_of=as_of, branch=self.branch, product=self.product, quantity=Decimal("1")
+            )
+        StockHistoryService.prune(keep_daily_days=30)
+        self.assertEqual(
+            list(StockCheckpoint.objects.values_list("as_of", flat=True).distinct()),
+            [date(2024, 1, 31)],
+        )
@@ -0,0 +1,64 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from inventory.models import StockMovement, WarehouseStock
+from inventory.services.archive import StockArchiveService
+from inventory.services.stock import StockService
+from inventory.tests.utils import make_branch, make_product, receive
+
+SALE = StockMovement.MovementType.POS_SALE_OUT
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.branch = make_branch(is_warehouse=True)
+        self.product = make_product()
+        receive(self.product, self.branch, 10)
+
+    def sell(self, quantity, key):
+        return StockService.apply_stock_movement(
+            product=self.product,
+            quantity=Decimal(quantity),
+            movement_type=SALE,
+            source_branch=self.branch,
+            idempotency_key=key,
+        )
+
+    def on_hand(self):
+        return WarehouseStock.objects.get(product=self.product).quantity
+
+    def test_retried_movement_is_applied_once(self):
+        first = self.sell(3, "sale-1")
+        again = self.sell(3, "sale-1")
+        self.assertEqual(first.pk, again.pk)
+        self.assertEqual(self.on_hand(), Decimal("7"))
+
+    def test_batch_skips_replayed_lines(self):
+        first = self.sell(3, "sale-1")
+        movements = StockService.apply_stock_movements(lines=[
+            {"product": self.product, "quantity": Decimal("3"), "movement_type": SALE,
+             "source_branch": self.branch, "idempotency_key": "sale-1"},
+            {"product": self.product, "quantity": Decimal("2"), "movement_type": SALE,
+             "source_branch": self.branch, "idempotency_key": "sale-2"},
+        ])
+        self.assertEqual(movements[0].pk, first.pk)
+        self.assertEqual(self.on_hand(), Decimal("5"))
+
+    def test_duplicate_key_within_a_batch_is_refused(self):
+        line = {"product": self.product, "quantity": Decimal("1"), "movement_type": SALE,
+                "source_branch": self.branch, "idempotency_key": "sale-1"}
+        with self.assertRaises(ValueError):
+            StockService.apply_stock_movements(lines=[line, dict(line)])
+        self.assertEqual(self.on_hand(), Decimal("10"))
+
+    def test_archived_movement_still_replays(self):
+        first = self.sell(3, "sale-1")
+        StockArchiveService.archive(before=timezone.now() + timedelta(seconds=1))
+        self.assertFalse(StockMovement.objects.filter(pk=first.pk).exists())
+        again = self.sell(3, "sale-1")
+        self.assertEqual(again.pk, first.pk)
+        self.assertEqual(again.quantity, Decimal("3"))
+        self.assertEqual(self.on_hand(), Decimal("7"))
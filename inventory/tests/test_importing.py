@@ -0,0 +1,95 @@
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+
+from inventory.models import BranchStock, CostLayer, StockMovement, WarehouseStock
+from inventory.services.exceptions import StockImportError
+from inventory.services.importing import StockImportService
+from inventory.services.stock import StockService
+from inventory.services.summary import StockSummaryService
+from inventory.services.valuation import InventoryValuationService
+from inventory.tests.utils import make_branch, make_product, receive
+
+
+class StockImportTests(TestCase):
+    def setUp(self):
+        self.warehouse = make_branch(is_warehouse=True)
+        self.shop = make_branch()
+        self.product = make_product(cost_price=Decimal("10.00"))
+        self.other = make_product(cost_price=Decimal("3.00"))
+
+    def row(self, product, branch, quantity, **fields):
+        return dict(sku=product.sku, branch=branch.code, quantity=str(quantity), **fields)
+
+    def import_rows(self, rows, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return StockImportService.import_rows(enumerate(rows, start=1), **kwargs)
+
+    def test_rows_post_movements_layers_stock_and_summary(self):
+        counts = self.import_rows([
+            self.row(self.product, self.warehouse, 5, batch_number="L1", expiry_date="2027-01-31"),
+            self.row(self.product, self.warehouse, 2, batch_number="L1", cost_price="9.50"),
+            self.row(self.other, self.shop, 4),
+        ])
+        self.assertEqual(counts, {"imported": 3, "skipped": 0})
+
+        stock = WarehouseStock.objects.get(product=self.product, batch_number="L1")
+        self.assertEqual(stock.quantity, Decimal("7"))
+        self.assertEqual(stock.expiry_date, date(2027, 1, 31))
+        self.assertEqual(BranchStock.objects.get(product=self.other).quantity, Decimal("4"))
+        self.assertEqual(StockMovement.objects.count(), 3)
+        self.assertEqual(
+            sorted(CostLayer.objects.values_list("unit_cost", "remaining_quantity")),
+            [
+                (Decimal("3.00"), Decimal("4.00")),
+                (Decimal("9.50"), Decimal("2.00")),
+                (Decimal("10.00"), Decimal("5.00")),
+            ],
+        )
+        self.assertEqual(StockSummaryService.verify(), [])
+        self.assertEqual(InventoryValuationService.verify(), [])
+
+    def test_rows_add_to_existing_stock(self):
+        receive(self.product, self.warehouse, 3, batch_number="L1", expiry_date=date(2027, 3, 1))
+        self.import_rows([
+            self.row(self.product, self.warehouse, 5, batch_number="L1", expiry_date="2027-01-31"),
+        ])
+        stock = WarehouseStock.objects.get(product=self.product, batch_number="L1")
+        self.assertEqual(stock.quantity, Decimal("8"))
+        # An existing expiry is kept
+        self.assertEqual(stock.expiry_date, date(2027, 3, 1))
+        self.assertEqual(StockSummaryService.verify(), [])
+
+    def test_valuation_and_alerts_run_once_after_the_last_chunk(self):
+        rows = [self.row(self.product, self.warehouse, 1) for _ in range(5)]
+        rows.append(self.row(self.other, self.shop, 1))
+        with mock.patch.object(
+            InventoryValuationService, "queue_deltas", wraps=InventoryValuationService.queue_deltas
+        ) as valued, mock.patch.object(
+            StockService, "check_alerts_for_keys", wraps=StockService.check_alerts_for_keys
+        ) as checked:
+            self.import_rows(rows, chunk_size=2)
+        valued.assert_called_once_with({
+            (self.product.pk, None, self.warehouse.pk): Decimal("5"),
+            (self.other.pk, None, self.shop.pk): Decimal("1"),
+        })
+        checked.assert_called_once()
+        self.assertEqual(InventoryValuationService.verify(), [])
+
+    def test_committed_chunks_are_valued_when_a_later_row_fails(self):
+        rows = [
+            self.row(self.product, self.warehouse, 2),
+            self.row(self.product, self.warehouse, 2),
+            {"sku": "NO-SUCH-SKU", "branch": self.warehouse.code, "quantity": "1"},
+        ]
+        with self.assertRaises(StockImportError):
+            self.import_rows(rows, chunk_size=2)
+        self.assertEqual(WarehouseStock.objects.get(product=self.product).quantity, Decimal("4"))
+        self.assertEqual(InventoryValuationService.verify(), [])
+
+    def test_dry_run_writes_nothing(self):
+        counts = self.import_rows([self.row(self.product, self.warehouse, 5)], dry_run=True)
+        self.assertEqual(counts, {"imported": 1, "skipped": 0})
+        self.assertFalse(StockMovement.objects.exists())
@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+
+from inventory.services.locations import LocationStockService
+from inventory.tests.utils import make_branch, make_product, receive
+
+
+@override_settings(BRANCH_TREE_REFRESH_SECONDS=60)
+class LocationStockTests(TestCase):
+    def setUp(self):
+        self.warehouse = make_branch(is_warehouse=True)
+        self.shop = make_branch(parent_branch=self.warehouse)
+        self.kiosk = make_branch(parent_branch=self.shop)
+        self.elsewhere = make_branch()
+        self.product = make_product()
+        for branch, quantity in (
+            (self.warehouse, 10), (self.shop, 4), (self.kiosk, 1), (self.elsewhere, 7)
+        ):
+            receive(self.product, branch, quantity)
+
+    def tree(self, branch):
+        return LocationStockService.branch_tree_ids(branch)
+
+    def test_availability_spans_warehouse_and_shop_stock(self):
+        self.assertEqual(
+            LocationStockService.availability_by_branch(self.product, within=self.warehouse),
+            {self.warehouse.pk: Decimal("10"), self.shop.pk: Decimal("4"), self.kiosk.pk: Decimal("1")},
+        )
+        sources = LocationStockService.transfer_sources(
+            self.product, quantity=Decimal("5"), dest_branch=self.shop
+        )
+        self.assertEqual([branch for branch, _ in sources], [self.warehouse, self.elsewhere])
+
+    def test_branch_map_is_read_once(self):
+        self.assertEqual(self.tree(self.shop), {self.shop.pk, self.kiosk.pk})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.tree(self.warehouse), {self.warehouse.pk, self.shop.pk, self.kiosk.pk})
+
+    def test_saving_a_branch_expires_the_map(self):
+        self.tree(self.warehouse)
+        self.elsewhere.parent_branch = self.kiosk
+        self.elsewhere.save()
+        self.assertIn(self.elsewhere.pk, self.tree(self.warehouse))
+        self.kiosk.delete()
+        self.assertEqual(self.tree(self.warehouse), {self.warehouse.pk, self.shop.pk})
@@ -0,0 +1,46 @@
+import csv
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from inventory.models import WarehouseStock
+from inventory.services.reconciliation import StockReconciliationService
+from inventory.tests.utils import make_branch, make_product, receive
+
+
+class ReconciliationTests(TestCase):
+    def setUp(self):
+        self.branch = make_branch(is_warehouse=True)
+        self.products = [make_product() for _ in range(3)]
+        for product in self.products:
+            receive(product, self.branch, 5)
+
+    def drift(self, **options):
+        return list(StockReconciliationService.reconcile(**options))
+
+    def test_balances_matching_the_ledger_report_nothing(self):
+        self.assertEqual(self.drift(products_per_range=1, chunk_size=1), [])
+        output = StringIO()
+        call_command("reconcile_stock", stdout=output)
+        self.assertIn("match", output.getvalue())
+
+    def test_drift_is_found_in_every_range(self):
+        drifted = self.products[1]
+        WarehouseStock.objects.filter(product=drifted).update(quantity=Decimal("4"))
+        key = (self.branch.pk, drifted.pk, None, "")
+        self.assertEqual(
+            self.drift(products_per_range=1, chunk_size=1), [(key, Decimal("5"), Decimal("4"))]
+        )
+
+        handle, path = tempfile.mkstemp(suffix=".csv")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        with self.assertRaises(CommandError):
+            call_command("reconcile_stock", "--csv", path, stdout=StringIO())
+        with open(path, newline="") as report:
+            rows = list(csv.DictReader(report))
+        self.assertEqual([(row["product_id"], row["drift"]) for row in rows], [(str(drifted.pk), "-1.00")])
@@ -0,0 +1,152 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.test import TestCase
+from django.utils import timezone
+
+from inventory.models import StockMovement, StockTransfer
+from inventory.services.replenishment import RebalancingService, ReorderPointService
+from inventory.services.stock import StockService
+from inventory.tests.utils import make_branch, make_product, make_user, receive
+
+
+class ReorderPointTests(TestCase):
+    def setUp(self):
+        self.warehouse = make_branch(is_warehouse=True)
+        self.shop = make_branch()
+        self.product = make_product()
+        receive(self.product, self.warehouse, 100)
+        receive(self.product, self.shop, 100)
+        self.since = timezone.localdate() - timedelta(days=4)
+
+    def post(self, day, quantity, movement_type, branch, **fields):
+        movement = StockService.apply_stock_movement(
+            product=self.product,
+            quantity=Decimal(quantity),
+            movement_type=movement_type,
+            source_branch=branch,
+            **fields,
+        )
+        StockMovement.objects.filter(pk=movement.pk).update(
+            created_at=timezone.make_aware(datetime.combine(self.since + timedelta(days=day), time(12)))
+        )
+
+    def test_daily_demand_counts_sales_but_not_transfers_or_losses(self):
+        self.post(0, 3, StockMovement.MovementType.POS_SALE_OUT, self.shop)
+        self.post(0, 1, StockMovement.MovementType.ONLINE_ORDER_OUT, self.shop)
+        self.post(2, 2, StockMovement.MovementType.POS_SALE_OUT, self.shop)
+        # Stock sent to the shop is the shop's demand, not the warehouse's
+        self.post(1, 9, StockMovement.MovementType.TRANSFER_OUT, self.warehouse, dest_branch=self.shop)
+        self.post(1, 5, StockMovement.MovementType.DAMAGE_OUT, self.shop)
+
+        demand = ReorderPointService.daily_demand(self.since, self.since + timedelta(days=4))
+        self.assertEqual(
+            sorted(zip(
+                demand["branch_id"].tolist(), demand["day"].tolist(), demand["quantity"].tolist()
+            )),
+            [(self.shop.pk, 0, 4.0), (self.shop.pk, 2, 2.0)],
+        )
+
+    def test_compute_counts_days_without_demand_as_zero(self):
+        demand = {
+            "product_id": np.array([7, 7]),
+            "branch_id": np.array([3, 3]),
+            "day": np.array([0, 1]),
+            "quantity": np.array([4.0, 2.0]),
+        }
+        points = ReorderPointService.compute(demand, days=4, lead_time_days=4, service_level=0.95)
+        self.assertEqual(points["daily_demand"].tolist(), [1.5])
+        # Sample variance of 4, 2, 0, 0
+        self.assertAlmostEqual(points["demand_std"][0], (11 / 3) ** 0.5)
+        # z(0.95) * std * sqrt(4) = 6.30 and 1.5 * 4 + 6.30 = 12.30, rounded up
+        self.assertEqual(points["safety_stock"].tolist(), [7])
+        self.assertEqual(points["reorder_level"].tolist(), [13])
+
+
+class RebalancingSaveTests(TestCase):
+    def test_runs_in_the_same_second_get_distinct_numbers(self):
+        source, destination = make_branch(is_warehouse=True), make_branch()
+        product = make_product()
+        lines = {
+            "product_id": np.array([product.pk]),
+            "source_branch_id": np.array([source.pk]),
+            "destination_branch_id": np.array([destination.pk]),
+            "quantity": np.array([3]),
+        }
+        user = make_user()
+        RebalancingService.save(lines, requested_by=user)
+        RebalancingService.save(lines, requested_by=user)
+        self.assertEqual(StockTransfer.objects.values("transfer_number").distinct().count(), 2)
+
+
+class RebalancingPlanTests(TestCase):
+    # One group: parent branch 1 with children 2 and 3; quantities in hundredths
+    groups = np.array([-1, 1, 1, 1])
+
+    def matrix(self, positions, levels):
+        return {
+            "product_id": np.array([5, 5, 5]),
+            "branch_id": np.array([1, 2, 3]),
+            "position": np.array(positions),
+            "level": np.array(levels),
+        }
+
+    def lines(self, plan):
+        return sorted(zip(
+            plan["source_branch_id"].tolist(),
+            plan["destination_branch_id"].tolist(),
+            plan["quantity"].tolist(),
+        ))
+
+    def test_parent_gives_first_then_siblings(self):
+        # Child 2 needs ceil(2 * 10 - 4) = 16; the parent spares 10, child 3 spares 30
+        matrix = self.matrix([1000, 400, 5000], [0, 1000, 1000])
+        plan = RebalancingService.plan(matrix, self.groups)
+        self.assertEqual(self.lines(plan), [(1, 2, 10), (3, 2, 6)])
+        self.assertEqual(plan["product_id"].tolist(), [5, 5])
+
+    def test_siblings_can_be_left_out(self):
+        matrix = self.matrix([1000, 400, 5000], [0, 1000, 1000])
+        plan = RebalancingService.plan(matrix, self.groups, allow_siblings=False)
+        self.assertEqual(self.lines(plan), [(1, 2, 10)])
+
+    def test_other_groups_and_small_lines_are_not_matched(self):
+        # Branch 3 heads its own group now, so its surplus stays there
+        groups = np.array([-1, 1, 1, 3])
+        matrix = self.matrix([0, 400, 5000], [0, 1000, 1000])
+        self.assertEqual(self.lines(RebalancingService.plan(matrix, groups)), [])
+        matrix = self.matrix([300, 400, 0], [0, 1000, 0])
+        self.assertEqual(self.lines(RebalancingService.plan(matrix, self.groups, min_quantity=5)), [])
+
+
+class RebalancingMatrixTests(TestCase):
+    def test_open_transfers_count_toward_the_stock_position(self):
+        warehouse = make_branch(is_warehouse=True)
+        shop = make_branch(parent_branch=warehouse)
+        product = make_product(reorder_level=Decimal("5"))
+        receive(product, warehouse, 30)
+        receive(product, shop, 1)
+        transfer = StockTransfer.objects.create(
+            transfer_number="TR-OPEN",
+            source_branch=warehouse,
+            destination_branch=shop,
+            transfer_date=timezone.localdate(),
+            requested_by=make_user(),
+        )
+        transfer.items.create(product=product, requested_quantity=Decimal("2"))
+
+        matrix = RebalancingService.load_matrix()
+        positions = dict(zip(matrix["branch_id"].tolist(), matrix["position"].tolist()))
+        self.assertEqual(positions, {warehouse.pk: 2800, shop.pk: 300})
+
+        groups = RebalancingService.branch_groups()
+        self.assertEqual((groups[warehouse.pk], groups[shop.pk]), (warehouse.pk, warehouse.pk))
+        lines, transfers = RebalancingService.run(dry_run=True)
+        # ceil(2 * 5 - 3) = 7 more for the shop, which the warehouse can spare
+        self.assertEqual(
+            list(zip(lines["source_branch_id"].tolist(), lines["destination_branch_id"].tolist(),
+                     lines["quantity"].tolist())),
+            [(warehouse.pk, shop.pk, 7)],
+        )
+        self.assertEqual(transfers, [])
@@ -0,0 +1,73 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from inventory.models import StockMovement, StockReservation
+from inventory.services.exceptions import InsufficientStockError
+from inventory.services.reservations import ReservationService
+from inventory.services.stock import StockService
+from inventory.tests.utils import make_branch, make_product, receive
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        self.branch = make_branch(is_warehouse=True)
+        self.product = make_product()
+        receive(self.product, self.branch, 10)
+
+    def reserve(self, quantity, reference):
+        return ReservationService.reserve(
+            product=self.product, branch=self.branch, quantity=Decimal(quantity), reference=reference
+        )
+
+    def available(self):
+        return ReservationService.available_to_promise(self.product, None, self.branch)
+
+    def test_live_holds_are_subtracted_from_available_to_promise(self):
+        self.reserve(3, "cart-item-1")
+        self.reserve(4, "cart-item-2")
+        self.assertEqual(self.available(), Decimal("3"))
+
+    def test_reserving_again_resizes_the_hold(self):
+        self.reserve(3, "cart-item-1")
+        self.reserve(8, "cart-item-1")
+        self.assertEqual(StockReservation.objects.count(), 1)
+        self.assertEqual(self.available(), Decimal("2"))
+
+    def test_hold_beyond_available_to_promise_is_refused(self):
+        self.reserve(8, "cart-item-1")
+        with self.assertRaises(InsufficientStockError) as raised:
+            self.reserve(3, "cart-item-2")
+        self.assertEqual(raised.exception.details[0]["available"], Decimal("2"))
+
+    def test_lapsed_holds_no_longer_count_and_expire(self):
+        self.reserve(8, "cart-item-1")
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.available(), Decimal("10"))
+        self.assertEqual(ReservationService.expire(), 1)
+
+    def test_movement_releases_the_hold_it_fulfils(self):
+        self.reserve(4, "cart-item-1")
+        StockService.apply_stock_movement(
+            product=self.product,
+            quantity=Decimal("4"),
+            movement_type=StockMovement.MovementType.ONLINE_ORDER_OUT,
+            source_branch=self.branch,
+            reservation="cart-item-1",
+        )
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(self.available(), Decimal("6"))
+
+    def test_failed_movement_keeps_the_hold(self):
+        self.reserve(4, "cart-item-1")
+        with self.assertRaises(InsufficientStockError):
+            StockService.apply_stock_movements(lines=[{
+                "product": self.product,
+                "quantity": Decimal("11"),
+                "movement_type": StockMovement.MovementType.ONLINE_ORDER_OUT,
+                "source_branch": self.branch,
+                "reservation": "cart-item-1",
+            }])
+        self.assertTrue(StockReservation.objects.filter(reference="cart-item-1").exists())
@@ -0,0 +1,57 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from inventory.models import ProductVariant
+from inventory.services.scanning import BarcodeIndex
+from inventory.tests.utils import make_product
+
+
+@override_settings(BARCODE_INDEX_REFRESH_SECONDS=3600, BARCODE_INDEX_RELOAD_SECONDS=3600)
+class BarcodeIndexTests(TestCase):
+    def setUp(self):
+        self.product = make_product(sku="TEA-1", barcode="8900001")
+        self.variant = ProductVariant.objects.create(
+            product=self.product, name="Large", sku="TEA-1-L", barcode="8900002"
+        )
+        BarcodeIndex.reload()
+
+    def resolve(self, code):
+        return BarcodeIndex.resolve([code])[code]
+
+    def test_codes_resolve_without_queries(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                BarcodeIndex.resolve(["TEA-1", " 8900001 ", "8900002"]),
+                {
+                    "TEA-1": (self.product.pk, None, Decimal("15.00"), "pc"),
+                    "8900001": (self.product.pk, None, Decimal("15.00"), "pc"),
+                    "8900002": (self.product.pk, self.variant.pk, Decimal("15.00"), "pc"),
+                },
+            )
+
+    def test_refresh_applies_changed_rows(self):
+        self.product.selling_price = Decimal("18.00")
+        self.product.barcode = "8900009"
+        self.product.save()
+        BarcodeIndex.refresh()
+        self.assertIsNone(self.resolve("8900001"))
+        self.assertEqual(self.resolve("8900009")[2], Decimal("18.00"))
+        # The variant carries its product's new price
+        self.assertEqual(self.resolve("TEA-1-L")[2], Decimal("18.00"))
+
+    def test_deactivated_products_stop_scanning(self):
+        self.product.is_active = False
+        self.product.save()
+        BarcodeIndex.refresh()
+        self.assertEqual(BarcodeIndex.resolve(["TEA-1", "8900002"]), {"TEA-1": None, "8900002": None})
+
+    def test_new_product_scans_at_once(self):
+        product = make_product(sku="NEW-1")
+        with mock.patch("inventory.services.scanning.MISS_REFRESH_INTERVAL", 0):
+            self.assertEqual(self.resolve("NEW-1")[0], product.pk)
+
+    def test_misses_right_after_a_refresh_dont_query(self):
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.resolve("MISSING"))
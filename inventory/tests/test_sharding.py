@@ -0,0 +1,59 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from inventory.models import BranchStock, StockMovement, StockShard
+from inventory.services.exceptions import InsufficientStockError
+from inventory.services.stock import StockService
+from inventory.tests.utils import make_branch, make_product, receive
+
+SALE = StockMovement.MovementType.POS_SALE_OUT
+
+
+class ShardedStockTests(TestCase):
+    def setUp(self):
+        self.shop = make_branch()
+        self.product = make_product(stock_shards=4)
+        with self.captureOnCommitCallbacks(execute=True):
+            receive(self.product, self.shop, 10)
+            self.sell(1)
+
+    def sell(self, quantity, **fields):
+        return StockService.apply_stock_movements(lines=[{
+            "product": self.product,
+            "quantity": Decimal(quantity),
+            "movement_type": SALE,
+            "source_branch": self.shop,
+            **fields,
+        }])
+
+    def unshard(self):
+        self.product.stock_shards = 0
+        self.product.save()
+
+    def test_sale_draws_on_the_shards(self):
+        pool = BranchStock.objects.get(product=self.product)
+        in_shards = sum(shard.quantity for shard in StockShard.objects.filter(stock=pool))
+        self.assertGreater(in_shards, 0)
+        self.assertEqual(pool.quantity + in_shards, Decimal("9"))
+
+    def test_batch_sale_after_unsharding_uses_stock_left_in_shards(self):
+        self.unshard()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sell(9)
+        self.assertEqual(BranchStock.objects.get(product=self.product).quantity, Decimal("0"))
+        self.assertFalse(StockShard.objects.filter(quantity__gt=0).exists())
+
+    def test_fefo_sale_after_unsharding_uses_stock_left_in_shards(self):
+        self.unshard()
+        movements = StockService.apply_fefo_movement(
+            product=self.product, quantity=Decimal("9"), movement_type=SALE, source_branch=self.shop
+        )
+        self.assertEqual(sum(movement.quantity for movement in movements), Decimal("9"))
+
+    def test_short_sharded_line_reports_what_is_available(self):
+        with self.assertRaises(InsufficientStockError) as raised:
+            self.sell(12)
+        (detail,) = raised.exception.details
+        self.assertEqual((detail["available"], detail["requested"]), (Decimal("9"), Decimal("12")))
+        self.assertIn("available 9", str(raised.exception))
@@ -0,0 +1,126 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from inventory.models import StockMovement, WarehouseStock
+from inventory.services.exceptions import InsufficientStockError
+from inventory.services.stock import StockService
+from inventory.tests.utils import make_branch, make_product, receive
+
+SALE = StockMovement.MovementType.POS_SALE_OUT
+PURCHASE = StockMovement.MovementType.PURCHASE_IN
+
+
+class SingleMovementTests(TestCase):
+    def setUp(self):
+        self.branch = make_branch(is_warehouse=True)
+        self.product = make_product()
+
+    def adjust(self, delta, **fields):
+        return StockService._adjust_stock_row(
+            WarehouseStock,
+            branch=self.branch,
+            product=self.product,
+            variant=None,
+            batch_number="",
+            delta=Decimal(delta),
+            **fields,
+        )
+
+    def test_update_returns_the_new_quantity(self):
+        receive(self.product, self.branch, 5)
+        self.assertEqual(self.adjust(3), Decimal("8.00"))
+        self.assertEqual(self.adjust(-8), Decimal("0.00"))
+
+    def test_short_or_missing_row_is_left_alone(self):
+        self.assertIsNone(self.adjust(1))
+        receive(self.product, self.branch, 2)
+        self.assertIsNone(self.adjust(-3))
+        self.assertEqual(WarehouseStock.objects.get(product=self.product).quantity, Decimal("2"))
+
+    def test_expiry_is_only_filled_when_empty(self):
+        today = timezone.localdate()
+        receive(self.product, self.branch, 1)
+        self.adjust(1, expiry_date=today)
+        self.adjust(1, expiry_date=today + timedelta(days=5))
+        self.assertEqual(WarehouseStock.objects.get(product=self.product).expiry_date, today)
+
+    def test_short_sale_records_nothing(self):
+        receive(self.product, self.branch, 2)
+        with self.assertRaises(InsufficientStockError):
+            StockService.apply_stock_movement(
+                product=self.product,
+                quantity=Decimal("3"),
+                movement_type=SALE,
+                source_branch=self.branch,
+            )
+        self.assertFalse(StockMovement.objects.filter(movement_type=SALE).exists())
+
+
+class BatchMovementTests(TestCase):
+    def setUp(self):
+        self.branch = make_branch(is_warehouse=True)
+        self.product = make_product()
+        self.other = make_product(sku="OTHER")
+
+    def line(self, product, movement_type, quantity):
+        branch = "source_branch" if movement_type == SALE else "dest_branch"
+        return {
+            "product": product,
+            "quantity": Decimal(quantity),
+            "movement_type": movement_type,
+            branch: self.branch,
+        }
+
+    def on_hand(self, product):
+        return WarehouseStock.objects.get(product=product).quantity
+
+    def test_lines_apply_in_order(self):
+        StockService.apply_stock_movements(lines=[
+            self.line(self.product, PURCHASE, 5),
+            self.line(self.product, SALE, 3),
+        ])
+        self.assertEqual(self.on_hand(self.product), Decimal("2"))
+
+    def test_short_line_applies_nothing(self):
+        receive(self.other, self.branch, 1)
+        with self.assertRaises(InsufficientStockError) as raised:
+            StockService.apply_stock_movements(lines=[
+                self.line(self.product, PURCHASE, 5),
+                self.line(self.other, SALE, 2),
+            ])
+        self.assertEqual([detail["line"] for detail in raised.exception.details], [1])
+        self.assertFalse(WarehouseStock.objects.filter(product=self.product).exists())
+        self.assertEqual(self.on_hand(self.other), Decimal("1"))
+
+    def test_row_created_concurrently_is_added_to(self):
+        lock = StockService._lock_stock_rows
+
+        def lock_then_race(keys_by_model):
+            rows = lock(keys_by_model)
+            # Another batch commits the row after our lock query found nothing
+            WarehouseStock.objects.create(branch=self.branch, product=self.product, quantity=3)
+            return rows
+
+        with mock.patch.object(StockService, "_lock_stock_rows", side_effect=lock_then_race):
+            StockService.apply_stock_movements(lines=[
+                self.line(self.product, PURCHASE, 5),
+                self.line(self.product, SALE, 1),
+                self.line(self.other, PURCHASE, 2),
+            ])
+        self.assertEqual(self.on_hand(self.product), Decimal("7"))
+        self.assertEqual(self.on_hand(self.other), Decimal("2"))
+
+    def test_short_batch_records_no_movements(self):
+        receive(self.product, self.branch, 10)
+        with self.assertRaises(InsufficientStockError) as raised:
+            StockService.apply_stock_movements(lines=[
+                self.line(self.product, SALE, 4),
+                self.line(self.product, SALE, 7),
+            ])
+        self.assertEqual([detail["line"] for detail in raised.exception.details], [1])
+        self.assertEqual(self.on_hand(self.product), Decimal("10"))
+        self.assertFalse(StockMovement.objects.filter(movement_type=SALE).exists())
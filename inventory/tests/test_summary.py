@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from inventory.models import Product, ProductStockSummary, StockMovement
+from inventory.services.stock import StockService
+from inventory.services.summary import StockSummaryService
+from inventory.tests.utils import make_branch, make_product, receive
+
+
+class StockSummaryTests(TestCase):
+    def setUp(self):
+        self.warehouse = make_branch(is_warehouse=True)
+        self.shop = make_branch()
+        self.product = make_product()
+        receive(self.product, self.warehouse, 10)
+        receive(self.product, self.shop, 4)
+        StockService.apply_stock_movement(
+            product=self.product,
+            quantity=Decimal("1"),
+            movement_type=StockMovement.MovementType.POS_SALE_OUT,
+            source_branch=self.shop,
+        )
+
+    def summary(self, branch=None):
+        return ProductStockSummary.objects.get(product=self.product, branch=branch).quantity
+
+    def test_movements_keep_branch_and_company_totals(self):
+        self.assertEqual(self.summary(self.warehouse), Decimal("10"))
+        self.assertEqual(self.summary(self.shop), Decimal("3"))
+        self.assertEqual(self.summary(), Decimal("13"))
+        self.assertEqual(StockSummaryService.verify(), [])
+
+    def test_annotated_products_read_the_total_without_a_query(self):
+        product = StockSummaryService.with_stock_totals(Product.objects.filter(pk=self.product.pk)).get()
+        with self.assertNumQueries(0):
+            self.assertEqual(product.total_stock_quantity(), 13.0)
+
+    def test_rebuild_repairs_drift(self):
+        ProductStockSummary.objects.filter(product=self.product, branch__isnull=True).update(
+            quantity=Decimal("99")
+        )
+        self.assertEqual(
+            StockSummaryService.verify(),
+            [((self.product.pk, None, None), Decimal("13"), Decimal("99"))],
+        )
+        StockSummaryService.rebuild()
+        self.assertEqual(StockSummaryService.verify(), [])
+        self.assertEqual(self.summary(), Decimal("13"))
@@ -0,0 +1,115 @@
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from inventory.models import StockMovement, StockTransfer, StockTransferItem
+from inventory.services.transfers import StockTransferService
+from inventory.services.stock import StockService
+from inventory.tests.utils import make_branch, make_product, make_user, receive
+
+
+class TransferCostTests(TestCase):
+    def setUp(self):
+        self.shop = make_branch()
+        self.warehouse = make_branch(is_warehouse=True)
+        self.user = make_user()
+        # Hot SKU: shop OUT movements go through stock shards
+        self.product = make_product(stock_shards=4)
+        with self.captureOnCommitCallbacks(execute=True):
+            receive(self.product, self.shop, 5, cost_price="4.00")
+            receive(self.product, self.shop, 5, cost_price="6.00")
+
+    def test_transfer_of_sharded_product_carries_fifo_cost(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            out_movement, in_movement = StockService.transfer_stock(
+                product=self.product,
+                variant=None,
+                quantity=Decimal("8"),
+                source_branch=self.shop,
+                dest_branch=self.warehouse,
+                reference="TR-1",
+            )
+        self.assertEqual(out_movement.cogs_amount, Decimal("38.00"))
+        self.assertEqual(in_movement.cost_price, Decimal("4.75"))
+
+    def test_receipt_uses_dispatch_cost_of_sharded_product(self):
+        transfer = StockTransfer.objects.create(
+            transfer_number="TR-2",
+            source_branch=self.shop,
+            destination_branch=self.warehouse,
+            transfer_date=timezone.localdate(),
+            requested_by=self.user,
+            status=StockTransfer.Status.APPROVED,
+        )
+        StockTransferItem.objects.create(
+            transfer=transfer,
+            product=self.product,
+            requested_quantity=Decimal("6"),
+            approved_quantity=Decimal("6"),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            StockTransferService.dispatch(transfer)
+        self.assertEqual(transfer.status, StockTransfer.Status.IN_TRANSIT)
+        self.assertIsNotNone(StockTransfer.objects.get(pk=transfer.pk).dispatched_at)
+        with self.captureOnCommitCallbacks(execute=True):
+            (movement,) = StockTransferService.receive(transfer, received_by=self.user)
+        # 5 at 4.00 and 1 at 6.00
+        self.assertEqual(movement.cost_price, Decimal("4.33"))
+        self.assertEqual(transfer.status, StockTransfer.Status.COMPLETED)
+
+    def test_receipt_refuses_dispatch_without_cogs(self):
+        transfer = StockTransfer.objects.create(
+            transfer_number="TR-3",
+            source_branch=self.shop,
+            destination_branch=self.warehouse,
+            transfer_date=timezone.localdate(),
+            requested_by=self.user,
+            status=StockTransfer.Status.IN_TRANSIT,
+        )
+        StockTransferItem.objects.create(
+            transfer=transfer,
+            product=self.product,
+            requested_quantity=Decimal("1"),
+            approved_quantity=Decimal("1"),
+        )
+        StockMovement.objects.create(
+            product=self.product,
+            quantity=Decimal("1"),
+            movement_type=StockMovement.MovementType.TRANSFER_OUT,
+            source_branch=self.shop,
+            reference="TR-3",
+        )
+        with self.assertRaises(ValueError):
+            StockTransferService.receive(transfer, received_by=self.user)
+
+    def test_receipt_weights_cost_over_every_dispatch_of_a_batch(self):
+        transfer = StockTransfer.objects.create(
+            transfer_number="TR-4",
+            source_branch=self.shop,
+            destination_branch=self.warehouse,
+            transfer_date=timezone.localdate(),
+            requested_by=self.user,
+            status=StockTransfer.Status.APPROVED,
+        )
+        for _ in range(2):
+            StockTransferItem.objects.create(
+                transfer=transfer,
+                product=self.product,
+                requested_quantity=Decimal("4"),
+                approved_quantity=Decimal("4"),
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            StockTransferService.dispatch(transfer)
+        # 4 at 4.00, then 1 at 4.00 and 3 at 6.00: both receipts carry the mean
+        self.assertEqual(
+            sorted(
+                StockMovement.objects.filter(
+                    reference="TR-4", movement_type=StockMovement.MovementType.TRANSFER_OUT
+                ).values_list("cogs_amount", flat=True)
+            ),
+            [Decimal("16.00"), Decimal("22.00")],
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            movements = StockTransferService.receive(transfer, received_by=self.user)
+        self.assertEqual([movement.cost_price for movement in movements], [Decimal("4.75")] * 2)
@@ -0,0 +1,73 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from inventory.models import Category, InventoryValuation, StockMovement
+from inventory.services.stock import StockService
+from inventory.services.valuation import InventoryValuationService
+from inventory.tests.utils import make_branch, make_product, receive
+
+
+class ValuationTests(TestCase):
+    def setUp(self):
+        self.branch = make_branch(is_warehouse=True)
+        self.category = Category.objects.create(name="Food")
+        self.product = make_product(category=self.category, cost_price=Decimal("2.50"))
+        with self.captureOnCommitCallbacks(execute=True):
+            receive(self.product, self.branch, 10)
+
+    def row(self, category=None):
+        return InventoryValuation.objects.get(branch=self.branch, category=category)
+
+    def test_movements_update_the_running_value(self):
+        self.assertEqual(self.row(self.category).value, Decimal("25.00"))
+        with self.captureOnCommitCallbacks(execute=True):
+            StockService.apply_stock_movement(
+                product=self.product,
+                quantity=Decimal("4"),
+                movement_type=StockMovement.MovementType.POS_SALE_OUT,
+                source_branch=self.branch,
+            )
+        row = self.row(self.category)
+        self.assertEqual((row.quantity, row.value), (Decimal("6"), Decimal("15.00")))
+        self.assertEqual(InventoryValuationService.verify(), [])
+
+    def test_cost_price_and_category_changes_revalue_stock(self):
+        other = Category.objects.create(name="Drinks")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.cost_price = Decimal("3.00")
+            self.product.category = other
+            self.product.save()
+        self.assertEqual(self.row(self.category).value, Decimal("0.00"))
+        self.assertEqual(self.row(other).value, Decimal("30.00"))
+        self.assertEqual(InventoryValuationService.verify(), [])
+
+    def test_deleted_category_folds_into_uncategorised(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.delete()
+        self.assertEqual(self.row(None).value, Decimal("25.00"))
+        self.assertEqual(InventoryValuationService.verify(), [])
+
+    def test_recompute_repairs_drift(self):
+        InventoryValuation.objects.update(value=Decimal("1.00"))
+        self.assertEqual(len(InventoryValuationService.verify()), 1)
+        InventoryValuationService.recompute()
+        self.assertEqual(InventoryValuationService.verify(), [])
+        self.assertEqual(InventoryValuationService.by_branch(), {self.branch.pk: Decimal("25.00")})
+
+    def test_subcategories_roll_up_and_branches_filter(self):
+        child = Category.objects.create(name="Snacks", parent=self.category)
+        shop = make_branch()
+        with self.captureOnCommitCallbacks(execute=True):
+            receive(make_product(category=child, cost_price=Decimal("1.00")), shop, 4)
+        self.assertEqual(
+            InventoryValuationService.by_category(include_subcategories=True)[self.category.pk],
+            Decimal("29.00"),
+        )
+        self.assertEqual(
+            InventoryValuationService.by_category(branch_ids=[shop.pk]), {child.pk: Decimal("4.00")}
+        )
+        self.assertEqual(
+            InventoryValuationService.totals(branch_ids=[self.branch.pk]),
+            {"quantity": Decimal("10"), "value": Decimal("25.00")},
+        )
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from decimal import Decimal
+from itertools import count
+
+from accounts.models import Branch, User
+from inventory.models import Category, Product, StockMovement, Unit
+from inventory.services.stock import StockService
+
+_sequence = count(1)
+
+
+def make_branch(*, is_warehouse: bool = False, **fields) -> Branch:
+    number = next(_sequence)
+    fields.setdefault("name", f"Branch {number}")
+    fields.setdefault("code", f"BR-{number}")
+    return Branch.objects.create(is_warehouse=is_warehouse, **fields)
+
+
+def make_user(**fields) -> User:
+    number = next(_sequence)
+    fields.setdefault("username", f"user{number}")
+    return User.objects.create_user(**fields)
+
+
+def make_product(*, category: Category = None, **fields) -> Product:
+    number = next(_sequence)
+    unit = Unit.objects.get_or_create(name="Piece", short_name="pc")[0]
+    fields.setdefault("name", f"Product {number}")
+    fields.setdefault("sku", f"SKU-{number}")
+    fields.setdefault("cost_price", Decimal("10.00"))
+    fields.setdefault("selling_price", Decimal("15.00"))
+    return Product.objects.create(category=category, unit=unit, **fields)
+
+
+def receive(product: Product, branch: Branch, quantity, cost_price=None, **fields) -> StockMovement:
+    """Book ``quantity`` of ``product`` into ``branch`` as a purchase"""
+    return StockService.apply_stock_movement(
+        product=product,
+        quantity=Decimal(quantity),
+        movement_type=StockMovement.MovementType.PURCHASE_IN,
+        dest_branch=branch,
+        cost_price=Decimal(cost_price) if cost_price is not None else None,
+        **fields,
+    )
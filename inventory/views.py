@@ -7,6 +7,7 @@ from django.shortcuts import get_object_or_404, redirect, render
 
 from .forms import ProductForm
 from .models import Product
+from .services.summary import StockSummaryService
 
 
 @login_required
@@ -20,7 +21,9 @@ def product_list(request: HttpRequest) -> HttpResponse:
     """
     Simple product list with search + pagination.
     """
-    qs = Product.objects.select_related("category", "brand", "unit").order_by("name")
+    qs = StockSummaryService.with_stock_totals(
+        Product.objects.select_related("category", "brand", "unit").order_by("name")
+    )
     q = request.GET.get("q") or ""
     if q:
         qs = qs.filter(
@@ -1,6 +1,8 @@
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect
-from django.http import HttpRequest, HttpResponse
+from django.http import HttpRequest, HttpResponse, JsonResponse
+
+from inventory.services.scanning import BarcodeIndex
 
 
 @login_required
@@ -30,6 +32,25 @@ def create_sale(request: HttpRequest) -> HttpResponse:
     return redirect("pos:interface")
 
 
+@login_required
+def scan(request: HttpRequest) -> JsonResponse:
+    """Resolve one or more scanned barcodes/SKUs (?code=...&code=...)"""
+    resolved = BarcodeIndex.resolve(request.GET.getlist("code"))
+    return JsonResponse({
+        "items": [
+            {
+                "code": code,
+                "found": entry is not None,
+                "product_id": entry[0] if entry else None,
+                "variant_id": entry[1] if entry else None,
+                "price": str(entry[2]) if entry else None,
+                "unit": entry[3] if entry else None,
+            }
+            for code, entry in resolved.items()
+        ]
+    })
+
+
 @login_required
 def sales_list(request: HttpRequest) -> HttpResponse:
     """List all POS sales"""